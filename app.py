@@ -1,8 +1,26 @@
-from flask import Flask, render_template, request, redirect, jsonify
-import mysql.connector
+from flask import Flask, Response, render_template, request, redirect, jsonify, g
 from dotenv import load_dotenv
+import json
 import os
-import requests
+import time
+
+import binary_ingest
+import cache
+import compression
+import dashboard
+import db_pool
+import export
+import ingestion
+import ingestion_buffer
+import instructions as instructions_db
+import live_stream
+import metrics
+import normalized_storage
+import notifications
+import profiling
+import raspberry_forwarder
+import retention
+import rollups
 
 # Charger les variables d'environnement
 load_dotenv()
@@ -10,163 +28,219 @@ load_dotenv()
 app = Flask(__name__)
 
 # Configuration Raspberry Pi
-RASPBERRY_PI_URL = "http://10.0.215.7:5001"  # IP réelle du Raspberry Pi
+RASPBERRY_PI_URL = os.environ.get(
+    "RASPBERRY_PI_URL", "http://10.0.215.7:5001"
+)  # IP réelle du Raspberry Pi
+
+# Boîte d'envoi persistante vers le Raspberry Pi (envoi en arrière-plan)
+raspberry = raspberry_forwarder.from_env(RASPBERRY_PI_URL)
 
 
 def send_to_raspberry(data):
-    """Envoie des données vers le Raspberry Pi"""
+    """Dépose des données pour le Raspberry Pi (envoi asynchrone avec réessais)"""
     try:
-        response = requests.post(f"{RASPBERRY_PI_URL}/api/data", json=data, timeout=5)
-        return response.status_code == 200
-    except:
+        return raspberry.envoyer(data)
+    except Exception as e:
+        metrics.ENVOIS_RASPBERRY.inc("outbox_error")
+        print(f"❌ Boîte d'envoi Raspberry indisponible: {e}")
         return False
 
 
-def get_db_connection():
-    return mysql.connector.connect(
-        host=os.getenv("DB_HOST"),
-        user=os.getenv("DB_USER"),
-        password=os.getenv("DB_PASSWORD"),
-        database=os.getenv("DB_NAME"),
+# Long-poll de /api/instructions : attente maximale et relecture de sécurité
+INSTRUCTIONS_MAX_WAIT = float(os.environ.get("INSTRUCTIONS_MAX_WAIT", 60))
+INSTRUCTIONS_RECHECK_SECONDS = float(os.environ.get("INSTRUCTIONS_RECHECK_SECONDS", 10))
+
+# Taille maximale d'un lot envoyé à /api/capteurs
+BATCH_MAX_READINGS = int(os.environ.get("BATCH_MAX_READINGS", 5000))
+
+# Décodeur des trames binaires de /api/capteurs/bin
+decodeur_binaire = binary_ingest.Decodeur()
+
+
+# Cache du tableau de bord : (capteurs, last_color_hex)
+cache_lecture = cache.from_env()
+CLE_DASHBOARD = "dashboard"
+
+
+def apres_nouvelles_lectures():
+    """Après le commit de lectures de capteurs : invalider le cache, réveiller les lecteurs"""
+    cache_lecture.invalider(CLE_DASHBOARD)
+    notifications.lectures.notifier()
+
+
+def apres_nouvelle_couleur(commande_couleur):
+    """Après le commit d'une couleur : mettre à jour le cache sans relire la base"""
+    last_color_hex = dashboard.couleur_hex(commande_couleur)
+    cache_lecture.mettre_a_jour(
+        CLE_DASHBOARD, lambda valeur: (valeur[0], last_color_hex)
     )
+    notifications.lectures.notifier()
+    notifications.instructions.notifier()
 
 
-@app.route("/")
-def index():
+# Tampon d'écriture asynchrone (None si INGESTION_ASYNC n'est pas activé)
+tampon_ingestion = ingestion_buffer.from_env(
+    ingestion.inserer_lignes, apres_ecriture=apres_nouvelles_lectures
+)
+
+
+def enregistrer_lectures(lignes):
+    """Enregistre des lignes MyAsset ; False si elles ont seulement été mises en file"""
+    if tampon_ingestion is not None:
+        # Lève IngestionQueueFull si la file est pleine (contre-pression)
+        tampon_ingestion.submit(lignes)
+        return False
+
+    # Une seule requête INSERT multi-lignes et un seul commit
+    differer = rollups.a_differer(lignes)
     conn = get_db_connection()
-    cursor = conn.cursor(dictionary=True)
+    cursor = conn.cursor()
+    ingestion.inserer_lignes(cursor, lignes, agregats=not differer)
+    conn.commit()
+    cursor.close()
+    conn.close()
+    if differer:
+        # Pas d'upsert d'agrégats par lecture isolée : cumulés en mémoire
+        rollups.differer(lignes)
+    apres_nouvelles_lectures()
+    return True
 
-    # Récupérer les derniers capteurs depuis MyAsset - approche mixte
-    # D'abord les capteurs généraux (température, bouton, lumière) - limité à 5 par type
-    cursor.execute("""
-        SELECT 
-            MyAssetNumber as id,
-            MyAssetType as type,
-            MyAssetValue as valeur,
-            MyAssetComment as valeur_texte,
-            UNIX_TIMESTAMP(MyAssetTimeStamp) as timestamp_unix,
-            MyAssetTimeStamp as date_formatted,
-            MyAssetName as nom,
-            MyAssetUnit as unite
-        FROM MyAsset 
-        WHERE MyAssetType IN ('temperature', 'bouton_poussoir', 'capteur_texte', 'humidity', 'pressure', 'light', 'motion', 'button') 
-        ORDER BY MyAssetTimeStamp DESC LIMIT 25
-    """)
-    capteurs = cursor.fetchall()
-
-    # Puis ajouter spécifiquement les derniers événements joystick - limité à 5
-    cursor.execute("""
-        SELECT 
-            MyAssetNumber as id,
-            MyAssetType as type,
-            MyAssetValue as valeur,
-            MyAssetComment as valeur_texte,
-            UNIX_TIMESTAMP(MyAssetTimeStamp) as timestamp_unix,
-            MyAssetTimeStamp as date_formatted,
-            MyAssetName as nom,
-            MyAssetUnit as unite
-        FROM MyAsset 
-        WHERE MyAssetType = 'joystick'
-        ORDER BY MyAssetTimeStamp DESC LIMIT 5
-    """)
-    joystick_data = cursor.fetchall()
 
-    # Combiner les deux listes
-    capteurs.extend(joystick_data)
+def get_db_connection():
+    """Emprunter une connexion au pool partagé (close() la rend au pool)"""
+    conn = db_pool.get_connection()
+    # Mémoriser la connexion pour la rendre même si la route lève une exception
+    g.setdefault("db_connections", []).append(conn)
+    return conn
+
+
+@app.before_request
+def debut_requete():
+    g.debut_requete = time.perf_counter()
+
+
+@app.after_request
+def mesurer_requete(response):
+    # Déclaré avant compresser() : exécuté après lui, compression comprise
+    debut = g.get("debut_requete")
+    if debut is not None:
+        metrics.observer_requete_http(
+            request.endpoint or "none",
+            request.method,
+            response.status_code,
+            time.perf_counter() - debut,
+        )
+    return response
 
-    # Trier par timestamp pour avoir l'ordre chronologique correct
-    capteurs.sort(key=lambda x: x["timestamp_unix"], reverse=True)
 
-    # Limiter chaque type de capteur à 5 entrées maximum
-    capteurs_limites = []
-    compteurs_types = {}
+@app.before_request
+def demarrer_profilage():
+    # Opt-in : en-tête X-Profile ou ?profile=, depuis PROFILING_ALLOW seulement
+    drapeau = request.headers.get("X-Profile") or request.args.get("profile")
+    if drapeau:
+        profiling.demarrer(request.remote_addr, drapeau)
 
-    for capteur in capteurs:
-        type_capteur = capteur["type"]
 
-        # Conversion des types pour compatibilité
-        if type_capteur == "button":
-            type_capteur = "bouton_poussoir"
-            capteur["type"] = "bouton_poussoir"
+@app.after_request
+def terminer_profilage(response):
+    # Déclaré avant compresser() : la compression est comptée dans le total
+    profil = profiling.terminer()
+    if profil is None:
+        return response
+    rapport = profil.arreter()
+    if rapport is not None and not response.is_streamed:
+        response = Response(rapport, mimetype="text/plain")
+    response.headers["Server-Timing"] = profil.server_timing()
+    return response
 
-        # Compter les occurrences de chaque type
-        if type_capteur not in compteurs_types:
-            compteurs_types[type_capteur] = 0
 
-        # N'ajouter que si on n'a pas encore 5 entrées pour ce type
-        if compteurs_types[type_capteur] < 5:
-            capteurs_limites.append(capteur)
-            compteurs_types[type_capteur] += 1
+@app.teardown_request
+def abandonner_profilage(exception=None):
+    # Requête interrompue avant after_request : ne pas laisser le profil actif
+    profil = profiling.terminer()
+    if profil is not None:
+        profil.arreter()
 
-    # Utiliser la liste limitée
-    capteurs = capteurs_limites
 
-    # Ajouter une valeur affichable qui combine valeur numérique et texte (compatibilité)
-    for capteur in capteurs:
-        if capteur["valeur_texte"] and capteur["unite"] == "text":
-            capteur["valeur_affichee"] = capteur["valeur_texte"]
-        elif capteur["type"] == "bouton_poussoir":
-            # Affichage optimisé pour les boutons poussoirs
-            capteur["valeur_affichee"] = (
-                "Appuyé" if capteur["valeur"] == 1 else "Relâché"
-            )
-        elif capteur["type"] == "joystick":
-            # Affichage optimisé pour le joystick Sense HAT
-            if capteur["valeur_texte"]:
-                # Afficher la direction depuis le commentaire
-                capteur["valeur_affichee"] = capteur["valeur_texte"]
-            else:
-                capteur["valeur_affichee"] = (
-                    "Actionné" if capteur["valeur"] == 1 else "Inactif"
-                )
-                print(f"Debug joystick (pas de texte): valeur={capteur['valeur']}")
-        else:
-            # Pour les autres capteurs, afficher valeur + unité
-            capteur["valeur_affichee"] = (
-                f"{capteur['valeur']} {capteur.get('unite', '')}"
-            )
+@app.before_request
+def demarrer_taches_fond():
+    # Démarrage paresseux (une fois par processus, y compris après un fork)
+    retention.demarrer_tache_fond()
+    raspberry.reprendre()
 
-        # Utiliser la date formatée pour l'affichage
-        capteur["date"] = capteur["date_formatted"]
 
-    # Récupérer la dernière couleur définie
-    cursor = conn.cursor(dictionary=True)
-    cursor.execute("""
-        SELECT MyAssetComment 
-        FROM MyAsset 
-        WHERE MyAssetType = 'color' 
-        ORDER BY MyAssetTimeStamp DESC 
-        LIMIT 1
-    """)
-    last_color_result = cursor.fetchone()
+@app.after_request
+def compresser(response):
+    return compression.compresser_reponse(request, response)
 
-    # Convertir SET_COLOR:R,G,B en format hex
-    last_color_hex = "#ff0000"  # Couleur par défaut
-    if last_color_result and last_color_result["MyAssetComment"]:
-        color_command = last_color_result["MyAssetComment"]
-        if color_command.startswith("SET_COLOR:"):
-            try:
-                # Extraire les valeurs RGB
-                rgb_str = color_command.replace("SET_COLOR:", "")
-                r, g, b = map(int, rgb_str.split(","))
-                # Convertir en hex
-                last_color_hex = f"#{r:02x}{g:02x}{b:02x}"
-            except Exception:
-                pass  # Garder la couleur par défaut en cas d'erreur
 
-    cursor.close()
-    conn.close()
-    return render_template("index.html", capteurs=capteurs, last_color=last_color_hex)
+def calculer_etag(*parties):
+    """Valeur d'ETag construite à partir de l'état qui détermine la réponse"""
+    return "-".join(str(p) for p in parties)
+
+
+def non_modifie(etag, requete=request):
+    """Réponse 304 si le client possède déjà la version `etag`, sinon None"""
+    if requete.if_none_match.contains_weak(etag):
+        response = Response(status=304)
+        # ETag faible : la réponse peut être compressée
+        response.set_etag(etag, weak=True)
+        return response
+    return None
+
+
+@app.teardown_appcontext
+def release_db_connections(exception=None):
+    for conn in g.pop("db_connections", []):
+        conn.close()
+
+
+def charger_dashboard():
+    conn = get_db_connection()
+    try:
+        return dashboard.charger_dashboard(conn)
+    finally:
+        conn.close()
+
+
+@app.route("/")
+def index():
+    # Les 5 dernières lectures de chaque type et la dernière couleur, en une
+    # requête, puis depuis le cache jusqu'à la prochaine écriture (ou le TTL)
+    capteurs, last_color_hex = cache_lecture.get_or_load(
+        CLE_DASHBOARD, charger_dashboard
+    )
+
+    # Même ligne la plus récente et même couleur : la page n'a pas changé
+    etag = calculer_etag(
+        max((c["id"] for c in capteurs), default=0), last_color_hex.lstrip("#")
+    )
+    response = non_modifie(etag)
+    if response is None:
+        with profiling.phase("rendu"):
+            page = render_template(
+                "index.html", capteurs=capteurs, last_color=last_color_hex
+            )
+        response = Response(page)
+        response.set_etag(etag, weak=True)
+    # Toujours revalider : le navigateur renvoie If-None-Match à chaque chargement
+    response.headers["Cache-Control"] = "no-cache"
+    return response
 
 
 @app.route("/debug/joystick")
 def debug_joystick():
     """Route de debug pour voir les données joystick"""
     conn = get_db_connection()
+    source = "MyAsset"
+    if normalized_storage.actif:
+        capteurs = normalized_storage.capteurs_des_types(conn, ("joystick",))
+        lectures = normalized_storage.lectures_par_capteur([c[0] for c in capteurs], 10)
+        source = f"{lectures} AS j"
     cursor = conn.cursor(dictionary=True)
 
-    cursor.execute("""
-        SELECT * FROM MyAsset 
+    cursor.execute(f"""
+        SELECT * FROM {source}
         WHERE MyAssetType = 'joystick' 
         ORDER BY MyAssetTimeStamp DESC 
         LIMIT 10
@@ -193,14 +267,16 @@ def commande():
     # Ajouter la commande comme un asset de type "instruction"
     conn = get_db_connection()
     cursor = conn.cursor()
-    cursor.execute(
-        """INSERT INTO MyAsset (MyAssetType, MyAssetName, MyAssetValue, MyAssetUnit, MyAssetComment) 
-           VALUES (%s, %s, %s, %s, %s)""",
-        ("instruction", "Commande Web", 1.0, "cmd", action),
-    )
-    conn.commit()
+    with metrics.chronometrer("insert_command"):
+        ingestion.inserer_ligne(
+            cursor, ("instruction", "Commande Web", 1.0, "cmd", action)
+        )
+        conn.commit()
     cursor.close()
     conn.close()
+    # Les instructions ne sont pas affichées : le cache du tableau de bord reste valide
+    notifications.lectures.notifier()
+    notifications.instructions.notifier()
 
     # Envoyer aussi vers le Raspberry Pi
     raspberry_data = {
@@ -234,14 +310,14 @@ def couleur():
         # Sauvegarder en base de données MyAsset
         conn = get_db_connection()
         cursor = conn.cursor()
-        cursor.execute(
-            """INSERT INTO MyAsset (MyAssetType, MyAssetName, MyAssetValue, MyAssetUnit, MyAssetComment) 
-               VALUES (%s, %s, %s, %s, %s)""",
-            ("color", "LED Color", 1.0, "rgb", commande_couleur),
-        )
-        conn.commit()
+        with metrics.chronometrer("insert_color"):
+            ingestion.inserer_ligne(
+                cursor, ("color", "LED Color", 1.0, "rgb", commande_couleur)
+            )
+            conn.commit()
         cursor.close()
         conn.close()
+        apres_nouvelle_couleur(commande_couleur)
 
         # Envoyer aussi vers le Raspberry Pi
         raspberry_data = {
@@ -259,31 +335,112 @@ def couleur():
         return f"Erreur lors de l'envoi de la couleur: {e}", 500
 
 
+def parametres_instructions(args):
+    """Lire `since` et `wait` de /api/instructions ; ValueError si invalides"""
+    since = args.get("since")
+    try:
+        since = int(since) if since is not None else None
+    except ValueError:
+        raise ValueError("since doit être un entier")
+    if since is not None and since < 0:
+        raise ValueError("since doit être positif")
+
+    try:
+        attente = float(args.get("wait", 0))
+    except ValueError:
+        raise ValueError("wait doit être un nombre de secondes")
+    if not 0 <= attente < float("inf"):
+        raise ValueError("wait doit être un nombre de secondes")
+    return since, min(attente, INSTRUCTIONS_MAX_WAIT)
+
+
+def reponse_instructions(instructions, since, requete=request):
+    """Réponse de /api/instructions (304 si le client possède déjà ce contenu)"""
+    # Même dernière instruction et même nombre : la réponse n'a pas changé
+    etag = calculer_etag(
+        since if since is not None else "h",
+        instructions[-1]["id"] if instructions else 0,
+        len(instructions),
+    )
+    response = non_modifie(etag, requete)
+    if response is not None:
+        return response
+
+    response_data = {"instructions": instructions}
+    if since is not None:
+        # Curseur à renvoyer dans `since` à la prochaine requête
+        response_data["cursor"] = instructions[-1]["id"] if instructions else since
+    response = jsonify(response_data)
+    response.set_etag(etag, weak=True)
+    response.headers["Cache-Control"] = "no-cache"
+    return response
+
+
 @app.route("/api/instructions", methods=["GET"])
 def api_get_instructions():
-    """API pour que l'Arduino récupère les instructions en attente"""
+    """API pour que l'Arduino récupère les instructions en attente
+
+    Sans paramètre : instructions de la dernière heure. Avec `since` : seulement
+    les instructions plus récentes ; `wait` (secondes) attend la prochaine.
+    Avec `device` : `since` vaut par défaut le dernier numéro acquitté.
+    """
+    device = request.args.get("device")
+    if device is not None and not 0 < len(device) <= instructions_db.DEVICE_ID_MAX:
+        return jsonify({"error": "device invalide"}), 400
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        # Récupérer les instructions depuis MyAsset
-        cursor.execute("""
-            SELECT 
-                MyAssetNumber as id,
-                MyAssetComment as commande,
-                MyAssetType as type,
-                'PENDING' as status,
-                UNIX_TIMESTAMP(MyAssetTimeStamp) as timestamp_unix
-            FROM MyAsset 
-            WHERE MyAssetType IN ('instruction', 'color') 
-            AND MyAssetTimeStamp >= DATE_SUB(NOW(), INTERVAL 1 HOUR)
-            ORDER BY MyAssetTimeStamp ASC
-        """)
-        instructions = cursor.fetchall()
+        since, attente = parametres_instructions(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
-        cursor.close()
+    try:
+        if device is not None and since is None:
+            conn = get_db_connection()
+            since = instructions_db.curseur_dispositif(conn, device)
+            conn.close()
+
+        if since is None:
+            conn = get_db_connection()
+            instructions = instructions_db.charger_derniere_heure(conn)
+            conn.close()
+        elif attente > 0:
+            instructions = instructions_db.attendre_depuis(
+                get_db_connection,
+                since,
+                attente,
+                reverification=INSTRUCTIONS_RECHECK_SECONDS,
+            )
+        else:
+            conn = get_db_connection()
+            instructions = instructions_db.charger_depuis(conn, since)
+            conn.close()
+
+        return reponse_instructions(instructions, since)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/instructions/ack", methods=["POST"])
+def api_ack_instructions():
+    """API pour qu'un dispositif acquitte les instructions exécutées
+
+    Corps : {"device": "<id>", "id": <dernier MyAssetNumber exécuté>}
+    """
+    data = request.get_json(silent=True)
+
+    if not data or "device" not in data or "id" not in data:
+        return jsonify({"error": "device et id requis"}), 400
+
+    device = data["device"]
+    if not isinstance(device, str) or not 0 < len(device) <= instructions_db.DEVICE_ID_MAX:
+        return jsonify({"error": "device invalide"}), 400
+    if not isinstance(data["id"], int) or isinstance(data["id"], bool) or data["id"] < 0:
+        return jsonify({"error": "id doit être un entier positif"}), 400
+
+    try:
+        conn = get_db_connection()
+        curseur = instructions_db.acquitter(conn, device, data["id"])
         conn.close()
-        return jsonify({"instructions": instructions}), 200
+        return jsonify({"success": True, "device": device, "cursor": curseur}), 200
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -298,103 +455,58 @@ def ajouter_capteur():
         return "Erreur: type et valeur requis", 400
 
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        ligne = ingestion.convertir_lecture(type_capteur, valeur, source="formulaire")
+    except ValueError as e:
+        return f"Erreur: {e}", 400
 
-        # Essayer de convertir en nombre, sinon traiter comme texte
-        try:
-            valeur_num = float(valeur)
-            # Déterminer l'unité selon le type
-            unite_map = {
-                "temperature": "°C",
-                "humidity": "%",
-                "pressure": "hPa",
-                "light": "lux",
-                "bouton_poussoir": "bool",
-                "button": "bool",
-            }
-            unite = unite_map.get(type_capteur, "")
-
-            cursor.execute(
-                """INSERT INTO MyAsset (MyAssetType, MyAssetName, MyAssetValue, MyAssetUnit, MyAssetComment) 
-                   VALUES (%s, %s, %s, %s, %s)""",
-                (
-                    type_capteur,
-                    f"Capteur {type_capteur}",
-                    valeur_num,
-                    unite,
-                    "Ajouté via formulaire",
-                ),
-            )
-        except ValueError:
-            # Si c'est un bouton poussoir, traiter comme booléen strict
-            if type_capteur in ["bouton_poussoir", "button"]:
-                if valeur.lower() == "true":
-                    valeur_bool = 1
-                elif valeur.lower() == "false":
-                    valeur_bool = 0
-                else:
-                    return "Erreur: bouton_poussoir doit être 'true' ou 'false'", 400
-
-                cursor.execute(
-                    """INSERT INTO MyAsset (MyAssetType, MyAssetName, MyAssetValue, MyAssetUnit, MyAssetComment) 
-                       VALUES (%s, %s, %s, %s, %s)""",
-                    (
-                        type_capteur,
-                        f"Bouton {type_capteur}",
-                        valeur_bool,
-                        "bool",
-                        "Ajouté via formulaire",
-                    ),
-                )
-            else:
-                # Sinon c'est du texte
-                cursor.execute(
-                    """INSERT INTO MyAsset (MyAssetType, MyAssetName, MyAssetValue, MyAssetUnit, MyAssetComment) 
-                       VALUES (%s, %s, %s, %s, %s)""",
-                    (type_capteur, f"Capteur {type_capteur}", 0.0, "text", valeur),
-                )
-
-        conn.commit()
-        cursor.close()
-        conn.close()
+    try:
+        enregistrer_lectures([ligne])
         return redirect("/")
+    except ingestion_buffer.IngestionQueueFull as e:
+        return f"Erreur: {e}", 503, {"Retry-After": "1"}
     except Exception as e:
         return f"Erreur lors de l'insertion: {e}", 500
 
 
-@app.route("/api/led", methods=["POST"])
-def api_led():
-    """API REST optimisée pour contrôler la LED"""
-    data = request.get_json()
-
+def commande_led(data):
+    """Valide le corps de /api/led et retourne SET_COLOR:R,G,B (ValueError sinon)"""
     if not data or "rgb" not in data:
-        return jsonify({"error": "Fournir 'rgb': [r,g,b]"}), 400
+        raise ValueError("Fournir 'rgb': [r,g,b]")
 
     rgb = data["rgb"]
     if not isinstance(rgb, list) or len(rgb) != 3:
-        return jsonify({"error": "RGB doit être [R,G,B] avec 3 valeurs"}), 400
+        raise ValueError("RGB doit être [R,G,B] avec 3 valeurs")
 
     # Valider les valeurs RGB (0-255)
     if not all(isinstance(val, int) and 0 <= val <= 255 for val in rgb):
-        return jsonify({"error": "Valeurs RGB: entiers entre 0 et 255"}), 400
+        raise ValueError("Valeurs RGB: entiers entre 0 et 255")
 
     # Format optimisé cohérent avec /couleur
-    commande = f"SET_COLOR:{rgb[0]},{rgb[1]},{rgb[2]}"
+    return f"SET_COLOR:{rgb[0]},{rgb[1]},{rgb[2]}"
+
+
+@app.route("/api/led", methods=["POST"])
+def api_led():
+    """API REST optimisée pour contrôler la LED"""
+    data = request.get_json()
+
+    try:
+        commande = commande_led(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    rgb = data["rgb"]
 
     try:
         # Sauvegarder en base de données MyAsset
         conn = get_db_connection()
         cursor = conn.cursor()
 
-        cursor.execute(
-            """INSERT INTO MyAsset (MyAssetType, MyAssetName, MyAssetValue, MyAssetUnit, MyAssetComment) 
-               VALUES (%s, %s, %s, %s, %s)""",
-            ("color", "LED API", 1.0, "rgb", commande),
-        )
-        conn.commit()
+        with metrics.chronometrer("insert_color"):
+            ingestion.inserer_ligne(cursor, ("color", "LED API", 1.0, "rgb", commande))
+            conn.commit()
         cursor.close()
         conn.close()
+        apres_nouvelle_couleur(commande)
 
         response_data = {
             "success": True,
@@ -418,90 +530,347 @@ def api_capteur():
         return jsonify({"error": "type et valeur requis"}), 400
 
     try:
-        # Sauvegarder en base de données MyAsset
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        ligne = ingestion.convertir_lecture(data["type"], data["valeur"])
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    try:
+        # Sauvegarder en base de données MyAsset (ou mettre en file en mode asynchrone)
+        database_saved = enregistrer_lectures([ligne])
+
+        response_data = {
+            "success": True,
+            "message": "Données ajoutées" if database_saved else "Données en file",
+            "database_saved": database_saved,
+        }
+
+        return jsonify(response_data), 201 if database_saved else 202
+    except ingestion_buffer.IngestionQueueFull as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 
-        # Essayer de convertir en nombre, sinon traiter comme texte
+# Marqueur d'une ligne NDJSON illisible (rejetée sans interrompre le lot)
+LIGNE_INVALIDE = object()
+
+
+def lire_lot_capteurs():
+    """Itère sur les lectures d'un lot : tableau JSON ou flux NDJSON (une par ligne)"""
+    if request.mimetype in ("application/x-ndjson", "application/jsonl"):
+        # Lecture ligne par ligne sans charger tout le corps en mémoire
+        for ligne in request.stream:
+            ligne = ligne.strip()
+            if not ligne:
+                continue
+            try:
+                yield json.loads(ligne)
+            except ValueError:
+                yield LIGNE_INVALIDE
+    else:
+        data = request.get_json(silent=True)
+        if not isinstance(data, list):
+            raise ValueError("Corps attendu: tableau JSON ou NDJSON")
+        yield from data
+
+
+@app.route("/api/capteurs", methods=["POST"])
+def api_capteurs():
+    """API REST pour envoyer un lot de lectures en une seule requête/transaction"""
+    resultats = {}
+    positions = []  # index dans le lot de chaque lecture à convertir
+    lectures = []
+
+    try:
+        for index, item in enumerate(lire_lot_capteurs()):
+            if index >= BATCH_MAX_READINGS:
+                return jsonify(
+                    {"error": f"Maximum {BATCH_MAX_READINGS} lectures par lot"}
+                ), 413
+            if item is LIGNE_INVALIDE:
+                resultats[index] = {"index": index, "error": "JSON invalide"}
+                continue
+            if not isinstance(item, dict) or "type" not in item or "valeur" not in item:
+                resultats[index] = {"index": index, "error": "type et valeur requis"}
+                continue
+            positions.append(index)
+            lectures.append((item["type"], item["valeur"]))
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    if not resultats and not lectures:
+        return jsonify({"error": "Aucune lecture fournie"}), 400
+
+    # Conversion du lot en une passe, sans exception par lecture invalide
+    lignes, erreurs = ingestion.coerce_many(lectures)
+    for position, message in erreurs:
+        index = positions[position]
+        resultats[index] = {"index": index, "error": message}
+    for index in positions:
+        resultats.setdefault(index, {"index": index, "status": "accepted"})
+    resultats = [resultats[index] for index in sorted(resultats)]
+
+    database_saved = False
+    if lignes:
+        try:
+            database_saved = enregistrer_lectures(lignes)
+        except ingestion_buffer.IngestionQueueFull as e:
+            return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    response_data = {
+        "success": bool(lignes),
+        "accepted": len(lignes),
+        "rejected": len(resultats) - len(lignes),
+        "results": resultats,
+        "database_saved": database_saved,
+    }
+
+    if not lignes:
+        return jsonify(response_data), 400
+    return jsonify(response_data), 201 if database_saved else 202
+
+
+@app.route("/api/capteurs/bin", methods=["POST"])
+def api_capteurs_binaire():
+    """API compacte pour microcontrôleurs : lot de lectures en trame binaire
+
+    Format décrit dans binary_ingest.py ; réponse JSON identique à /api/capteurs
+    mais limitée aux lectures rejetées.
+    """
+    taille_max = binary_ingest.taille_max(BATCH_MAX_READINGS)
+    if request.content_length is not None and request.content_length > taille_max:
+        return jsonify({"error": f"Trame limitée à {taille_max} octets"}), 413
+
+    try:
+        lignes, erreurs = decodeur_binaire.decoder(
+            request.get_data(cache=False), BATCH_MAX_READINGS
+        )
+    except binary_ingest.TrameTropGrande as e:
+        return jsonify({"error": str(e)}), 413
+    except binary_ingest.TrameInvalide as e:
+        return jsonify({"error": str(e)}), 400
+
+    if not lignes and not erreurs:
+        return jsonify({"error": "Aucune lecture fournie"}), 400
+
+    database_saved = False
+    if lignes:
         try:
-            valeur_num = float(data["valeur"])
-            # Déterminer l'unité selon le type
-            unite_map = {
-                "temperature": "°C",
-                "humidity": "%",
-                "pressure": "hPa",
-                "light": "lux",
-                "bouton_poussoir": "bool",
-                "button": "bool",
+            database_saved = enregistrer_lectures(lignes)
+        except ingestion_buffer.IngestionQueueFull as e:
+            return jsonify({"error": str(e)}), 503, {"Retry-After": "1"}
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+
+    response_data = {
+        "success": bool(lignes),
+        "accepted": len(lignes),
+        "rejected": len(erreurs),
+        "errors": erreurs,
+        "database_saved": database_saved,
+    }
+
+    if not lignes:
+        return jsonify(response_data), 400
+    return jsonify(response_data), 201 if database_saved else 202
+
+
+@app.route("/api/stream", methods=["GET"])
+def api_stream():
+    """Flux Server-Sent Events des nouvelles lectures pour le tableau de bord"""
+    # Abonnement avant la réponse : 503 plutôt qu'un thread de plus occupé
+    try:
+        file = live_stream.diffuseur.abonner()
+    except live_stream.TropDAbonnes as e:
+        return jsonify({"error": str(e)}), 503, {"Retry-After": "5"}
+    response = Response(
+        live_stream.diffuseur.flux(file),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+    # Client parti avant le premier octet : le générateur n'a jamais démarré
+    response.call_on_close(lambda: live_stream.diffuseur.desabonner(file))
+    return response
+
+
+@app.route("/api/series", methods=["GET"])
+def api_series():
+    """Série agrégée (min/max/moyenne) d'un type de capteur pour les graphiques"""
+    type_capteur = request.args.get("type")
+    if not type_capteur:
+        return jsonify({"error": "type requis"}), 400
+
+    try:
+        fin = export.lire_epoch(request.args.get("end"), time.time())
+        debut = export.lire_epoch(request.args.get("start"), fin - 86400)
+        points = min(
+            int(request.args.get("points", rollups.POINTS_DEFAUT)), rollups.POINTS_MAX
+        )
+    except ValueError:
+        return jsonify({"error": "start/end: epoch ou ISO 8601, points: entier"}), 400
+
+    if debut >= fin or points <= 0:
+        return jsonify({"error": "Intervalle ou nombre de points invalide"}), 400
+
+    try:
+        conn = get_db_connection()
+        resolution, serie = rollups.charger_serie(
+            conn,
+            ingestion.type_stocke(type_capteur),
+            int(debut),
+            int(fin),
+            nom=request.args.get("name"),
+            points=points,
+        )
+        conn.close()
+        return jsonify(
+            {
+                "type": type_capteur,
+                "name": request.args.get("name"),
+                "resolution": resolution,
+                "start": int(debut),
+                "end": int(fin),
+                "points": serie,
             }
-            unite = unite_map.get(data["type"], "")
-
-            cursor.execute(
-                """INSERT INTO MyAsset (MyAssetType, MyAssetName, MyAssetValue, MyAssetUnit, MyAssetComment) 
-                   VALUES (%s, %s, %s, %s, %s)""",
-                (
-                    data["type"],
-                    f"API {data['type']}",
-                    valeur_num,
-                    unite,
-                    "Ajouté via API",
-                ),
-            )
-        except (ValueError, TypeError):
-            # Si c'est un bouton poussoir, traiter comme booléen strict
-            if data["type"] in ["bouton_poussoir", "button"]:
-                valeur_str = str(data["valeur"]).lower()
-                if valeur_str == "true":
-                    valeur_bool = 1
-                elif valeur_str == "false":
-                    valeur_bool = 0
-                else:
-                    return jsonify(
-                        {"error": "bouton_poussoir doit être 'true' ou 'false'"}
-                    ), 400
-
-                cursor.execute(
-                    """INSERT INTO MyAsset (MyAssetType, MyAssetName, MyAssetValue, MyAssetUnit, MyAssetComment) 
-                       VALUES (%s, %s, %s, %s, %s)""",
-                    (
-                        data["type"],
-                        f"API {data['type']}",
-                        valeur_bool,
-                        "bool",
-                        "Ajouté via API",
-                    ),
-                )
-            else:
-                # Sinon c'est du texte
-                cursor.execute(
-                    """INSERT INTO MyAsset (MyAssetType, MyAssetName, MyAssetValue, MyAssetUnit, MyAssetComment) 
-                       VALUES (%s, %s, %s, %s, %s)""",
-                    (
-                        data["type"],
-                        f"API {data['type']}",
-                        0.0,
-                        "text",
-                        str(data["valeur"]),
-                    ),
-                )
+        ), 200
+    except rollups.RollupsIndisponibles as e:
+        conn.close()
+        return jsonify({"error": f"Séries indisponibles: {e}"}), 503
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        conn.commit()
-        cursor.close()
+
+@app.route("/api/history", methods=["GET"])
+def api_history():
+    """Historique d'un type de capteur, page par page (pagination par clé)"""
+    type_capteur = request.args.get("type")
+    if not type_capteur:
+        return jsonify({"error": "type requis"}), 400
+
+    try:
+        avant = request.args.get("before")
+        avant = int(avant) if avant else None
+        limite = min(
+            int(request.args.get("limit", dashboard.LIMITE_HISTORIQUE)),
+            dashboard.LIMITE_HISTORIQUE_MAX,
+        )
+    except ValueError:
+        return jsonify({"error": "before et limit doivent être des entiers"}), 400
+    if limite <= 0:
+        return jsonify({"error": "limit doit être positif"}), 400
+
+    try:
+        conn = get_db_connection()
+        capteurs, suivante = dashboard.charger_historique(
+            conn, type_capteur, avant=avant, limite=limite
+        )
         conn.close()
+    except LookupError as e:
+        return jsonify({"error": str(e)}), 404
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
 
-        response_data = {
-            "success": True,
-            "message": "Données ajoutées",
-            "database_saved": True,
+    return jsonify(
+        {
+            "type": type_capteur,
+            "before": avant,
+            "limit": limite,
+            "next_before": suivante,
+            "readings": [live_stream.serialiser_capteur(c) for c in capteurs],
         }
+    ), 200
 
-        return jsonify(response_data), 201
+
+@app.route("/api/export", methods=["GET"])
+def api_export():
+    """Export en flux de l'historique MyAsset (CSV ou NDJSON, gzip optionnel)"""
+    format_export = request.args.get("format", "csv")
+    if format_export not in export.FORMATS:
+        return jsonify({"error": f"format: {', '.join(export.FORMATS)}"}), 400
+    try:
+        fin = export.lire_epoch(request.args.get("end"), time.time())
+        debut = export.lire_epoch(request.args.get("start"), 0)
+    except ValueError:
+        return jsonify({"error": "start/end: epoch ou ISO 8601"}), 400
+    if debut >= fin:
+        return jsonify({"error": "Intervalle invalide"}), 400
+
+    try:
+        # Pas get_db_connection() : le flux est lu après la fin de la requête,
+        # la connexion est rendue par Export.close()
+        flux = export.Export(
+            db_pool.get_connection(),
+            int(debut),
+            int(fin),
+            type_capteur=request.args.get("type"),
+            nom=request.args.get("name"),
+            format_export=format_export,
+            compresse=request.args.get("gzip", "0").lower() in ("1", "true", "yes"),
+        )
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+    return Response(
+        flux,
+        mimetype="application/gzip" if flux.compresse else flux.mimetype,
+        headers={
+            "Content-Disposition": f'attachment; filename="{flux.nom_fichier}"',
+            "Cache-Control": "no-cache",
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+@app.route("/ready", methods=["GET"])
+def ready():
+    """Sonde de disponibilité (répartiteur de charge, rechargement progressif)"""
+    try:
+        conn = get_db_connection()
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1")
+        cursor.fetchone()
+        cursor.close()
+        conn.close()
+    except Exception as e:
+        return jsonify({"ready": False, "error": str(e)}), 503
+    return jsonify({"ready": True, "pid": os.getpid()}), 200
+
+
+@app.route("/api/stats", methods=["GET"])
+def api_stats():
+    """Statistiques internes (pool, cache, file d'ingestion, flux SSE, envoi Raspberry)"""
+    stats = {
+        "db_pool": db_pool.get_pool().stats(),
+        "cache": cache_lecture.stats(),
+        "stream": {"subscribers": live_stream.diffuseur.nombre_abonnes},
+        "raspberry": raspberry.stats(),
+    }
+    if tampon_ingestion is not None:
+        stats["ingestion"] = tampon_ingestion.stats()
+    return jsonify(stats), 200
+
+
+# Jauges lues à chaque exposition de /metrics
+metrics.ajouter_stats("db_pool", lambda: db_pool.get_pool().stats())
+metrics.ajouter_stats("dashboard_cache", cache_lecture.stats)
+metrics.ajouter_stats("raspberry", raspberry.stats)
+metrics.ajouter_stats(
+    "stream", lambda: {"subscribers": live_stream.diffuseur.nombre_abonnes}
+)
+if tampon_ingestion is not None:
+    metrics.ajouter_stats("ingestion_buffer", tampon_ingestion.stats)
+
+
+@app.route("/metrics", methods=["GET"])
+def api_metrics():
+    """Métriques au format d'exposition texte de Prometheus"""
+    return Response(metrics.exposer(), content_type=metrics.CONTENT_TYPE)
+
 
 if __name__ == "__main__":
-    # Configuration pour production/développement
+    # Serveur de développement (en production : python serve.py)
     port = int(os.environ.get("PORT", 5000))
     debug = os.environ.get("FLASK_ENV") == "development"
     app.run(host="0.0.0.0", port=port, debug=debug)
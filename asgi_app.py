@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+"""
+Point d'entrée ASGI pour les flottes de dispositifs
+
+/api/capteur, /api/led et /api/instructions sont servies par des handlers
+asynchrones sur un pool aiomysql partagé : une requête en attente de MariaDB
+ou en long-poll n'occupe aucun thread. Toutes les autres routes sont
+déléguées à l'application Flask (asgiref WsgiToAsgi). Les contrats sont ceux
+de app.py : même conversion des lectures, mêmes requêtes SQL, mêmes réponses
+JSON, ETag et compression.
+
+Lancement :
+    uvicorn asgi_app:application --host 0.0.0.0 --port 5000
+
+Configuration par variables d'environnement (en plus de DB_* et de app.py) :
+    ASYNC_DB_POOL_MIN    connexions ouvertes au démarrage (défaut 1)
+    ASYNC_DB_POOL_MAX    connexions maximum du pool asynchrone (défaut 20)
+"""
+
+import asyncio
+import io
+import os
+import time
+from contextlib import asynccontextmanager
+
+import aiomysql
+import pymysql
+from asgiref.wsgi import WsgiToAsgi
+from werkzeug.exceptions import HTTPException
+from werkzeug.wrappers import Request
+
+import app as flask_app
+import compression
+import ingestion
+import ingestion_buffer
+import instructions as instructions_db
+import metrics
+import normalized_storage
+import notifications
+import rollups
+
+wsgi = WsgiToAsgi(flask_app.app)
+
+# Créés au démarrage (lifespan)
+pool = None
+reveil_instructions = None
+
+
+class ReveilAsync:
+    """Attente asynchrone des notifications d'un Notificateur (écrit par des threads)"""
+
+    def __init__(self, notificateur, loop):
+        self.notificateur = notificateur
+        self.loop = loop
+        self._futur = loop.create_future()
+        notificateur.ajouter_rappel(self._notifier)
+
+    @property
+    def sequence(self):
+        return self.notificateur.sequence
+
+    def _notifier(self):
+        # Appelé depuis n'importe quel thread
+        self.loop.call_soon_threadsafe(self._reveiller)
+
+    def _reveiller(self):
+        futur, self._futur = self._futur, self.loop.create_future()
+        futur.set_result(None)
+
+    async def attendre(self, sequence_vue, timeout):
+        """Comme Notificateur.attendre() : retourne la séquence courante"""
+        if self.notificateur.sequence == sequence_vue:
+            try:
+                await asyncio.wait_for(asyncio.shield(self._futur), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self.notificateur.sequence
+
+    def fermer(self):
+        self.notificateur.retirer_rappel(self._notifier)
+
+
+@asynccontextmanager
+async def transaction():
+    """Curseur sur une connexion du pool ; commit à la sortie, rollback en cas d'erreur"""
+    async with pool.acquire() as conn:
+        try:
+            async with conn.cursor() as cursor:
+                yield cursor
+            await conn.commit()
+        except BaseException:
+            await conn.rollback()
+            raise
+
+
+async def lire(requete, params=None, nom="instructions"):
+    async with pool.acquire() as conn:
+        async with conn.cursor(aiomysql.DictCursor) as cursor:
+            with metrics.chronometrer(nom):
+                await cursor.execute(requete, params)
+                lignes = await cursor.fetchall()
+        # Terminer la transaction de lecture (instantané REPEATABLE READ)
+        await conn.rollback()
+    return list(lignes)
+
+
+async def resoudre_capteurs(cursor, lignes):
+    """Équivalent asynchrone de normalized_storage.resoudre() (même curseur)"""
+    if not normalized_storage.actif:
+        return None
+    ids = {}
+    for cle in sorted(set(map(normalized_storage.cle_capteur, lignes))):
+        identifiant = normalized_storage.id_connu(cle)
+        if identifiant is None:
+            await cursor.execute(normalized_storage.INSERT_CAPTEUR_SQL, cle)
+            cree = cursor.rowcount == 1
+            await cursor.execute(normalized_storage.SELECT_CAPTEUR_SQL, cle)
+            identifiant = (await cursor.fetchone())[0]
+            if not cree:
+                normalized_storage.memoriser(cle, identifiant)
+        ids[cle] = identifiant
+    return ids
+
+
+async def inserer_lignes(cursor, lignes, agregats=True):
+    """Équivalent asynchrone de ingestion.inserer_lignes()"""
+    with metrics.chronometrer("insert"):
+        capteurs = await resoudre_capteurs(cursor, lignes)
+        for requete, groupe in ingestion.requetes_insertion(lignes, capteurs):
+            if len(groupe) == 1:
+                await cursor.execute(requete, groupe[0])
+            else:
+                await cursor.executemany(requete, groupe)
+
+        params = rollups.agreger(lignes) if agregats and rollups.actif else None
+        if params:
+            try:
+                await cursor.executemany(rollups.UPSERT_SQL, params)
+            except pymysql.err.ProgrammingError as e:
+                if e.args[0] != 1146:  # ER_NO_SUCH_TABLE
+                    raise
+                rollups.desactiver(e.args[1])
+    metrics.compter_lignes(lignes)
+
+
+async def enregistrer_lectures(lignes):
+    """Équivalent asynchrone de app.enregistrer_lectures()"""
+    tampon = flask_app.tampon_ingestion
+    if tampon is not None:
+        # La politique "block" peut attendre : hors de la boucle d'événements
+        await asyncio.to_thread(tampon.submit, lignes)
+        return False
+
+    differer = rollups.a_differer(lignes)
+    async with transaction() as cursor:
+        await inserer_lignes(cursor, lignes, agregats=not differer)
+    if differer:
+        rollups.differer(lignes)
+    flask_app.apres_nouvelles_lectures()
+    return True
+
+
+async def capteurs_instructions():
+    """Équivalent asynchrone de instructions.capteurs_instructions()"""
+    if not normalized_storage.actif:
+        return None
+    lignes = await lire(
+        normalized_storage.requete_capteurs(instructions_db.TYPES),
+        instructions_db.TYPES,
+    )
+    return [ligne["SensorId"] for ligne in lignes]
+
+
+async def lire_instructions(construire, *args):
+    """Exécuter la requête `construire(capteurs, *args)` de instructions.py"""
+    return await lire(*construire(await capteurs_instructions(), *args))
+
+
+async def curseur_dispositif(device):
+    """Équivalent asynchrone de instructions.curseur_dispositif()"""
+    async with transaction() as cursor:
+        with metrics.chronometrer("device_cursor"):
+            await cursor.execute(instructions_db.CURSEUR_SQL, (device,))
+            ligne = await cursor.fetchone()
+            if ligne is not None:
+                return ligne[0]
+            capteurs = None
+            if normalized_storage.actif:
+                # Sur le curseur de la transaction : pas de seconde connexion
+                await cursor.execute(
+                    normalized_storage.requete_capteurs(instructions_db.TYPES),
+                    instructions_db.TYPES,
+                )
+                capteurs = [ligne[0] for ligne in await cursor.fetchall()]
+            await cursor.execute(*instructions_db.requete_curseur_initial(capteurs))
+            curseur = (await cursor.fetchone())[0]
+            await cursor.execute(instructions_db.CREER_CURSEUR_SQL, (device, curseur))
+    return curseur
+
+
+async def attendre_depuis(since, attente, limite=instructions_db.LIMITE_DEFAUT):
+    """Équivalent asynchrone de instructions.attendre_depuis()"""
+    fin = time.monotonic() + attente
+    reverification = flask_app.INSTRUCTIONS_RECHECK_SECONDS
+    delai = reverification
+    while True:
+        # Lire la séquence avant la requête pour ne perdre aucun réveil
+        sequence = reveil_instructions.sequence
+        lignes = await lire_instructions(instructions_db.requete_depuis, since, limite)
+
+        restant = fin - time.monotonic()
+        if lignes or restant <= 0:
+            return lignes
+        nouvelle = await reveil_instructions.attendre(sequence, min(restant, delai))
+        reveil = nouvelle != sequence
+        delai = instructions_db.delai_apres_reveil(reveil, reverification)
+
+
+def erreur(message, statut, headers=None):
+    return flask_app.jsonify({"error": message}), statut, headers or {}
+
+
+async def api_capteur(requete):
+    data = requete.get_json()
+
+    if not data or "type" not in data or "valeur" not in data:
+        return erreur("type et valeur requis", 400)
+
+    try:
+        ligne = ingestion.convertir_lecture(data["type"], data["valeur"])
+    except ValueError as e:
+        return erreur(str(e), 400)
+
+    try:
+        database_saved = await enregistrer_lectures([ligne])
+
+        response_data = {
+            "success": True,
+            "message": "Données ajoutées" if database_saved else "Données en file",
+            "database_saved": database_saved,
+        }
+
+        return flask_app.jsonify(response_data), 201 if database_saved else 202
+    except ingestion_buffer.IngestionQueueFull as e:
+        return erreur(str(e), 503, {"Retry-After": "1"})
+    except Exception as e:
+        return erreur(str(e), 500)
+
+
+async def api_led(requete):
+    data = requete.get_json()
+
+    try:
+        commande = flask_app.commande_led(data)
+    except ValueError as e:
+        return erreur(str(e), 400)
+
+    try:
+        ligne = ("color", "LED API", 1.0, "rgb", commande)
+        async with transaction() as cursor:
+            with metrics.chronometrer("insert_color"):
+                capteurs = await resoudre_capteurs(cursor, [ligne])
+                requete, groupe = ingestion.requetes_insertion([ligne], capteurs)[0]
+                await cursor.execute(requete, groupe[0])
+        flask_app.apres_nouvelle_couleur(commande)
+
+        response_data = {
+            "success": True,
+            "message": "Commande LED envoyée",
+            "rgb": data["rgb"],
+            "database_saved": True,
+        }
+
+        return flask_app.jsonify(response_data), 201
+    except Exception as e:
+        return erreur(str(e), 500)
+
+
+async def api_instructions(requete):
+    device = requete.args.get("device")
+    if device is not None and not 0 < len(device) <= instructions_db.DEVICE_ID_MAX:
+        return erreur("device invalide", 400)
+    try:
+        since, attente = flask_app.parametres_instructions(requete.args)
+    except ValueError as e:
+        return erreur(str(e), 400)
+
+    try:
+        if device is not None and since is None:
+            since = await curseur_dispositif(device)
+
+        if since is None:
+            instructions = await lire_instructions(
+                instructions_db.requete_derniere_heure
+            )
+        elif attente > 0:
+            instructions = await attendre_depuis(since, attente)
+        else:
+            instructions = await lire_instructions(
+                instructions_db.requete_depuis, since
+            )
+
+        return flask_app.reponse_instructions(instructions, since, requete)
+    except Exception as e:
+        return erreur(str(e), 500)
+
+
+ROUTES_ASYNC = {
+    ("POST", "/api/capteur"): api_capteur,
+    ("POST", "/api/led"): api_led,
+    ("GET", "/api/instructions"): api_instructions,
+}
+
+
+def environ_depuis_scope(scope, corps):
+    """Environnement WSGI minimal pour analyser la requête avec werkzeug"""
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", ""),
+        "PATH_INFO": scope["path"],
+        "QUERY_STRING": scope["query_string"].decode("latin-1"),
+        "SERVER_PROTOCOL": f"HTTP/{scope['http_version']}",
+        "SERVER_NAME": "asgi",
+        "SERVER_PORT": "0",
+        "REMOTE_ADDR": (scope.get("client") or ("", 0))[0],
+        "CONTENT_LENGTH": str(len(corps)),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": io.BytesIO(corps),
+    }
+    for nom, valeur in scope["headers"]:
+        nom = nom.decode("latin-1").upper().replace("-", "_")
+        valeur = valeur.decode("latin-1")
+        if nom == "CONTENT_TYPE":
+            environ[nom] = valeur
+        elif nom != "CONTENT_LENGTH":
+            cle = f"HTTP_{nom}"
+            environ[cle] = f"{environ[cle]},{valeur}" if cle in environ else valeur
+    return environ
+
+
+async def lire_corps(receive):
+    morceaux = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        morceaux.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(morceaux)
+
+
+async def servir(handler, scope, receive, send):
+    debut = time.perf_counter()
+    requete = Request(environ_depuis_scope(scope, await lire_corps(receive)))
+    with flask_app.app.app_context():
+        try:
+            response = flask_app.app.make_response(await handler(requete))
+        except HTTPException as e:
+            # Corps JSON absent ou invalide : même réponse que Flask
+            response = e.get_response()
+        response = compression.compresser_reponse(requete, response)
+    metrics.observer_requete_http(
+        handler.__name__,
+        requete.method,
+        response.status_code,
+        time.perf_counter() - debut,
+    )
+
+    await send(
+        {
+            "type": "http.response.start",
+            "status": response.status_code,
+            "headers": [
+                (nom.lower().encode("latin-1"), valeur.encode("latin-1"))
+                for nom, valeur in response.headers.items()
+            ],
+        }
+    )
+    await send({"type": "http.response.body", "body": response.get_data()})
+
+
+async def lifespan(receive, send):
+    global pool, reveil_instructions
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            try:
+                pool = await aiomysql.create_pool(
+                    host=os.getenv("DB_HOST"),
+                    user=os.getenv("DB_USER"),
+                    password=os.getenv("DB_PASSWORD"),
+                    db=os.getenv("DB_NAME"),
+                    charset="utf8mb4",
+                    minsize=int(os.getenv("ASYNC_DB_POOL_MIN", 1)),
+                    maxsize=int(os.getenv("ASYNC_DB_POOL_MAX", 20)),
+                    pool_recycle=int(float(os.getenv("DB_POOL_IDLE_TIMEOUT", 300))),
+                )
+            except Exception as e:
+                print(f"❌ Pool MariaDB asynchrone indisponible: {e}")
+                await send({"type": "lifespan.startup.failed", "message": str(e)})
+                return
+            reveil_instructions = ReveilAsync(
+                notifications.instructions, asyncio.get_running_loop()
+            )
+            flask_app.demarrer_taches_fond()
+            print("✅ Serveur ASGI prêt")
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            reveil_instructions.fermer()
+            pool.close()
+            await pool.wait_closed()
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def application(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await lifespan(receive, send)
+        return
+
+    handler = None
+    if scope["type"] == "http":
+        handler = ROUTES_ASYNC.get((scope["method"], scope["path"]))
+    if handler is None:
+        await wsgi(scope, receive, send)
+    else:
+        await servir(handler, scope, receive, send)
@@ -0,0 +1,586 @@
+#!/usr/bin/env python3
+"""
+Banc d'essai des chemins d'ingestion et de lecture de app.py
+
+Étapes :
+1. base : MariaDB configurée dans .env, ou base SQLite de substitution
+   (--sqlite, pour la CI) créée dans un fichier temporaire ;
+2. peuplement : MyAsset est complétée par reset_database.peupler() jusqu'à
+   chaque taille de --lignes (ex. 10000,100000,1000000) pour suivre
+   l'évolution des latences avec le volume ;
+3. charge : pour chaque taille, `--concurrence` threads envoient
+   `--requetes` requêtes par scénario, en processus (client de test Flask)
+   ou vers un serveur lancé à part (--url) ;
+4. résultat JSON sur la sortie standard (messages sur la sortie d'erreur) :
+   débit, latences p50/p95/p99 et requêtes SQL par requête HTTP (en
+   processus seulement), à comparer d'un commit à l'autre.
+
+Scénarios :
+    ingestion     POST /api/capteur
+    dashboard     GET /
+    instructions  GET /api/instructions?device=...
+    led           POST /api/led
+
+Usage:
+    python benchmark.py --sqlite --lignes 10000,100000
+    python benchmark.py --lignes 1000000 --confirm
+    python benchmark.py --url http://127.0.0.1:5000 --lignes 0
+    python benchmark.py --sqlite > bench-$(git rev-parse --short HEAD).json
+
+Avec MariaDB, les lectures synthétiques sont ajoutées à la base configurée :
+utiliser une base dédiée (--confirm est exigé). Avec STORAGE_MODE=normalized,
+la base SQLite reprend le stockage normalisé (MyAssetSensor, MyAssetReading et
+vue MyAsset) pour comparer les deux modes.
+"""
+
+import argparse
+import contextlib
+import functools
+import itertools
+import json
+import os
+import re
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+import db_pool
+import normalized_storage
+import reset_database
+import rollups
+
+# Charger les variables d'environnement
+load_dotenv()
+
+SCENARIOS_DEFAUT = "ingestion,dashboard,instructions,led"
+TYPES_INGESTION = ("temperature", "humidity", "pressure", "light")
+DISPOSITIFS = 16
+
+# Schéma MyAsset équivalent à reset_database.py + migrate_database.py
+SCHEMA_SQLITE = (
+    """
+    CREATE TABLE MyAsset (
+        MyAssetNumber INTEGER PRIMARY KEY AUTOINCREMENT,
+        MyAssetType CHAR(12) NOT NULL,
+        MyAssetName CHAR(20) NOT NULL,
+        MyAssetValue FLOAT NOT NULL,
+        MyAssetUnit CHAR(12) NOT NULL,
+        MyAssetComment TEXT,
+        MyAssetTimeStamp TIMESTAMP DEFAULT (datetime('now', 'localtime'))
+    )
+    """,
+    "CREATE INDEX idx_myasset_type_ts ON MyAsset (MyAssetType, MyAssetTimeStamp)",
+    "CREATE INDEX idx_myasset_type_number ON MyAsset (MyAssetType, MyAssetNumber)",
+    """
+    CREATE TABLE MyAssetDevice (
+        DeviceId VARCHAR(64) NOT NULL PRIMARY KEY,
+        LastAckNumber INT NOT NULL DEFAULT 0,
+        LastAckAt TIMESTAMP NULL DEFAULT NULL
+    )
+    """,
+)
+
+# Équivalent SQLite de normalized_storage.convertir()
+SCHEMA_SQLITE_NORMALISE = (
+    """
+    CREATE TABLE MyAssetSensor (
+        SensorId INTEGER PRIMARY KEY AUTOINCREMENT,
+        MyAssetType CHAR(12) NOT NULL,
+        MyAssetName CHAR(20) NOT NULL,
+        MyAssetUnit CHAR(12) NOT NULL,
+        MyAssetComment VARCHAR(64) NOT NULL DEFAULT '',
+        UNIQUE (MyAssetType, MyAssetName, MyAssetUnit, MyAssetComment)
+    )
+    """,
+    "CREATE INDEX idx_sensor_type ON MyAssetSensor (MyAssetType)",
+    """
+    CREATE TABLE MyAssetReading (
+        MyAssetNumber INTEGER PRIMARY KEY AUTOINCREMENT,
+        SensorId SMALLINT NOT NULL,
+        MyAssetTimeStamp TIMESTAMP NOT NULL DEFAULT (datetime('now', 'localtime')),
+        MyAssetValue FLOAT NOT NULL,
+        ReadingText TEXT NULL
+    )
+    """,
+    "CREATE INDEX idx_reading_sensor_ts "
+    "ON MyAssetReading (SensorId, MyAssetTimeStamp, MyAssetNumber)",
+    "CREATE INDEX idx_reading_sensor_nb ON MyAssetReading (SensorId, MyAssetNumber)",
+    """
+    CREATE VIEW MyAsset AS
+    SELECT r.MyAssetNumber, s.MyAssetType, s.MyAssetName, r.MyAssetValue,
+           s.MyAssetUnit,
+           COALESCE(r.ReadingText, NULLIF(s.MyAssetComment, '')) AS MyAssetComment,
+           r.MyAssetTimeStamp
+    FROM MyAssetReading r
+    JOIN MyAssetSensor s ON s.SensorId = r.SensorId
+    """,
+) + SCHEMA_SQLITE[3:]
+
+# Syntaxe MariaDB utilisée par les chemins mesurés -> équivalent SQLite
+TRADUCTIONS_SQLITE = (
+    (re.compile(r"%s"), "?"),
+    (
+        re.compile(r"DATE_SUB\(NOW\(\), INTERVAL (\d+) (HOUR|SECOND)\)"),
+        r"datetime('now', 'localtime', '-\1 \2S')",
+    ),
+    (re.compile(r"NOW\(\)"), "datetime('now', 'localtime')"),
+    (re.compile(r"INSERT IGNORE"), "INSERT OR IGNORE"),
+    (re.compile(r"\s*LOCK IN SHARE MODE"), ""),
+    (re.compile(r"ON DUPLICATE KEY UPDATE"), "ON CONFLICT DO UPDATE SET"),
+    (re.compile(r"VALUES\((\w+)\)"), r"excluded.\1"),
+)
+
+sqlite3.register_adapter(datetime, lambda d: d.strftime("%Y-%m-%d %H:%M:%S"))
+
+
+@functools.lru_cache(maxsize=256)
+def traduire(requete):
+    """Requête MariaDB -> requête SQLite"""
+    for motif, remplacement in TRADUCTIONS_SQLITE:
+        requete = motif.sub(remplacement, requete)
+    return requete
+
+
+def _unix_timestamp(valeur=None):
+    if valeur is None:
+        return int(time.time())
+    return int(datetime.fromisoformat(valeur).timestamp())
+
+
+class CurseurSQLite:
+    """Curseur SQLite avec l'interface de mysql.connector utilisée par l'application"""
+
+    def __init__(self, conn, dictionary=False):
+        self._curseur = conn.cursor()
+        self._dictionnaire = dictionary
+
+    def execute(self, requete, params=None):
+        self._curseur.execute(traduire(requete), tuple(params or ()))
+
+    def executemany(self, requete, params):
+        self._curseur.executemany(traduire(requete), [tuple(p) for p in params])
+
+    def _ligne(self, ligne):
+        if ligne is None or not self._dictionnaire:
+            return ligne
+        return dict(zip((d[0] for d in self._curseur.description), ligne))
+
+    def fetchone(self):
+        return self._ligne(self._curseur.fetchone())
+
+    def fetchmany(self, taille=1):
+        return [self._ligne(ligne) for ligne in self._curseur.fetchmany(taille)]
+
+    def fetchall(self):
+        return [self._ligne(ligne) for ligne in self._curseur.fetchall()]
+
+    def __iter__(self):
+        for ligne in self._curseur:
+            yield self._ligne(ligne)
+
+    @property
+    def rowcount(self):
+        return self._curseur.rowcount
+
+    @property
+    def lastrowid(self):
+        return self._curseur.lastrowid
+
+    @property
+    def description(self):
+        return self._curseur.description
+
+    def close(self):
+        self._curseur.close()
+
+
+class ConnexionSQLite:
+    """Connexion brute SQLite remplaçant mysql.connector dans le pool"""
+
+    def __init__(self, chemin):
+        self._conn = sqlite3.connect(chemin, timeout=30, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.create_function("UNIX_TIMESTAMP", 0, _unix_timestamp)
+        self._conn.create_function("UNIX_TIMESTAMP", 1, _unix_timestamp)
+        self._conn.create_function("GREATEST", -1, max)
+
+    @property
+    def in_transaction(self):
+        return self._conn.in_transaction
+
+    def is_connected(self):
+        return True
+
+    def cursor(self, dictionary=False, **options):
+        return CurseurSQLite(self._conn, dictionary)
+
+    def commit(self):
+        self._conn.commit()
+
+    def rollback(self):
+        self._conn.rollback()
+
+    def close(self):
+        self._conn.close()
+
+
+def creer_base_sqlite(chemin):
+    """Créer le schéma MyAsset dans un fichier SQLite vide"""
+    conn = sqlite3.connect(chemin)
+    schema = SCHEMA_SQLITE_NORMALISE if normalized_storage.actif else SCHEMA_SQLITE
+    for requete in schema:
+        conn.execute(requete)
+    conn.commit()
+    conn.close()
+
+
+class CompteurRequetes:
+    """Nombre de requêtes SQL exécutées par toutes les connexions du pool"""
+
+    def __init__(self):
+        self._verrou = threading.Lock()
+        self.valeur = 0
+
+    def ajouter(self, nombre=1):
+        with self._verrou:
+            self.valeur += nombre
+
+
+class CurseurCompte:
+    """Curseur dont chaque execute()/executemany() est compté"""
+
+    def __init__(self, curseur, compteur):
+        self._curseur = curseur
+        self._compteur = compteur
+
+    def execute(self, *args, **kwargs):
+        self._compteur.ajouter()
+        return self._curseur.execute(*args, **kwargs)
+
+    def executemany(self, *args, **kwargs):
+        # Un executemany est un seul aller-retour (INSERT multi-lignes)
+        self._compteur.ajouter()
+        return self._curseur.executemany(*args, **kwargs)
+
+    def __iter__(self):
+        return iter(self._curseur)
+
+    def __getattr__(self, nom):
+        return getattr(self._curseur, nom)
+
+
+class ConnexionComptee:
+    """Connexion brute dont les curseurs comptent leurs requêtes"""
+
+    def __init__(self, raw, compteur):
+        self._raw = raw
+        self._compteur = compteur
+
+    def cursor(self, *args, **kwargs):
+        return CurseurCompte(self._raw.cursor(*args, **kwargs), self._compteur)
+
+    def __getattr__(self, nom):
+        return getattr(self._raw, nom)
+
+
+class ClientHTTP:
+    """Même interface que le client de test Flask, vers un serveur lancé à part"""
+
+    def __init__(self, url):
+        import requests
+
+        self.url = url.rstrip("/")
+        self.session = requests.Session()
+
+    def get(self, chemin, **kwargs):
+        return self.session.get(self.url + chemin, **kwargs)
+
+    def post(self, chemin, **kwargs):
+        return self.session.post(self.url + chemin, **kwargs)
+
+
+def requete_ingestion(client, i):
+    type_capteur = TYPES_INGESTION[i % len(TYPES_INGESTION)]
+    return client.post(
+        "/api/capteur", json={"type": type_capteur, "valeur": 15 + i % 200 / 10}
+    )
+
+
+def requete_dashboard(client, i):
+    return client.get("/")
+
+
+def requete_instructions(client, i):
+    return client.get(f"/api/instructions?device=bench-{i % DISPOSITIFS}")
+
+
+def requete_led(client, i):
+    return client.post("/api/led", json={"rgb": [i % 256, i * 7 % 256, i * 13 % 256]})
+
+
+SCENARIOS = {
+    "ingestion": requete_ingestion,
+    "dashboard": requete_dashboard,
+    "instructions": requete_instructions,
+    "led": requete_led,
+}
+
+
+def percentile(latences, p):
+    """Latence au rang p (0-1) d'une liste triée, même calcul que db_pool.stats()"""
+    if not latences:
+        return 0.0
+    return latences[min(len(latences) - 1, int(len(latences) * p))]
+
+
+def executer_scenario(
+    nom, fabrique_client, requetes, concurrence, echauffement=20, compteur=None
+):
+    """Envoyer `requetes` requêtes depuis `concurrence` threads (mesures)"""
+    requete = SCENARIOS[nom]
+
+    # Échauffement (caches, connexions du pool) hors mesure
+    client = fabrique_client()
+    for i in range(echauffement):
+        requete(client, i)
+
+    indices = itertools.count()
+    latences = [[] for _ in range(concurrence)]
+    erreurs = [0] * concurrence
+
+    def travailleur(numero):
+        client = fabrique_client()
+        mesures = latences[numero]
+        while True:
+            i = next(indices)
+            if i >= requetes:
+                return
+            debut = time.perf_counter()
+            try:
+                ok = requete(client, i).status_code < 400
+            except Exception:
+                ok = False
+            mesures.append(time.perf_counter() - debut)
+            if not ok:
+                erreurs[numero] += 1
+
+    requetes_sql = compteur.valeur if compteur is not None else 0
+    threads = [
+        threading.Thread(target=travailleur, args=(n,)) for n in range(concurrence)
+    ]
+    debut = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duree = time.perf_counter() - debut
+
+    toutes = sorted(itertools.chain.from_iterable(latences))
+    resultat = {
+        "requests": len(toutes),
+        "errors": sum(erreurs),
+        "duration_s": round(duree, 3),
+        "throughput_rps": round(len(toutes) / duree, 1) if duree else 0.0,
+        "latency_ms": {
+            "avg": round(sum(toutes) / len(toutes) * 1000, 3) if toutes else 0.0,
+            "p50": round(percentile(toutes, 0.50) * 1000, 3),
+            "p95": round(percentile(toutes, 0.95) * 1000, 3),
+            "p99": round(percentile(toutes, 0.99) * 1000, 3),
+            "max": round(toutes[-1] * 1000, 3) if toutes else 0.0,
+        },
+        "db_queries_per_request": None,
+    }
+    if compteur is not None and toutes:
+        resultat["db_queries_per_request"] = round(
+            (compteur.valeur - requetes_sql) / len(toutes), 2
+        )
+    return resultat
+
+
+def compter_lignes():
+    conn = db_pool.get_connection()
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM MyAsset")
+        nombre = cursor.fetchone()[0]
+        cursor.close()
+        return nombre
+    finally:
+        conn.close()
+
+
+def completer_base(lignes, jours, graine):
+    """Ajouter des lectures synthétiques jusqu'à `lignes` lignes dans MyAsset"""
+    manquantes = lignes - compter_lignes()
+    if manquantes <= 0:
+        return
+    print(f"📝 Peuplement : {manquantes} lectures synthétiques...")
+    conn = db_pool.get_connection()
+    try:
+        reset_database.peupler(conn, manquantes, jours, graine)
+    finally:
+        conn.close()
+
+
+def version_code():
+    """Commit courant, pour comparer les résultats entre versions"""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def executer(args):
+    compteur = None
+    if args.url:
+        backend = "http"
+    else:
+        compteur = CompteurRequetes()
+        if args.sqlite:
+            backend = "sqlite"
+            chemin = args.sqlite_path or os.path.join(
+                tempfile.mkdtemp(prefix="bench-"), "myasset.sqlite3"
+            )
+            creer_base_sqlite(chemin)
+            # Les agrégats (DIV, ON DUPLICATE KEY) n'ont pas d'équivalent SQLite
+            rollups.actif = False
+
+            def factory():
+                return ConnexionComptee(ConnexionSQLite(chemin), compteur)
+
+        else:
+            backend = "mariadb"
+
+            def factory():
+                return ConnexionComptee(db_pool.connecter(), compteur)
+
+        db_pool.installer_pool(
+            db_pool.ConnectionPool(
+                factory=factory, size=args.concurrence, max_overflow=args.concurrence
+            )
+        )
+
+    if args.sans_cache:
+        os.environ["DASHBOARD_CACHE_TTL"] = "0"
+
+    if args.url:
+
+        def fabrique_client():
+            return ClientHTTP(args.url)
+
+    else:
+        # Importé après la configuration du pool et du cache
+        import app
+
+        def fabrique_client():
+            return app.app.test_client()
+
+    tailles = [int(t) for t in args.lignes.split(",") if t.strip()]
+    scenarios = [s.strip() for s in args.scenarios.split(",") if s.strip()]
+    inconnus = [s for s in scenarios if s not in SCENARIOS]
+    if inconnus:
+        raise SystemExit(f"❌ Scénarios inconnus: {', '.join(inconnus)}")
+
+    executions = []
+    for taille in tailles:
+        if taille and backend != "http":
+            completer_base(taille, args.jours, args.graine)
+        execution = {
+            "rows": compter_lignes() if backend != "http" else None,
+            "scenarios": {},
+        }
+        for nom in scenarios:
+            print(f"🔄 {nom} ({execution['rows']} lignes)...")
+            resultat = executer_scenario(
+                nom,
+                fabrique_client,
+                args.requetes,
+                args.concurrence,
+                args.echauffement,
+                compteur,
+            )
+            print(
+                f"📊 {nom}: {resultat['throughput_rps']} req/s, "
+                f"p95 {resultat['latency_ms']['p95']} ms, "
+                f"{resultat['errors']} erreurs"
+            )
+            execution["scenarios"][nom] = resultat
+        executions.append(execution)
+
+    return {
+        "commit": version_code(),
+        "date": datetime.now().isoformat(timespec="seconds"),
+        "backend": backend,
+        "storage": "normalized" if normalized_storage.actif else "legacy",
+        "concurrency": args.concurrence,
+        "requests_per_scenario": args.requetes,
+        "dashboard_cache": not args.sans_cache,
+        "runs": executions,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Banc d'essai ingestion / tableau de bord (résultat JSON)"
+    )
+    parser.add_argument(
+        "--sqlite", action="store_true", help="base SQLite de substitution (CI)"
+    )
+    parser.add_argument("--sqlite-path", help="fichier SQLite (défaut : temporaire)")
+    parser.add_argument("--url", help="serveur à mesurer (défaut : en processus)")
+    parser.add_argument(
+        "--lignes",
+        default="10000",
+        help="tailles de MyAsset, séparées par des virgules",
+    )
+    parser.add_argument("--jours", type=int, default=30)
+    parser.add_argument("--graine", type=int, default=42)
+    parser.add_argument("--scenarios", default=SCENARIOS_DEFAUT)
+    parser.add_argument("--requetes", type=int, default=500, help="par scénario")
+    parser.add_argument("--concurrence", type=int, default=8)
+    parser.add_argument("--echauffement", type=int, default=20)
+    parser.add_argument(
+        "--sans-cache",
+        action="store_true",
+        help="désactiver le cache du tableau de bord",
+    )
+    parser.add_argument("--sortie", help="fichier JSON (défaut : sortie standard)")
+    parser.add_argument(
+        "--confirm",
+        action="store_true",
+        help="autoriser l'ajout de lectures synthétiques dans MariaDB",
+    )
+    args = parser.parse_args()
+
+    if not args.sqlite and not args.url and not args.confirm:
+        print("🚨 Le peuplement ajoute des lectures synthétiques à la base de .env")
+        print("   Relancer avec --confirm (base dédiée) ou --sqlite.")
+        sys.exit(1)
+
+    # La sortie standard est réservée au JSON
+    with contextlib.redirect_stdout(sys.stderr):
+        resultat = executer(args)
+
+    if args.sortie:
+        with open(args.sortie, "w", encoding="utf-8") as fichier:
+            json.dump(resultat, fichier, indent=2)
+        print(f"✅ Résultats écrits dans {args.sortie}", file=sys.stderr)
+    else:
+        json.dump(resultat, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Protocole binaire compact pour POST /api/capteurs/bin
+
+Format d'une trame (little-endian, Content-Type: application/octet-stream) :
+
+    En-tête, 4 octets :
+        version   u8    1
+        flags     u8    bit 0 : chaque lecture porte un horodatage
+        nombre    u16   nombre de lectures dans la trame
+
+    Lecture, 5 octets (9 avec horodatage) :
+        code      u8    type de capteur (CODES_TYPES)
+        valeur    f32   même précision que la colonne MyAssetValue (FLOAT)
+        [epoch    u32   horodatage du dispositif en s ; 0 = heure du serveur]
+
+Exemple : 23.5 °C sans horodatage -> 01 00 01 00 | 01 00 00 bc 41 (9 octets
+au lieu de 39 pour le JSON équivalent).
+
+Le décodage parcourt la trame avec struct.iter_unpack sur une memoryview,
+sans copie ; chaque lecture produit directement la ligne MyAsset insérée par
+app.enregistrer_lectures(). Une lecture invalide (code inconnu, valeur non
+finie, horodatage futur) est rejetée sans rejeter la trame.
+"""
+
+import math
+import struct
+import time
+from datetime import datetime
+
+import ingestion
+
+VERSION = 1
+FLAG_HORODATAGE = 0x01
+
+ENTETE = struct.Struct("<BBH")
+LECTURE = struct.Struct("<Bf")
+LECTURE_HORODATEE = struct.Struct("<BfI")
+
+# Codes fixes (types numériques de ingestion.REGISTRE) : ne jamais renuméroter
+# un type déjà déployé sur les dispositifs
+CODES_TYPES = {
+    1: "temperature",
+    2: "humidity",
+    3: "pressure",
+    4: "light",
+    5: "bouton_poussoir",
+    6: "button",
+}
+
+# Avance maximale tolérée sur l'horloge du serveur (s)
+AVANCE_MAX = 300
+
+COMMENTAIRE = "Ajouté via API binaire"
+
+
+class TrameInvalide(ValueError):
+    """Trame illisible (en-tête, version ou taille)"""
+
+
+class TrameTropGrande(TrameInvalide):
+    """Trame annonçant plus de lectures que le maximum autorisé"""
+
+
+class Decodeur:
+    """Trame binaire -> lignes MyAsset prêtes à insérer"""
+
+    def __init__(self, prefixe="API", commentaire=COMMENTAIRE):
+        # Ligne précalculée par code : seule la valeur change d'une lecture à l'autre
+        self._types = {}
+        for code, type_capteur in CODES_TYPES.items():
+            self._types[code] = (
+                ingestion.type_stocke(type_capteur),
+                ingestion.nom_capteur(prefixe, type_capteur),
+                ingestion.REGISTRE[type_capteur].unite,
+            )
+        self.commentaire = commentaire
+
+    def decoder(self, corps, nombre_max):
+        """Retourne (lignes, erreurs) ; lève TrameInvalide si la trame est illisible"""
+        vue = memoryview(corps)
+        if len(vue) < ENTETE.size:
+            raise TrameInvalide("En-tête incomplet")
+
+        version, flags, nombre = ENTETE.unpack_from(vue)
+        if version != VERSION:
+            raise TrameInvalide(f"Version de trame non supportée: {version}")
+        if nombre > nombre_max:
+            raise TrameTropGrande(f"Maximum {nombre_max} lectures par lot")
+
+        format_lecture = LECTURE_HORODATEE if flags & FLAG_HORODATAGE else LECTURE
+        attendu = ENTETE.size + nombre * format_lecture.size
+        if len(vue) != attendu:
+            raise TrameInvalide(
+                f"Taille de trame invalide: {len(vue)} octets, {attendu} attendus"
+            )
+
+        types = self._types
+        commentaire = self.commentaire
+        limite = time.time() + AVANCE_MAX
+        lignes = []
+        erreurs = []
+        lectures = format_lecture.iter_unpack(vue[ENTETE.size :])
+        for index, lecture in enumerate(lectures):
+            type_ligne = types.get(lecture[0])
+            if type_ligne is None:
+                erreurs.append(
+                    {"index": index, "error": f"Code de type inconnu: {lecture[0]}"}
+                )
+                continue
+            type_capteur, nom, unite = type_ligne
+            valeur = lecture[1]
+            if not math.isfinite(valeur):
+                erreurs.append({"index": index, "error": "Valeur non finie"})
+                continue
+
+            if len(lecture) == 3 and lecture[2]:
+                if lecture[2] > limite:
+                    erreurs.append(
+                        {"index": index, "error": "Horodatage dans le futur"}
+                    )
+                    continue
+                lignes.append(
+                    (
+                        type_capteur,
+                        nom,
+                        valeur,
+                        unite,
+                        commentaire,
+                        datetime.fromtimestamp(lecture[2]),
+                    )
+                )
+            else:
+                lignes.append((type_capteur, nom, valeur, unite, commentaire))
+        return lignes, erreurs
+
+
+def taille_max(nombre_max):
+    """Taille en octets de la plus grande trame acceptée"""
+    return ENTETE.size + nombre_max * LECTURE_HORODATEE.size
+
+
+def encoder(lectures, horodatage=False):
+    """Construire une trame à partir de (type, valeur[, epoch]) (tests, simulateurs)"""
+    codes = {type_capteur: code for code, type_capteur in CODES_TYPES.items()}
+    format_lecture = LECTURE_HORODATEE if horodatage else LECTURE
+    flags = FLAG_HORODATAGE if horodatage else 0
+    trame = bytearray(ENTETE.pack(VERSION, flags, len(lectures)))
+    for type_capteur, *reste in lectures:
+        trame += format_lecture.pack(codes[type_capteur], *reste)
+    return bytes(trame)
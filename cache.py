@@ -0,0 +1,175 @@
+#!/usr/bin/env python3
+"""
+Cache de lecture en mémoire pour le tableau de bord
+
+Les routes d'écriture invalident (ou mettent à jour) les entrées concernées ;
+le TTL rattrape les écritures faites hors du processus (write_to_db.py,
+autres workers). Le stockage est interchangeable : toute classe qui
+implémente CacheBackend (get/set/delete/clear) peut être enregistrée avec
+enregistrer_backend(), par exemple un client Redis local.
+
+Configuration par variables d'environnement :
+    CACHE_BACKEND        nom du stockage (défaut "memory")
+    CACHE_MAX_ENTRIES    entrées maximum du LRU en mémoire (défaut 256)
+    DASHBOARD_CACHE_TTL  durée de vie des entrées du tableau de bord en s (défaut 5)
+"""
+
+import abc
+import os
+import threading
+import time
+from collections import OrderedDict
+
+
+class CacheBackend(abc.ABC):
+    """Interface d'un stockage de cache"""
+
+    @abc.abstractmethod
+    def get(self, key):
+        """Valeur associée à `key`, ou None si absente ou expirée"""
+
+    @abc.abstractmethod
+    def set(self, key, value, ttl=None):
+        """Associer `value` à `key` pendant `ttl` secondes (None = sans expiration)"""
+
+    @abc.abstractmethod
+    def delete(self, key):
+        """Retirer `key` (sans erreur si absente)"""
+
+    @abc.abstractmethod
+    def clear(self):
+        """Vider le cache"""
+
+
+class MemoryLRUCache(CacheBackend):
+    """LRU borné avec expiration, protégé par un verrou"""
+
+    def __init__(self, max_entries=256):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._data = OrderedDict()  # key -> (value, expiration monotonic ou None)
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+BACKENDS = {"memory": MemoryLRUCache}
+
+
+def enregistrer_backend(nom, classe):
+    """Rendre un stockage sélectionnable par CACHE_BACKEND"""
+    BACKENDS[nom] = classe
+
+
+class Cache:
+    """Façade avec compteurs hit/miss et chargement unique par clé"""
+
+    def __init__(self, backend, ttl=None):
+        self.backend = backend
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._chargements = {}
+        # Incrémentée à chaque écriture : un chargement commencé avant ne doit
+        # pas remettre en cache une valeur périmée
+        self._generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        value = self.backend.get(key)
+        # Compteurs partagés par les threads des requêtes
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(key, value, self.ttl if ttl is None else ttl)
+
+    def invalider(self, *keys):
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                self.backend.delete(key)
+
+    def mettre_a_jour(self, key, fonction):
+        """Remplacer la valeur en cache par `fonction(valeur)` si elle est présente"""
+        with self._lock:
+            self._generation += 1
+            value = self.backend.get(key)
+            if value is not None:
+                self.backend.set(key, fonction(value), self.ttl)
+
+    def get_or_load(self, key, loader, ttl=None):
+        """Valeur en cache, sinon `loader()` (un seul chargement concurrent par clé)"""
+        value = self.get(key)
+        if value is not None:
+            return value
+
+        with self._lock:
+            verrou = self._chargements.setdefault(key, threading.Lock())
+        with verrou:
+            # Un autre thread a pu charger la valeur pendant l'attente
+            value = self.backend.get(key)
+            if value is None:
+                generation = self._generation
+                value = loader()
+                with self._lock:
+                    if generation == self._generation:
+                        self.set(key, value, ttl)
+        return value
+
+    def stats(self):
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        total = hits + misses
+        stats = {
+            "backend": type(self.backend).__name__,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / total, 4) if total else 0.0,
+        }
+        if hasattr(self.backend, "evictions"):
+            stats["evictions"] = self.backend.evictions
+        return stats
+
+
+def from_env():
+    """Créer le cache depuis l'environnement"""
+    nom = os.getenv("CACHE_BACKEND", "memory")
+    if nom not in BACKENDS:
+        raise ValueError(f"CACHE_BACKEND inconnu: {nom}")
+    if nom == "memory":
+        backend = MemoryLRUCache(int(os.getenv("CACHE_MAX_ENTRIES", 256)))
+    else:
+        backend = BACKENDS[nom]()
+    return Cache(backend, ttl=float(os.getenv("DASHBOARD_CACHE_TTL", 5)))
@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Compression gzip / brotli des réponses HTML et JSON
+
+Appliquée dans un hook after_request selon l'en-tête Accept-Encoding du
+client. Brotli est utilisé si le module `brotli` est installé et accepté par
+le client, sinon gzip. Les réponses en flux (SSE, export) ne sont jamais
+compressées ici : elles sont envoyées au fil de l'eau.
+
+Configuration par variables d'environnement :
+    COMPRESSION_ENABLED    "0" pour désactiver (défaut "1")
+    COMPRESSION_MIN_SIZE   taille minimale compressée en octets (défaut 500)
+    COMPRESSION_LEVEL      niveau gzip 1-9 (défaut 6)
+    BROTLI_QUALITY         qualité brotli 0-11 (défaut 5)
+"""
+
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+TYPES_COMPRESSES = {
+    "text/html",
+    "text/plain",
+    "text/css",
+    "application/json",
+    "application/javascript",
+}
+
+ACTIF = os.getenv("COMPRESSION_ENABLED", "1") != "0"
+TAILLE_MIN = int(os.getenv("COMPRESSION_MIN_SIZE", 500))
+NIVEAU_GZIP = int(os.getenv("COMPRESSION_LEVEL", 6))
+QUALITE_BROTLI = int(os.getenv("BROTLI_QUALITY", 5))
+
+
+def choisir_encodage(accept_encodings):
+    """Meilleur encodage accepté par le client ("br", "gzip" ou None)"""
+    if brotli is not None and accept_encodings["br"]:
+        return "br"
+    if accept_encodings["gzip"]:
+        return "gzip"
+    return None
+
+
+def compresser_reponse(request, response):
+    """Compresser le corps de `response` si le client l'accepte"""
+    if (
+        not ACTIF
+        or response.direct_passthrough
+        or response.is_streamed
+        or response.status_code < 200
+        or response.status_code in (204, 304)
+        or response.mimetype not in TYPES_COMPRESSES
+        or "Content-Encoding" in response.headers
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    encodage = choisir_encodage(request.accept_encodings)
+    if encodage is None:
+        return response
+
+    corps = response.get_data()
+    if len(corps) < TAILLE_MIN:
+        return response
+
+    if encodage == "br":
+        corps = brotli.compress(corps, quality=QUALITE_BROTLI)
+    else:
+        corps = gzip.compress(corps, compresslevel=NIVEAU_GZIP)
+
+    response.set_data(corps)
+    response.headers["Content-Encoding"] = encodage
+    return response
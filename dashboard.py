@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Couche de données du tableau de bord : les N dernières lectures par type de
+capteur et la dernière couleur LED, en un seul aller-retour vers la base.
+
+Chaque type est une sous-requête `ORDER BY MyAssetTimeStamp DESC LIMIT N`
+servie par l'index (MyAssetType, MyAssetTimeStamp) ; les sous-requêtes sont
+réunies par UNION ALL. Le SQL reste portable (MariaDB et SQLite) afin de
+pouvoir tester charger_dashboard() avec une base locale de substitution.
+
+L'historique d'un type (GET /api/history) est paginé par clé sur
+(MyAssetType, MyAssetTimeStamp, MyAssetNumber) : chaque page repart de la
+dernière ligne vue au lieu de sauter OFFSET lignes, pour un coût
+proportionnel à la taille de la page quelle que soit sa profondeur.
+
+En STORAGE_MODE=normalized, les mêmes requêtes portent sur les capteurs du
+type (normalized_storage.lectures_par_capteur) plutôt que sur la vue MyAsset.
+"""
+
+from datetime import datetime
+
+import ingestion
+import metrics
+import normalized_storage
+import profiling
+
+# Types affichés sur le tableau de bord
+DASHBOARD_TYPES = (
+    "temperature",
+    "bouton_poussoir",
+    "capteur_texte",
+    "humidity",
+    "pressure",
+    "light",
+    "motion",
+    "button",
+    "joystick",
+)
+
+# Conversion des types pour compatibilité
+ALIAS_TYPES = {"button": "bouton_poussoir"}
+
+LIMITE_PAR_TYPE = 5
+LIMITE_HISTORIQUE = 50
+LIMITE_HISTORIQUE_MAX = 500
+COULEUR_DEFAUT = "#ff0000"
+
+COLONNES = """
+            MyAssetNumber AS id,
+            MyAssetType AS type,
+            MyAssetValue AS valeur,
+            MyAssetComment AS valeur_texte,
+            MyAssetTimeStamp AS date_formatted,
+            MyAssetName AS nom,
+            MyAssetUnit AS unite"""
+
+
+def _sous_requete(index, type_capteur, limite):
+    return f"""
+    SELECT * FROM (
+        SELECT {COLONNES}
+        FROM MyAsset
+        WHERE MyAssetType = '{type_capteur}'
+        ORDER BY MyAssetTimeStamp DESC, MyAssetNumber DESC
+        LIMIT {int(limite)}
+    ) AS t{index}"""
+
+
+def construire_requete(types=DASHBOARD_TYPES, limite=LIMITE_PAR_TYPE):
+    """SQL des `limite` dernières lignes de chaque type + la dernière couleur"""
+    parties = [_sous_requete(i, t, limite) for i, t in enumerate(types)]
+    parties.append(_sous_requete(len(types), "color", 1))
+    return "\nUNION ALL".join(parties)
+
+
+DASHBOARD_SQL = construire_requete()
+
+
+def construire_requete_normalisee(conn, types=DASHBOARD_TYPES, limite=LIMITE_PAR_TYPE):
+    """Équivalent de construire_requete() en stockage normalisé
+
+    `limite` lignes par capteur des types affichés et une par capteur de
+    couleur ; la fusion par type se fait dans charger_dashboard().
+    """
+    capteurs = normalized_storage.capteurs_des_types(conn, (*types, "color"))
+    affiches = [id_capteur for id_capteur, t in capteurs if t != "color"]
+    couleurs = [id_capteur for id_capteur, t in capteurs if t == "color"]
+    return f"""
+    SELECT {COLONNES}
+    FROM {normalized_storage.lectures_par_capteur(affiches, int(limite))} AS t0
+    UNION ALL
+    SELECT {COLONNES}
+    FROM {normalized_storage.lectures_par_capteur(couleurs, 1)} AS t1"""
+
+
+# Lignes plus anciennes que la ligne curseur (horodatage, horodatage, numéro)
+CURSEUR_SQL = """
+          AND (MyAssetTimeStamp < %s
+               OR (MyAssetTimeStamp = %s AND MyAssetNumber < %s))"""
+
+
+def requete_historique(apres_curseur=False):
+    """SQL d'une page d'historique, du plus récent au plus ancien
+
+    La condition sur le curseur s'écrit en OR (et non en comparaison de
+    tuples) pour que MariaDB en tire des intervalles de l'index
+    (MyAssetType, MyAssetTimeStamp), qui contient aussi MyAssetNumber.
+    """
+    curseur = CURSEUR_SQL if apres_curseur else ""
+    return f"""
+        SELECT {COLONNES}
+        FROM MyAsset
+        WHERE MyAssetType = %s{curseur}
+        ORDER BY MyAssetTimeStamp DESC, MyAssetNumber DESC
+        LIMIT %s"""
+
+
+HISTORIQUE_SQL = requete_historique()
+HISTORIQUE_SUITE_SQL = requete_historique(apres_curseur=True)
+POSITION_SQL = "SELECT MyAssetTimeStamp FROM MyAsset WHERE MyAssetNumber = %s"
+
+def requete_historique_normalisee(capteurs, apres_curseur=False):
+    """Équivalent de requete_historique() sur les capteurs `capteurs`
+
+    Paramètres : ([position, position, avant,] nombre) par capteur, puis nombre.
+    """
+    condition = CURSEUR_SQL if apres_curseur else ""
+    lectures = normalized_storage.lectures_par_capteur(capteurs, "%s", condition)
+    return f"""
+        SELECT {COLONNES}
+        FROM {lectures} AS h
+        ORDER BY MyAssetTimeStamp DESC, MyAssetNumber DESC
+        LIMIT %s"""
+
+
+def _en_datetime(valeur):
+    # SQLite renvoie les TIMESTAMP sous forme de texte
+    if isinstance(valeur, str):
+        try:
+            return datetime.fromisoformat(valeur)
+        except ValueError:
+            return None
+    return valeur
+
+
+def couleur_hex(color_command):
+    """Convertir SET_COLOR:R,G,B en format hex (couleur par défaut sinon)"""
+    if color_command and color_command.startswith("SET_COLOR:"):
+        try:
+            # Extraire les valeurs RGB
+            rgb_str = color_command.replace("SET_COLOR:", "")
+            r, g, b = map(int, rgb_str.split(","))
+            # Convertir en hex
+            return f"#{r:02x}{g:02x}{b:02x}"
+        except Exception:
+            pass  # Garder la couleur par défaut en cas d'erreur
+    return COULEUR_DEFAUT
+
+
+def formater_capteur(capteur):
+    """Ajouter valeur_affichee, date et timestamp_unix à une ligne de capteur"""
+    capteur["type"] = ALIAS_TYPES.get(capteur["type"], capteur["type"])
+
+    # Ajouter une valeur affichable qui combine valeur numérique et texte (compatibilité)
+    regle = ingestion.affichage(capteur["type"])
+    if capteur["valeur_texte"] and capteur["unite"] == "text":
+        capteur["valeur_affichee"] = capteur["valeur_texte"]
+    elif regle == "bouton":
+        # Affichage optimisé pour les boutons poussoirs
+        capteur["valeur_affichee"] = "Appuyé" if capteur["valeur"] == 1 else "Relâché"
+    elif regle == "joystick":
+        # Affichage optimisé pour le joystick Sense HAT
+        if capteur["valeur_texte"]:
+            # Afficher la direction depuis le commentaire
+            capteur["valeur_affichee"] = capteur["valeur_texte"]
+        else:
+            capteur["valeur_affichee"] = (
+                "Actionné" if capteur["valeur"] == 1 else "Inactif"
+            )
+    else:
+        # Pour les autres capteurs, afficher valeur + unité
+        capteur["valeur_affichee"] = f"{capteur['valeur']} {capteur.get('unite', '')}"
+
+    # Utiliser la date formatée pour l'affichage
+    capteur["date_formatted"] = _en_datetime(capteur["date_formatted"])
+    capteur["date"] = capteur["date_formatted"]
+    capteur["timestamp_unix"] = (
+        int(capteur["date"].timestamp()) if capteur["date"] else None
+    )
+    return capteur
+
+
+def charger_dashboard(conn, limite=LIMITE_PAR_TYPE):
+    """Retourne (capteurs, last_color_hex) en une seule requête"""
+    cursor = conn.cursor()
+    # Dernières lectures par type et dernière couleur : une seule requête
+    with metrics.chronometrer("dashboard"):
+        if normalized_storage.actif:
+            requete = construire_requete_normalisee(conn, limite=limite)
+        elif limite == LIMITE_PAR_TYPE:
+            requete = DASHBOARD_SQL
+        else:
+            requete = construire_requete(limite=limite)
+        cursor.execute(requete)
+        colonnes = [d[0] for d in cursor.description]
+        lignes = [dict(zip(colonnes, ligne)) for ligne in cursor.fetchall()]
+    cursor.close()
+
+    derniere_couleur = None
+    capteurs = []
+    with profiling.phase("formatage"):
+        for ligne in lignes:
+            if ligne["type"] != "color":
+                capteurs.append(formater_capteur(ligne))
+            elif derniere_couleur is None or _plus_recente(ligne, derniere_couleur):
+                # Une ligne par capteur de couleur : garder la plus récente
+                derniere_couleur = ligne
+    last_color_hex = couleur_hex(
+        derniere_couleur["valeur_texte"] if derniere_couleur else None
+    )
+
+    # Ordre chronologique inverse, puis `limite` entrées par type après fusion des alias
+    with profiling.phase("tri"):
+        capteurs.sort(
+            key=lambda c: (c["date"] or datetime.min, c["id"]), reverse=True
+        )
+        compteurs_types = {}
+        capteurs_limites = []
+        for capteur in capteurs:
+            compte = compteurs_types.get(capteur["type"], 0)
+            if compte < limite:
+                capteurs_limites.append(capteur)
+                compteurs_types[capteur["type"]] = compte + 1
+
+    return capteurs_limites, last_color_hex
+
+
+def _plus_recente(ligne, autre):
+    return (_en_datetime(ligne["date_formatted"]) or datetime.min, ligne["id"]) > (
+        _en_datetime(autre["date_formatted"]) or datetime.min,
+        autre["id"],
+    )
+
+
+def _lire_page(conn, cursor, type_capteur, avant, nombre):
+    curseur = ()
+    if avant is not None:
+        # Horodatage de la ligne curseur : une lecture par clé primaire
+        cursor.execute(POSITION_SQL, (avant,))
+        position = cursor.fetchone()
+        if position is None:
+            return None
+        curseur = (position[0], position[0], avant)
+
+    if normalized_storage.actif:
+        capteurs = [
+            id_capteur
+            for id_capteur, _ in normalized_storage.capteurs_des_types(
+                conn, (type_capteur,)
+            )
+        ]
+        cursor.execute(
+            requete_historique_normalisee(capteurs, apres_curseur=bool(curseur)),
+            normalized_storage.params_par_capteur(capteurs, curseur + (nombre,))
+            + (nombre,),
+        )
+    elif curseur:
+        cursor.execute(HISTORIQUE_SUITE_SQL, (type_capteur, *curseur, nombre))
+    else:
+        cursor.execute(HISTORIQUE_SQL, (type_capteur, nombre))
+    colonnes = [d[0] for d in cursor.description]
+    return [dict(zip(colonnes, ligne)) for ligne in cursor.fetchall()]
+
+
+def charger_historique(conn, type_capteur, avant=None, limite=LIMITE_HISTORIQUE):
+    """Retourne (capteurs formatés, `before` de la page suivante ou None)
+
+    `type_capteur` est le type affiché (bouton_poussoir est stocké "button").
+    `avant` est le MyAssetNumber de la dernière ligne de la page précédente.
+    Lève LookupError si cette ligne n'existe plus (purgée par la rétention).
+    """
+    cursor = conn.cursor()
+    # Une ligne de plus que la page : indique s'il reste des lignes plus anciennes
+    with metrics.chronometrer("history"):
+        lignes = _lire_page(
+            conn, cursor, ingestion.type_stocke(type_capteur), avant, limite + 1
+        )
+    cursor.close()
+    if lignes is None:
+        raise LookupError(f"Lecture {avant} introuvable")
+
+    suivante = lignes[limite - 1]["id"] if len(lignes) > limite else None
+    with profiling.phase("formatage"):
+        capteurs = [formater_capteur(ligne) for ligne in lignes[:limite]]
+    return capteurs, suivante
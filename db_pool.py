@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Pool de connexions MariaDB partagé par app.py et write_to_db.py
+
+Configuration par variables d'environnement :
+    DB_POOL_SIZE           connexions gardées ouvertes (défaut 5)
+    DB_POOL_MAX_OVERFLOW   connexions supplémentaires temporaires (défaut 10)
+    DB_POOL_TIMEOUT        attente maximale d'une connexion libre en s (défaut 10)
+    DB_POOL_IDLE_TIMEOUT   fermeture des connexions inactives depuis N s (défaut 300)
+    DB_POOL_PING_AFTER     vérification (ping) au checkout si inactive depuis N s (défaut 5)
+"""
+
+import os
+import threading
+import time
+from collections import deque
+
+import mysql.connector
+from dotenv import load_dotenv
+
+import profiling
+
+# Charger les variables d'environnement
+load_dotenv()
+
+
+class PoolTimeout(mysql.connector.Error):
+    """Aucune connexion disponible dans le délai imparti"""
+
+
+def connecter():
+    """Nouvelle connexion MariaDB (hors pool) depuis l'environnement"""
+    return mysql.connector.connect(
+        host=os.getenv("DB_HOST"),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        database=os.getenv("DB_NAME"),
+    )
+
+
+class PooledConnection:
+    """Connexion empruntée au pool : close() la rend au pool au lieu de la fermer"""
+
+    def __init__(self, pool, raw):
+        self._pool = pool
+        self._raw = raw
+
+    def close(self):
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._pool._release(raw)
+
+    def discard(self):
+        """Fermer la connexion au lieu de la rendre (résultat non lu, état inconnu)"""
+        if self._raw is not None:
+            raw, self._raw = self._raw, None
+            self._pool._release(raw, reuse=False)
+
+    def is_connected(self):
+        return self._raw is not None and self._raw.is_connected()
+
+    def cursor(self, *args, **kwargs):
+        if self._raw is None:
+            raise mysql.connector.InterfaceError("Connexion déjà rendue au pool")
+        # Chronométré seulement pendant un profilage ou si SLOW_QUERY_MS est défini
+        return profiling.envelopper_curseur(
+            self._raw.cursor(*args, **kwargs), journal_lent
+        )
+
+    def __getattr__(self, name):
+        if self._raw is None:
+            raise mysql.connector.InterfaceError("Connexion déjà rendue au pool")
+        return getattr(self._raw, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class ConnectionPool:
+    """Pool borné : `size` connexions permanentes plus `max_overflow` temporaires"""
+
+    def __init__(
+        self,
+        factory=connecter,
+        size=5,
+        max_overflow=10,
+        timeout=10.0,
+        idle_timeout=300.0,
+        ping_after=5.0,
+    ):
+        self.factory = factory
+        self.size = size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.ping_after = ping_after
+
+        self._cond = threading.Condition()
+        self._idle = deque()  # (connexion brute, instant de retour au pool)
+        self._in_use = 0
+        self._waiting = 0
+        self._pid = os.getpid()
+
+        # Statistiques de checkout
+        self._checkouts = 0
+        self._timeouts = 0
+        self._opened = 0
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+        self._latencies = deque(maxlen=1000)
+
+    def _reset_after_fork(self):
+        # Les sockets héritées du processus parent ne doivent jamais être partagées
+        self._idle.clear()
+        self._in_use = 0
+        self._waiting = 0
+        self._pid = os.getpid()
+
+    def _discard(self, raw):
+        try:
+            raw.close()
+        except Exception:
+            pass
+
+    def get_connection(self):
+        """Emprunter une connexion (à rendre avec close())"""
+        start = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
+
+        with self._cond:
+            if self._pid != os.getpid():
+                self._reset_after_fork()
+
+            raw = None
+            while raw is None:
+                # Réutiliser la connexion la plus récente, jeter les trop anciennes
+                while self._idle:
+                    candidate, released_at = self._idle.pop()
+                    idle_for = time.monotonic() - released_at
+                    if idle_for > self.idle_timeout:
+                        self._discard(candidate)
+                        continue
+                    raw = (candidate, idle_for)
+                    break
+                if raw is not None:
+                    break
+
+                if self._in_use + len(self._idle) < self.size + self.max_overflow:
+                    raw = (None, 0.0)
+                    break
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        f"Pool épuisé: {self._in_use} connexions utilisées"
+                    )
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            # Réserver la place avant d'ouvrir la connexion hors du verrou
+            self._in_use += 1
+
+        candidate, idle_for = raw
+        try:
+            if candidate is not None and idle_for >= self.ping_after:
+                if not candidate.is_connected():
+                    self._discard(candidate)
+                    candidate = None
+            if candidate is None:
+                candidate = self.factory()
+                with self._cond:
+                    self._opened += 1
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        elapsed = time.perf_counter() - start
+        with self._cond:
+            self._checkouts += 1
+            self._latency_total += elapsed
+            self._latency_max = max(self._latency_max, elapsed)
+            self._latencies.append(elapsed)
+
+        return PooledConnection(self, candidate)
+
+    def _release(self, raw, reuse=True):
+        if self._pid != os.getpid():
+            # Connexion empruntée avant un fork : ne pas la réinjecter
+            return
+
+        if not reuse:
+            self._discard(raw)
+            raw = None
+
+        # Ne jamais rendre une transaction ouverte au pool
+        try:
+            if raw is not None and raw.in_transaction:
+                raw.rollback()
+        except Exception:
+            self._discard(raw)
+            raw = None
+
+        with self._cond:
+            self._in_use -= 1
+            if raw is not None:
+                if len(self._idle) < self.size:
+                    self._idle.append((raw, time.monotonic()))
+                else:
+                    # Connexion de débordement : fermée dès qu'elle est rendue
+                    self._discard(raw)
+            self._cond.notify()
+
+    def close_all(self):
+        """Fermer les connexions inactives (arrêt ou rechargement)"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+        for raw, _ in idle:
+            self._discard(raw)
+
+    def stats(self):
+        """Statistiques pour dimensionner le pool"""
+        with self._cond:
+            latencies = sorted(self._latencies)
+            checkouts = self._checkouts
+
+            def percentile(p):
+                if not latencies:
+                    return 0.0
+                return latencies[min(len(latencies) - 1, int(len(latencies) * p))]
+
+            return {
+                "size": self.size,
+                "max_overflow": self.max_overflow,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "waiting": self._waiting,
+                "opened": self._opened,
+                "checkouts": checkouts,
+                "timeouts": self._timeouts,
+                "checkout_latency_ms": {
+                    "avg": round(self._latency_total / checkouts * 1000, 3)
+                    if checkouts
+                    else 0.0,
+                    "p50": round(percentile(0.50) * 1000, 3),
+                    "p95": round(percentile(0.95) * 1000, 3),
+                    "p99": round(percentile(0.99) * 1000, 3),
+                    "max": round(self._latency_max * 1000, 3),
+                },
+            }
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Pool global du processus, créé au premier usage depuis l'environnement"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(
+                    size=int(os.getenv("DB_POOL_SIZE", 5)),
+                    max_overflow=int(os.getenv("DB_POOL_MAX_OVERFLOW", 10)),
+                    timeout=float(os.getenv("DB_POOL_TIMEOUT", 10)),
+                    idle_timeout=float(os.getenv("DB_POOL_IDLE_TIMEOUT", 300)),
+                    ping_after=float(os.getenv("DB_POOL_PING_AFTER", 5)),
+                )
+    return _pool
+
+
+def installer_pool(pool):
+    """Remplacer le pool global (banc d'essai, base de substitution)"""
+    global _pool
+    with _pool_lock:
+        _pool = pool
+
+
+def reset_after_fork():
+    """Repartir d'un pool vide dans un processus enfant (hook post_fork)"""
+    global _pool_lock
+    # Un verrou hérité pourrait être resté pris par un thread du parent
+    _pool_lock = threading.Lock()
+    if _pool is not None:
+        _pool._cond = threading.Condition()
+        _pool._reset_after_fork()
+
+
+def get_connection():
+    """Emprunter une connexion au pool global"""
+    return get_pool().get_connection()
+
+
+# Journal des requêtes lentes (None si SLOW_QUERY_MS n'est pas défini)
+journal_lent = (
+    profiling.JournalLent(
+        get_connection, profiling.JOURNAL_LENT, profiling.EXPLAIN_LENT
+    )
+    if profiling.SEUIL_LENT > 0
+    else None
+)
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Export en flux de l'historique MyAsset (CSV ou NDJSON, gzip optionnel)
+
+Le résultat est lu par un curseur non bufferisé : il reste côté serveur et
+arrive par paquets de fetchmany(), chacun encodé puis envoyé aussitôt. La
+mémoire est constante quel que soit l'intervalle exporté et les premiers
+octets partent dès la première ligne lue (réponse HTTP en transfert chunked).
+La compression gzip se fait elle aussi au fil de l'eau.
+
+Filtré par type, l'export suit l'ordre de l'index (MyAssetType,
+MyAssetTimeStamp) ; sans type, celui de la clé primaire (ordre d'insertion) :
+aucun tri côté serveur ne retarde la première ligne.
+
+Utilisé par GET /api/export?type=&name=&start=&end=&format=csv|ndjson&gzip=1
+et en ligne de commande.
+
+Configuration par variables d'environnement :
+    EXPORT_FETCH_SIZE      lignes lues par fetchmany() (défaut 1000)
+    EXPORT_WRITE_TIMEOUT   net_write_timeout de la session d'export en s, pour
+                           un client lent (défaut 600)
+
+Usage:
+    python export.py [--type T] [--nom N] [--debut D] [--fin F]
+                     [--format csv|ndjson] [--gzip] [--sortie fichier]
+    D et F : epoch en secondes ou date ISO 8601 (défaut : tout l'historique)
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+import zlib
+from datetime import datetime
+
+import mysql.connector
+from dotenv import load_dotenv
+
+import compression
+import db_pool
+import ingestion
+import metrics
+
+# Charger les variables d'environnement
+load_dotenv()
+
+TAILLE_PAQUET = int(os.getenv("EXPORT_FETCH_SIZE", 1000))
+DELAI_ECRITURE = int(os.getenv("EXPORT_WRITE_TIMEOUT", 600))
+
+COLONNES = ("id", "type", "name", "value", "unit", "comment", "timestamp")
+
+LIGNES_EXPORTEES = metrics.Compteur(
+    "exported_rows_total", "Lignes MyAsset exportées par format", ("format",)
+)
+
+
+def lire_epoch(valeur, defaut):
+    """Accepter un epoch en secondes ou une date ISO 8601"""
+    if valeur is None or valeur == "":
+        return defaut
+    try:
+        return float(valeur)
+    except ValueError:
+        return datetime.fromisoformat(valeur).timestamp()
+
+
+def encoder_csv(paquets):
+    tampon = io.StringIO()
+    ecrivain = csv.writer(tampon, lineterminator="\n")
+    ecrivain.writerow(COLONNES)
+    for paquet in paquets:
+        ecrivain.writerows(paquet)
+        yield tampon.getvalue().encode("utf-8")
+        tampon.seek(0)
+        tampon.truncate()
+    if tampon.tell():
+        yield tampon.getvalue().encode("utf-8")
+
+
+def encoder_ndjson(paquets):
+    for paquet in paquets:
+        yield "".join(
+            json.dumps(dict(zip(COLONNES, ligne)), default=str, ensure_ascii=False)
+            + "\n"
+            for ligne in paquet
+        ).encode("utf-8")
+
+
+# format -> (type MIME, encodeur)
+FORMATS = {
+    "csv": ("text/csv", encoder_csv),
+    "ndjson": ("application/x-ndjson", encoder_ndjson),
+}
+
+
+def compresser_gzip(morceaux, niveau=compression.NIVEAU_GZIP):
+    """Flux gzip : chaque morceau est vidé (Z_SYNC_FLUSH) pour partir aussitôt"""
+    compresseur = zlib.compressobj(niveau, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for morceau in morceaux:
+        donnees = compresseur.compress(morceau) + compresseur.flush(zlib.Z_SYNC_FLUSH)
+        if donnees:
+            yield donnees
+    yield compresseur.flush()
+
+
+def requete_export(type_capteur=None, nom=None):
+    conditions = [
+        "MyAssetTimeStamp >= FROM_UNIXTIME(%s)",
+        "MyAssetTimeStamp < FROM_UNIXTIME(%s)",
+    ]
+    if type_capteur:
+        conditions.append("MyAssetType = %s")
+    if nom:
+        conditions.append("MyAssetName = %s")
+    ordre = "MyAssetTimeStamp, MyAssetNumber" if type_capteur else "MyAssetNumber"
+    return f"""
+        SELECT MyAssetNumber, MyAssetType, MyAssetName, MyAssetValue, MyAssetUnit,
+               MyAssetComment, MyAssetTimeStamp
+        FROM MyAsset
+        WHERE {" AND ".join(conditions)}
+        ORDER BY {ordre}
+    """
+
+
+class Export:
+    """Export en cours : itérable d'octets, connexion rendue par close()
+
+    La requête est lancée à la construction, pour qu'une erreur SQL donne
+    une réponse d'erreur plutôt qu'un flux tronqué. close() est appelé par
+    le serveur WSGI à la fin de la réponse, y compris si le client se
+    déconnecte : la connexion, dont le résultat n'a pas été lu en entier,
+    est alors fermée au lieu d'être rendue au pool.
+    """
+
+    def __init__(
+        self,
+        conn,
+        debut,
+        fin,
+        type_capteur=None,
+        nom=None,
+        format_export="csv",
+        compresse=False,
+        taille=TAILLE_PAQUET,
+    ):
+        self.format = format_export
+        self.mimetype, self._encodeur = FORMATS[format_export]
+        self.compresse = compresse
+        self.taille = taille
+        self.lignes = 0
+        self._conn = conn
+        self._termine = False
+
+        # Type affiché (bouton_poussoir) -> valeur stockée dans MyAssetType
+        if type_capteur:
+            type_capteur = ingestion.type_stocke(type_capteur)
+        params = [debut, fin] + [p for p in (type_capteur, nom) if p]
+        try:
+            self._cursor = conn.cursor(buffered=False)
+            self._cursor.execute(
+                "SET SESSION net_write_timeout = %s", (DELAI_ECRITURE,)
+            )
+            with metrics.chronometrer("export"):
+                self._cursor.execute(requete_export(type_capteur, nom), params)
+        except Exception:
+            conn.discard()
+            self._conn = None
+            raise
+
+    @property
+    def nom_fichier(self):
+        suffixe = ".gz" if self.compresse else ""
+        return f"myasset-{datetime.now():%Y%m%d-%H%M%S}.{self.format}{suffixe}"
+
+    def _paquets(self):
+        while True:
+            paquet = self._cursor.fetchmany(self.taille)
+            if not paquet:
+                self._termine = True
+                return
+            self.lignes += len(paquet)
+            LIGNES_EXPORTEES.inc(self.format, montant=len(paquet))
+            yield paquet
+
+    def __iter__(self):
+        morceaux = self._encodeur(self._paquets())
+        if self.compresse:
+            morceaux = compresser_gzip(morceaux)
+        return morceaux
+
+    def close(self):
+        if self._conn is None:
+            return
+        conn, self._conn = self._conn, None
+        if not self._termine:
+            conn.discard()
+            return
+        try:
+            self._cursor.execute("SET SESSION net_write_timeout = DEFAULT")
+            self._cursor.close()
+        except Exception:
+            conn.discard()
+            return
+        conn.close()
+
+
+def main():
+    """Fonction principale"""
+    parser = argparse.ArgumentParser(description="Exporter l'historique MyAsset")
+    parser.add_argument("--type", help="type de capteur (défaut : tous)")
+    parser.add_argument("--nom", help="nom du capteur (défaut : tous)")
+    parser.add_argument("--debut", help="epoch ou date ISO 8601 (défaut : origine)")
+    parser.add_argument("--fin", help="epoch ou date ISO 8601 (défaut : maintenant)")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="csv")
+    parser.add_argument("--gzip", action="store_true", help="compresser en gzip")
+    parser.add_argument("--sortie", help="fichier de sortie (défaut : stdout)")
+    args = parser.parse_args()
+
+    try:
+        fin = lire_epoch(args.fin, time.time())
+        debut = lire_epoch(args.debut, 0)
+    except ValueError as e:
+        parser.error(f"date invalide: {e}")
+
+    try:
+        export = Export(
+            db_pool.get_connection(),
+            int(debut),
+            int(fin),
+            type_capteur=args.type,
+            nom=args.nom,
+            format_export=args.format,
+            compresse=args.gzip,
+        )
+    except mysql.connector.Error as e:
+        print(f"❌ Erreur MySQL: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    sortie = open(args.sortie, "wb") if args.sortie else sys.stdout.buffer
+    debut_export = time.perf_counter()
+    try:
+        for morceau in export:
+            sortie.write(morceau)
+    finally:
+        export.close()
+        if args.sortie:
+            sortie.close()
+    print(
+        f"✅ {export.lignes} lignes exportées en "
+        f"{time.perf_counter() - debut_export:.1f}s",
+        file=sys.stderr,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""
+Validation et conversion des lectures de capteurs en lignes MyAsset
+
+Point de passage unique de toutes les entrées (formulaire, /api/capteur,
+/api/capteurs, trames binaires, UDP, write_to_db.py) :
+- REGISTRE : unité, nature de la valeur et règle d'affichage de chaque type
+  connu, calculés une fois au chargement du module ;
+- coerce_many() : conversion d'un lot sans exception pour les lectures
+  invalides (erreurs renvoyées par index) ;
+- limites des colonnes CHAR vérifiées avant la base (MyAssetType CHAR(12),
+  MyAssetName CHAR(20)) ;
+- inserer_lignes() : INSERT MyAsset + agrégats, partagé par tous les chemins ;
+  en STORAGE_MODE=normalized, INSERT MyAssetReading (voir normalized_storage).
+
+Une ligne MyAsset est (type, nom, valeur, unité, commentaire[, horodatage]).
+
+Différences avec l'ancien code de app.py :
+- bouton_poussoir (15 caractères) ne tient pas dans MyAssetType CHAR(12) :
+  l'INSERT échouait (mode strict) ou était tronqué en "bouton_pouss" et
+  jamais affiché. Il est enregistré sous "button", déjà réaffiché en
+  bouton_poussoir ; le nom reste celui d'origine ("API bouton_poussoir").
+  La migration 5 de migrate_database.py reprend les lignes tronquées.
+- une valeur non finie (NaN, inf), que MariaDB ne peut pas stocker et qui
+  finissait en erreur 500, est refusée comme lecture invalide (400).
+"""
+
+import math
+import re
+from collections import namedtuple
+
+import metrics
+import normalized_storage
+import rollups
+
+INSERT_MYASSET = """INSERT INTO MyAsset (MyAssetType, MyAssetName, MyAssetValue, MyAssetUnit, MyAssetComment)
+                    VALUES (%s, %s, %s, %s, %s)"""
+
+# Lectures horodatées par le dispositif (6e élément de la ligne)
+INSERT_MYASSET_HORODATE = """INSERT INTO MyAsset (MyAssetType, MyAssetName, MyAssetValue, MyAssetUnit, MyAssetComment, MyAssetTimeStamp)
+                    VALUES (%s, %s, %s, %s, %s, %s)"""
+
+# Taille des colonnes CHAR de MyAsset
+TYPE_MAX = 12
+NOM_MAX = 20
+
+# nature : "nombre" (texte accepté en repli), "bool" (nombre ou true/false)
+# affichage : règle de dashboard.formater_capteur()
+TypeCapteur = namedtuple("TypeCapteur", "unite nature affichage")
+
+REGISTRE = {
+    "temperature": TypeCapteur("°C", "nombre", "valeur"),
+    "humidity": TypeCapteur("%", "nombre", "valeur"),
+    "pressure": TypeCapteur("hPa", "nombre", "valeur"),
+    "light": TypeCapteur("lux", "nombre", "valeur"),
+    "motion": TypeCapteur("", "nombre", "valeur"),
+    "bouton_poussoir": TypeCapteur("bool", "bool", "bouton"),
+    "button": TypeCapteur("bool", "bool", "bouton"),
+    "joystick": TypeCapteur("", "nombre", "joystick"),
+}
+TYPE_INCONNU = TypeCapteur("", "nombre", "valeur")
+
+# Unité des valeurs numériques par type (anciennement UNITE_MAP dans app.py)
+UNITE_MAP = {t: d.unite for t, d in REGISTRE.items() if d.unite}
+
+# MyAssetType est CHAR(12) : bouton_poussoir est enregistré sous "button",
+# réaffiché en bouton_poussoir par dashboard.ALIAS_TYPES
+ALIAS_STOCKAGE = {"bouton_poussoir": "button"}
+
+# Source -> (préfixe du nom, commentaire)
+SOURCES = {
+    "api": ("API", "Ajouté via API"),
+    "formulaire": ("Capteur", "Ajouté via formulaire"),
+    "udp": ("UDP", "Ajouté via UDP"),
+    "script": ("Script", "Ajouté via write_to_db"),
+}
+
+BOOLEENS = {"true": 1, "false": 0}
+
+# Nombre décimal : évite un float() qui lève une exception sur chaque texte
+NOMBRE = re.compile(r"\s*[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?\s*")
+
+
+def nom_capteur(prefixe, type_capteur):
+    """MyAssetName d'une lecture : préfixe de la source et type tel qu'envoyé"""
+    return f"{prefixe} {type_capteur}"[:NOM_MAX]
+
+
+def type_stocke(type_capteur):
+    """Valeur de MyAssetType pour un type de capteur"""
+    return ALIAS_STOCKAGE.get(type_capteur, type_capteur)
+
+
+def affichage(type_capteur):
+    """Règle d'affichage d'un type ("valeur", "bouton" ou "joystick")"""
+    return REGISTRE.get(type_capteur, TYPE_INCONNU).affichage
+
+
+def coerce_many(lectures, source="api"):
+    """Convertir des paires (type, valeur) en lignes MyAsset
+
+    Retourne (lignes, erreurs) où erreurs est une liste de (index, message) ;
+    une lecture invalide ne lève pas d'exception et n'interrompt pas le lot.
+    Conversion : nombre, sinon booléen strict pour les boutons, sinon texte.
+    """
+    prefixe, commentaire = SOURCES[source]
+    lignes = []
+    erreurs = []
+    for index, (type_capteur, valeur) in enumerate(lectures):
+        if type(type_capteur) is not str or not type_capteur:
+            erreurs.append((index, "type invalide"))
+            continue
+        stocke = ALIAS_STOCKAGE.get(type_capteur, type_capteur)
+        if len(stocke) > TYPE_MAX:
+            erreurs.append((index, f"type limité à {TYPE_MAX} caractères"))
+            continue
+        definition = REGISTRE.get(type_capteur, TYPE_INCONNU)
+        nom = nom_capteur(prefixe, type_capteur)
+
+        nature = type(valeur)
+        if nature is float or nature is int or nature is bool:
+            nombre = float(valeur)
+        elif nature is str and NOMBRE.fullmatch(valeur):
+            nombre = float(valeur)
+        else:
+            nombre = None
+
+        if nombre is not None:
+            if not math.isfinite(nombre):
+                erreurs.append((index, "valeur non finie"))
+                continue
+            lignes.append((stocke, nom, nombre, definition.unite, commentaire))
+        elif definition.nature == "bool":
+            booleen = BOOLEENS.get(str(valeur).lower())
+            if booleen is None:
+                erreurs.append((index, "bouton_poussoir doit être 'true' ou 'false'"))
+                continue
+            if source == "formulaire":
+                nom = nom_capteur("Bouton", type_capteur)
+            lignes.append((stocke, nom, booleen, "bool", commentaire))
+        else:
+            # Texte : conservé dans le commentaire
+            lignes.append((stocke, nom, 0.0, "text", str(valeur)))
+    return lignes, erreurs
+
+
+def convertir_lecture(type_capteur, valeur, source="api"):
+    """Convertit une lecture en ligne MyAsset (ValueError si la valeur est invalide)"""
+    lignes, erreurs = coerce_many(((type_capteur, valeur),), source)
+    if erreurs:
+        raise ValueError(erreurs[0][1])
+    return lignes[0]
+
+
+def requetes_insertion(lignes, capteurs=None):
+    """Regrouper les lignes par requête INSERT (avec ou sans horodatage)
+
+    `capteurs` : ids des capteurs en stockage normalisé, résolus sur le
+    curseur de l'insertion par normalized_storage.resoudre().
+    """
+    if normalized_storage.actif:
+        return normalized_storage.requetes_insertion(lignes, capteurs)
+    horodatees = [ligne for ligne in lignes if len(ligne) > 5]
+    if not horodatees:
+        return [(INSERT_MYASSET, lignes)]
+    simples = [ligne for ligne in lignes if len(ligne) == 5]
+    groupes = [(INSERT_MYASSET_HORODATE, horodatees)]
+    if simples:
+        groupes.append((INSERT_MYASSET, simples))
+    return groupes
+
+
+def inserer_ligne(cursor, ligne):
+    """Insérer une seule ligne (commande, couleur), sans agrégats ni commit"""
+    capteurs = normalized_storage.resoudre(cursor, [ligne])
+    requete, groupe = requetes_insertion([ligne], capteurs)[0]
+    cursor.execute(requete, groupe[0])
+
+
+def inserer_lignes(cursor, lignes, agregats=True):
+    """Insérer des lignes MyAsset et mettre à jour les agrégats (sans commit)
+
+    agregats=False : l'appelant confie les agrégats à rollups.differer()
+    après son commit (petits lots, voir rollups.a_differer()).
+    """
+    with metrics.chronometrer("insert"):
+        capteurs = normalized_storage.resoudre(cursor, lignes)
+        for requete, groupe in requetes_insertion(lignes, capteurs):
+            if len(groupe) == 1:
+                cursor.execute(requete, groupe[0])
+            else:
+                cursor.executemany(requete, groupe)
+        if agregats:
+            rollups.enregistrer(cursor, lignes)
+    metrics.compter_lignes(lignes)
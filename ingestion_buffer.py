@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Tampon d'ingestion asynchrone (write-behind) pour la table MyAsset
+
+Les lectures validées sont placées dans une file bornée en mémoire ; un thread
+d'écriture les insère par lots (group commit) dès que `batch_size` lignes sont
+en attente ou que `flush_interval` secondes se sont écoulées.
+
+Configuration par variables d'environnement (mode activé par INGESTION_ASYNC=1) :
+    INGESTION_QUEUE_SIZE      lignes maximum en attente (défaut 10000)
+    INGESTION_BATCH_SIZE      lignes par commit (défaut 500)
+    INGESTION_FLUSH_MS        délai maximum avant écriture en ms (défaut 50)
+    INGESTION_FULL_POLICY     "reject" (503 immédiat) ou "block" (défaut reject)
+    INGESTION_BLOCK_TIMEOUT   attente maximum en mode block en s (défaut 1)
+
+Un lot encore en échec après `max_retries` essais est abandonné (journalisé
+au niveau ERROR, compteur `dropped`) ; max_retries=None réessaie sans fin,
+pour une source qui ne peut pas renvoyer ses lectures (write_to_db.py stream).
+"""
+
+import atexit
+import logging
+import os
+import threading
+import time
+from collections import deque
+
+import db_pool
+
+journal = logging.getLogger(__name__)
+
+
+class IngestionQueueFull(Exception):
+    """La file d'ingestion est pleine (contre-pression)"""
+
+
+class IngestionBuffer:
+    """File bornée + thread d'écriture par lots"""
+
+    def __init__(
+        self,
+        ecrire_lot,
+        connection_factory=db_pool.get_connection,
+        max_queue=10000,
+        batch_size=500,
+        flush_interval=0.05,
+        full_policy="reject",
+        block_timeout=1.0,
+        max_retries=3,
+        retry_max_delay=2.0,
+        apres_ecriture=None,
+    ):
+        self.ecrire_lot = ecrire_lot
+        self.apres_ecriture = apres_ecriture
+        self.connection_factory = connection_factory
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.full_policy = full_policy
+        self.block_timeout = block_timeout
+        self.max_retries = max_retries
+        self.retry_max_delay = retry_max_delay
+
+        self._cond = threading.Condition()
+        self._rows = deque()
+        self._in_flight = 0
+        self._thread = None
+        self._pid = None
+        self._stopping = False
+
+        # Compteurs
+        self._enqueued = 0
+        self._written = 0
+        self._rejected = 0
+        self._dropped = 0
+        self._errors = 0
+        self._flushes = 0
+        self._flush_total = 0.0
+        self._flush_max = 0.0
+        self._flush_last = 0.0
+
+    def _ensure_started(self):
+        # Démarrage paresseux : après un fork, le thread du parent n'existe plus
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._stopping = False
+            self._thread = threading.Thread(
+                target=self._run, name="ingestion-writer", daemon=True
+            )
+            self._thread.start()
+
+    def submit(self, rows):
+        """Mettre des lignes en file (tout ou rien) ; IngestionQueueFull si pleine"""
+        rows = list(rows)
+        if not rows:
+            return
+
+        with self._cond:
+            self._ensure_started()
+            deadline = time.monotonic() + self.block_timeout
+            while len(self._rows) + len(rows) > self.max_queue:
+                remaining = deadline - time.monotonic()
+                if self.full_policy != "block" or remaining <= 0:
+                    self._rejected += len(rows)
+                    raise IngestionQueueFull(
+                        f"File d'ingestion pleine ({len(self._rows)} lignes en attente)"
+                    )
+                self._cond.wait(remaining)
+
+            self._rows.extend(rows)
+            self._enqueued += len(rows)
+            if len(self._rows) >= self.batch_size:
+                self._cond.notify_all()
+
+    def _next_batch(self):
+        """Attendre un lot complet ou l'expiration du délai de flush"""
+        with self._cond:
+            while not self._rows and not self._stopping:
+                self._cond.wait()
+            if not self._rows:
+                return None
+
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._rows) < self.batch_size and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+
+            count = min(len(self._rows), self.batch_size)
+            batch = [self._rows.popleft() for _ in range(count)]
+            self._in_flight = count
+            # De la place s'est libérée pour les producteurs bloqués
+            self._cond.notify_all()
+            return batch
+
+    def _write(self, batch):
+        start = time.perf_counter()
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                conn = self.connection_factory()
+                try:
+                    cursor = conn.cursor()
+                    self.ecrire_lot(cursor, batch)
+                    conn.commit()
+                    cursor.close()
+                finally:
+                    conn.close()
+                break
+            except Exception as e:
+                abandonne = attempt == self.max_retries
+                # Compteurs lus par stats() depuis les threads des requêtes
+                with self._cond:
+                    self._errors += 1
+                    if abandonne:
+                        self._dropped += len(batch)
+                if abandonne:
+                    journal.error(
+                        "Lot de %d lignes abandonné après %d essais: %s",
+                        len(batch),
+                        attempt,
+                        e,
+                    )
+                    return
+                journal.warning(
+                    "Erreur d'écriture d'un lot de %d lignes (essai %d): %s",
+                    len(batch),
+                    attempt,
+                    e,
+                )
+                time.sleep(min(0.1 * 2 ** min(attempt, 10), self.retry_max_delay))
+
+        if self.apres_ecriture is not None:
+            self.apres_ecriture()
+
+        elapsed = time.perf_counter() - start
+        with self._cond:
+            self._written += len(batch)
+            self._flushes += 1
+            self._flush_total += elapsed
+            self._flush_max = max(self._flush_max, elapsed)
+            self._flush_last = elapsed
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                self._write(batch)
+            finally:
+                with self._cond:
+                    self._in_flight = 0
+                    self._cond.notify_all()
+
+    def flush(self, timeout=5.0):
+        """Attendre que toutes les lignes en file soient écrites"""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._cond.notify_all()
+            while self._rows or self._in_flight:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or self._thread is None:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def stop(self, timeout=5.0):
+        """Vider la file puis arrêter le thread d'écriture"""
+        with self._cond:
+            if self._thread is None or self._pid != os.getpid():
+                return
+            self._stopping = True
+            self._cond.notify_all()
+        self._thread.join(timeout)
+        self._thread = None
+
+    def stats(self):
+        with self._cond:
+            return {
+                "queue_depth": len(self._rows),
+                "in_flight": self._in_flight,
+                "max_queue": self.max_queue,
+                "enqueued": self._enqueued,
+                "written": self._written,
+                "rejected": self._rejected,
+                "dropped": self._dropped,
+                "errors": self._errors,
+                "flushes": self._flushes,
+                "flush_latency_ms": {
+                    "avg": round(self._flush_total / self._flushes * 1000, 3)
+                    if self._flushes
+                    else 0.0,
+                    "last": round(self._flush_last * 1000, 3),
+                    "max": round(self._flush_max * 1000, 3),
+                },
+            }
+
+
+def from_env(ecrire_lot, apres_ecriture=None):
+    """Créer le tampon depuis l'environnement (None si le mode est désactivé)
+
+    `ecrire_lot(cursor, lignes)` insère un lot ; le commit est fait par le tampon,
+    puis `apres_ecriture()` est appelé.
+    """
+    if os.getenv("INGESTION_ASYNC", "0").lower() not in ("1", "true", "yes"):
+        return None
+    buffer = IngestionBuffer(
+        ecrire_lot,
+        max_queue=int(os.getenv("INGESTION_QUEUE_SIZE", 10000)),
+        batch_size=int(os.getenv("INGESTION_BATCH_SIZE", 500)),
+        flush_interval=float(os.getenv("INGESTION_FLUSH_MS", 50)) / 1000,
+        full_policy=os.getenv("INGESTION_FULL_POLICY", "reject"),
+        block_timeout=float(os.getenv("INGESTION_BLOCK_TIMEOUT", 1)),
+        apres_ecriture=apres_ecriture,
+    )
+    # Vider la file à l'arrêt du processus
+    atexit.register(buffer.stop)
+    return buffer
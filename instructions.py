@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Lecture des instructions (commandes et couleurs) destinées aux dispositifs
+
+Trois modes pour /api/instructions :
+- historique : toutes les instructions de la dernière heure (comportement d'origine)
+- incrémental : `since=<MyAssetNumber>` ne renvoie que les instructions plus
+  récentes ; avec `wait=<secondes>` la requête reste en attente (long-poll)
+  jusqu'à la prochaine notification de commande, couleur ou api_led.
+- file par dispositif : `device=<id>` utilise le curseur enregistré dans
+  MyAssetDevice (dernier MyAssetNumber acquitté) ; seules les instructions non
+  acquittées sont renvoyées, même après une longue absence du dispositif.
+
+La requête incrémentale est servie par l'index (MyAssetType, MyAssetNumber) :
+chaque appel coûte O(nouvelles instructions). En STORAGE_MODE=normalized,
+les requêtes lisent MyAssetReading capteur par capteur (requete_*()) sur
+l'index (SensorId, MyAssetNumber) ou (SensorId, MyAssetTimeStamp).
+
+MyAssetNumber est attribué à l'insertion, pas au commit : une instruction
+validée après une instruction de numéro supérieur serait sautée par un
+client déjà passé au-delà. Le mode incrémental ne renvoie donc que les
+instructions écrites depuis plus de INSTRUCTIONS_HOLDBACK_SECONDS secondes
+(défaut 1, 0 = désactivé), délai laissé aux transactions en cours.
+"""
+
+import os
+import time
+
+from dotenv import load_dotenv
+
+import metrics
+import normalized_storage
+import notifications
+
+# Charger les variables d'environnement
+load_dotenv()
+
+# Types de MyAsset délivrés aux dispositifs
+TYPES = ("instruction", "color")
+
+COLONNES = """
+        MyAssetNumber as id,
+        MyAssetComment as commande,
+        MyAssetType as type,
+        'PENDING' as status,
+        UNIX_TIMESTAMP(MyAssetTimeStamp) as timestamp_unix"""
+
+DERNIERE_HEURE_SQL = f"""
+    SELECT {COLONNES}
+    FROM MyAsset
+    WHERE MyAssetType IN ('instruction', 'color')
+    AND MyAssetTimeStamp >= DATE_SUB(NOW(), INTERVAL 1 HOUR)
+    ORDER BY MyAssetTimeStamp ASC
+"""
+
+# Retenue des instructions récentes (horodatage à la seconde, d'où le <)
+RETENUE_SECONDES = int(os.getenv("INSTRUCTIONS_HOLDBACK_SECONDS", 1))
+RETENUE_SQL = (
+    f" AND MyAssetTimeStamp < DATE_SUB(NOW(), INTERVAL {RETENUE_SECONDES} SECOND)"
+    if RETENUE_SECONDES > 0
+    else ""
+)
+
+DEPUIS_SQL = f"""
+    SELECT {COLONNES}
+    FROM MyAsset
+    WHERE MyAssetType IN ('instruction', 'color')
+    AND MyAssetNumber > %s{RETENUE_SQL}
+    ORDER BY MyAssetNumber ASC
+    LIMIT %s
+"""
+
+LIMITE_DEFAUT = 100
+
+# Taille maximale d'un identifiant de dispositif (colonne DeviceId)
+DEVICE_ID_MAX = 64
+
+CREATE_DEVICE_TABLE_SQL = """
+    CREATE TABLE MyAssetDevice (
+        DeviceId VARCHAR(64) NOT NULL PRIMARY KEY,
+        LastAckNumber INT NOT NULL DEFAULT 0,
+        LastAckAt TIMESTAMP NULL DEFAULT NULL
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+CURSEUR_SQL = "SELECT LastAckNumber FROM MyAssetDevice WHERE DeviceId = %s"
+
+# INSERT IGNORE : deux premiers appels simultanés ne doivent pas échouer
+CREER_CURSEUR_SQL = (
+    "INSERT IGNORE INTO MyAssetDevice (DeviceId, LastAckNumber) VALUES (%s, %s)"
+)
+
+# Un nouveau dispositif reçoit les instructions de la dernière heure
+CURSEUR_INITIAL_SQL = """
+    SELECT COALESCE(MAX(MyAssetNumber), 0)
+    FROM MyAsset
+    WHERE MyAssetType IN ('instruction', 'color')
+    AND MyAssetTimeStamp < DATE_SUB(NOW(), INTERVAL 1 HOUR)
+"""
+
+
+def requete_derniere_heure(capteurs=None):
+    """(SQL, paramètres) des instructions de la dernière heure
+
+    `capteurs` : SensorId des instructions en stockage normalisé, None sinon.
+    """
+    if capteurs is None:
+        return DERNIERE_HEURE_SQL, ()
+    lectures = normalized_storage.lectures_par_capteur(
+        capteurs,
+        condition=" AND MyAssetTimeStamp >= DATE_SUB(NOW(), INTERVAL 1 HOUR)",
+    )
+    return (
+        f"SELECT {COLONNES} FROM {lectures} AS i ORDER BY MyAssetTimeStamp ASC",
+        (),
+    )
+
+
+def requete_depuis(capteurs, since, limite=LIMITE_DEFAUT):
+    """(SQL, paramètres) des instructions plus récentes que `since` (hors retenue)"""
+    if capteurs is None:
+        return DEPUIS_SQL, (since, limite)
+    lectures = normalized_storage.lectures_par_capteur(
+        capteurs,
+        "%s",
+        " AND MyAssetNumber > %s" + RETENUE_SQL,
+        ordre="MyAssetNumber",
+    )
+    return (
+        f"SELECT {COLONNES} FROM {lectures} AS i ORDER BY MyAssetNumber LIMIT %s",
+        normalized_storage.params_par_capteur(capteurs, (since, limite)) + (limite,),
+    )
+
+
+def requete_curseur_initial(capteurs=None):
+    """(SQL, paramètres) du curseur d'un nouveau dispositif
+
+    En stockage normalisé : numéro de la dernière instruction de plus d'une
+    heure de chaque capteur, une ligne d'index par capteur.
+    """
+    if capteurs is None:
+        return CURSEUR_INITIAL_SQL, ()
+    lectures = normalized_storage.lectures_par_capteur(
+        capteurs, 1, " AND MyAssetTimeStamp < DATE_SUB(NOW(), INTERVAL 1 HOUR)"
+    )
+    return f"SELECT COALESCE(MAX(MyAssetNumber), 0) FROM {lectures} AS i", ()
+
+
+def capteurs_instructions(conn):
+    """SensorId des instructions en stockage normalisé, None sinon"""
+    if not normalized_storage.actif:
+        return None
+    return [
+        id_capteur
+        for id_capteur, _ in normalized_storage.capteurs_des_types(conn, TYPES)
+    ]
+
+
+def _lire(conn, construire, *args):
+    """Exécuter la requête `construire(capteurs, *args)` (dictionnaires)"""
+    cursor = conn.cursor(dictionary=True)
+    with metrics.chronometrer("instructions"):
+        cursor.execute(*construire(capteurs_instructions(conn), *args))
+        lignes = cursor.fetchall()
+    cursor.close()
+    return lignes
+
+
+def charger_derniere_heure(conn):
+    """Toutes les instructions de la dernière heure"""
+    return _lire(conn, requete_derniere_heure)
+
+
+def charger_depuis(conn, since, limite=LIMITE_DEFAUT):
+    """Instructions dont le MyAssetNumber est strictement supérieur à `since`"""
+    return _lire(conn, requete_depuis, since, limite)
+
+
+def attendre_depuis(
+    connection_factory, since, attente, limite=LIMITE_DEFAUT, reverification=10.0
+):
+    """Long-poll : retourne dès qu'une instruction plus récente que `since` existe
+
+    La connexion est rendue au pool pendant l'attente. Le réveil vient de
+    notifications.instructions ; `reverification` borne l'attente entre deux
+    lectures pour rattraper les écritures faites hors du processus. Après un
+    réveil, la lecture suivante a lieu dès la fin de la retenue.
+    """
+    notificateur = notifications.instructions
+    fin = time.monotonic() + attente
+    delai = reverification
+    while True:
+        # Lire la séquence avant la requête pour ne perdre aucun réveil
+        sequence = notificateur.sequence
+        conn = connection_factory()
+        try:
+            lignes = charger_depuis(conn, since, limite)
+        finally:
+            conn.close()
+
+        restant = fin - time.monotonic()
+        if lignes or restant <= 0:
+            return lignes
+        nouvelle = notificateur.attendre(sequence, min(restant, delai))
+        delai = delai_apres_reveil(nouvelle != sequence, reverification)
+
+
+def delai_apres_reveil(reveil, reverification):
+    """Attente maximale avant la relecture suivante d'un long-poll
+
+    Une instruction qui vient d'être notifiée est encore retenue : la relire
+    une seconde après la fin de la retenue (arrondi de l'horodatage).
+    """
+    if reveil and RETENUE_SECONDES > 0:
+        return min(RETENUE_SECONDES + 1, reverification)
+    return reverification
+
+
+def curseur_dispositif(conn, device):
+    """Dernier MyAssetNumber acquitté par `device` (enregistré au premier appel)"""
+    cursor = conn.cursor()
+    with metrics.chronometrer("device_cursor"):
+        cursor.execute(CURSEUR_SQL, (device,))
+        ligne = cursor.fetchone()
+        if ligne is None:
+            cursor.execute(*requete_curseur_initial(capteurs_instructions(conn)))
+            curseur = cursor.fetchone()[0]
+            cursor.execute(CREER_CURSEUR_SQL, (device, curseur))
+            conn.commit()
+        else:
+            curseur = ligne[0]
+    cursor.close()
+    return curseur
+
+
+def acquitter(conn, device, jusqu_a):
+    """Marquer comme délivrées les instructions de `device` jusqu'à `jusqu_a` inclus"""
+    cursor = conn.cursor()
+    with metrics.chronometrer("device_ack"):
+        cursor.execute(
+            """
+            INSERT INTO MyAssetDevice (DeviceId, LastAckNumber, LastAckAt)
+            VALUES (%s, %s, NOW())
+            ON DUPLICATE KEY UPDATE
+                LastAckNumber = GREATEST(LastAckNumber, VALUES(LastAckNumber)),
+                LastAckAt = NOW()
+            """,
+            (device, jusqu_a),
+        )
+        conn.commit()
+        cursor.execute(CURSEUR_SQL, (device,))
+        curseur = cursor.fetchone()[0]
+    cursor.close()
+    return curseur
@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+"""
+Diffusion en direct (Server-Sent Events) des nouvelles lignes MyAsset
+
+Un seul thread par processus lit les lignes plus récentes que le dernier
+MyAssetNumber diffusé (moins une fenêtre de relecture), puis les distribue à
+toutes les files des navigateurs connectés. Il est réveillé par
+notifications.lectures après chaque écriture de l'application, et relit au
+plus toutes les `intervalle` secondes pour rattraper les écritures externes.
+Sans abonné, il ne fait aucune requête.
+
+Les numéros AUTO_INCREMENT sont attribués à l'insertion, pas au commit : une
+transaction lente peut devenir visible après une ligne de numéro supérieur
+déjà diffusée. Chaque lecture reprend donc les FENETRE_RELECTURE derniers
+numéros et ignore ceux déjà envoyés.
+
+Sous gunicorn gthread, chaque client connecté occupe un thread du worker
+pendant toute la durée du flux : le nombre de clients par processus est
+borné par SSE_MAX_CLIENTS (défaut 4), au-delà /api/stream répond 503.
+"""
+
+import json
+import os
+import queue
+import threading
+
+import dashboard
+import db_pool
+import metrics
+import notifications
+
+# Lignes diffusées : types du tableau de bord et couleur LED
+TYPES_DIFFUSES = dashboard.DASHBOARD_TYPES + ("color",)
+
+LIMITE_LOT = 200
+# Numéros relus derrière le dernier diffusé (doit rester < LIMITE_LOT)
+FENETRE_RELECTURE = 100
+FORMAT_DATE = "%H:%M:%S - %d/%m/%Y"
+
+
+def evenement_sse(evenement, donnees, identifiant=None):
+    """Encoder un message text/event-stream"""
+    message = f"event: {evenement}\n"
+    if identifiant is not None:
+        message += f"id: {identifiant}\n"
+    return message + f"data: {json.dumps(donnees, ensure_ascii=False)}\n\n"
+
+
+def serialiser_capteur(capteur):
+    """Ligne formatée par dashboard.formater_capteur() -> dict JSON"""
+    return {
+        "id": capteur["id"],
+        "type": capteur["type"],
+        "nom": capteur["nom"],
+        "valeur": capteur["valeur"],
+        "valeur_texte": capteur["valeur_texte"],
+        "valeur_affichee": capteur["valeur_affichee"],
+        "unite": capteur["unite"],
+        "date": capteur["date"].strftime(FORMAT_DATE) if capteur["date"] else None,
+        "timestamp_unix": capteur["timestamp_unix"],
+    }
+
+
+class TropDAbonnes(Exception):
+    """Nombre maximal de clients SSE atteint dans ce processus"""
+
+
+class Diffuseur:
+    """Lecteur partagé + distribution vers les files des abonnés"""
+
+    def __init__(
+        self,
+        connection_factory=db_pool.get_connection,
+        notificateur=notifications.lectures,
+        intervalle=2.0,
+        taille_file=100,
+        max_abonnes=None,
+    ):
+        self.connection_factory = connection_factory
+        self.notificateur = notificateur
+        self.intervalle = intervalle
+        self.taille_file = taille_file
+        self.max_abonnes = max_abonnes
+
+        self._lock = threading.Lock()
+        self._abonnes = set()
+        self._thread = None
+        self._pid = None
+        self._dernier_id = None
+        self._plancher = 0
+        self._diffuses = set()
+
+        placeholders = ", ".join(f"'{t}'" for t in TYPES_DIFFUSES)
+        self._requete = f"""
+            SELECT {dashboard.COLONNES}
+            FROM MyAsset
+            WHERE MyAssetNumber > %s AND MyAssetType IN ({placeholders})
+            ORDER BY MyAssetNumber
+            LIMIT {LIMITE_LOT}
+        """
+
+    def abonner(self):
+        """Nouvelle file d'événements pour un client (TropDAbonnes si complet)"""
+        file = queue.Queue(maxsize=self.taille_file)
+        with self._lock:
+            if self.max_abonnes is not None and len(self._abonnes) >= self.max_abonnes:
+                raise TropDAbonnes(
+                    f"Trop de clients SSE ({self.max_abonnes} max par processus)"
+                )
+            self._abonnes.add(file)
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(
+                    target=self._run, name="sse-diffuseur", daemon=True
+                )
+                self._thread.start()
+        return file
+
+    def desabonner(self, file):
+        with self._lock:
+            self._abonnes.discard(file)
+
+    @property
+    def nombre_abonnes(self):
+        return len(self._abonnes)
+
+    def _lire_nouvelles_lignes(self):
+        conn = self.connection_factory()
+        try:
+            cursor = conn.cursor()
+            if self._dernier_id is None:
+                cursor.execute("SELECT COALESCE(MAX(MyAssetNumber), 0) FROM MyAsset")
+                # Rien à rattraper d'avant l'abonnement
+                self._dernier_id = self._plancher = cursor.fetchone()[0]
+            debut = max(self._dernier_id - FENETRE_RELECTURE, self._plancher)
+            with metrics.chronometrer("stream"):
+                cursor.execute(self._requete, (debut,))
+                colonnes = [d[0] for d in cursor.description]
+                lignes = [dict(zip(colonnes, ligne)) for ligne in cursor.fetchall()]
+            cursor.close()
+        finally:
+            conn.close()
+        nouvelles = [ligne for ligne in lignes if ligne["id"] not in self._diffuses]
+        if lignes:
+            self._dernier_id = max(self._dernier_id, lignes[-1]["id"])
+        self._diffuses.update(ligne["id"] for ligne in nouvelles)
+        # Seuls les numéros encore dans la fenêtre peuvent être relus
+        limite = self._dernier_id - FENETRE_RELECTURE
+        self._diffuses = {i for i in self._diffuses if i > limite}
+        return nouvelles
+
+    def _distribuer(self, message):
+        with self._lock:
+            abonnes = list(self._abonnes)
+        for file in abonnes:
+            try:
+                file.put_nowait(message)
+            except queue.Full:
+                # Client trop lent : fermer son flux, il se reconnectera
+                self.desabonner(file)
+                with file.mutex:
+                    file.queue.clear()
+                file.put_nowait(None)
+
+    def _run(self):
+        sequence = self.notificateur.sequence
+        while True:
+            with self._lock:
+                if not self._abonnes:
+                    # Plus personne à servir : le prochain abonné relancera le thread
+                    self._thread = None
+                    self._dernier_id = None
+                    self._diffuses = set()
+                    return
+            try:
+                for ligne in self._lire_nouvelles_lignes():
+                    if ligne["type"] == "color":
+                        evenement = "couleur"
+                        donnees = {"last_color": dashboard.couleur_hex(ligne["valeur_texte"])}
+                    else:
+                        evenement = "capteur"
+                        donnees = serialiser_capteur(dashboard.formater_capteur(ligne))
+                    self._distribuer(evenement_sse(evenement, donnees, ligne["id"]))
+            except Exception as e:
+                print(f"❌ Erreur du flux SSE: {e}")
+            sequence = self.notificateur.attendre(sequence, self.intervalle)
+
+    def flux(self, file=None, battement=15.0):
+        """Générateur text/event-stream pour un client (`file` : déjà abonnée)"""
+        if file is None:
+            file = self.abonner()
+        try:
+            yield "retry: 5000\n\n"
+            while True:
+                try:
+                    message = file.get(timeout=battement)
+                except queue.Empty:
+                    # Commentaire SSE pour garder la connexion ouverte
+                    yield ": ping\n\n"
+                    continue
+                if message is None:
+                    return
+                yield message
+        finally:
+            self.desabonner(file)
+
+
+diffuseur = Diffuseur(
+    intervalle=float(os.getenv("STREAM_POLL_SECONDS", 2)),
+    max_abonnes=int(os.getenv("SSE_MAX_CLIENTS", 4)),
+)
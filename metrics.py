@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Métriques internes au format d'exposition texte de Prometheus (GET /metrics)
+
+Compteurs et histogrammes en mémoire, sans dépendance : une observation coûte
+une recherche dichotomique et deux additions sous un verrou, ce qui permet de
+les laisser actifs en permanence sur le chemin d'ingestion. Les valeurs déjà
+suivies ailleurs (pool, cache, tampon d'ingestion, boîte d'envoi Raspberry)
+sont lues par des collecteurs au moment de l'exposition, sans coût par requête.
+
+Chaque processus (worker gunicorn) expose ses propres valeurs.
+
+Métriques :
+    http_request_duration_seconds     histogramme par endpoint et méthode
+    http_requests_total               requêtes par endpoint, méthode et statut
+    db_query_duration_seconds         histogramme par requête nommée
+    db_query_errors_total             requêtes en erreur par requête nommée
+    ingested_rows_total               lignes MyAsset insérées par type
+    raspberry_forward_duration_seconds  durée des envois au Raspberry Pi
+    raspberry_forward_total           envois par résultat (ok, http_error,
+                                      timeout, error, outbox_error)
+    <nom>_<clé>                       jauges tirées des stats() enregistrées
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seuils des histogrammes en secondes (requêtes HTTP et SQL)
+SEUILS_DEFAUT = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+_metriques = []
+_collecteurs = []
+
+
+def _echapper(valeur):
+    return str(valeur).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _etiquettes(noms, valeurs, extra=""):
+    paires = [f'{nom}="{_echapper(v)}"' for nom, v in zip(noms, valeurs)]
+    if extra:
+        paires.append(extra)
+    return "{" + ",".join(paires) + "}" if paires else ""
+
+
+def _nombre(valeur):
+    if valeur == float("inf"):
+        return "+Inf"
+    return repr(float(valeur)) if isinstance(valeur, float) else str(valeur)
+
+
+class Compteur:
+    """Compteur monotone, une série par combinaison d'étiquettes"""
+
+    type = "counter"
+
+    def __init__(self, nom, aide, etiquettes=()):
+        self.nom = nom
+        self.aide = aide
+        self.etiquettes = tuple(etiquettes)
+        self._verrou = threading.Lock()
+        self._valeurs = {}
+        _metriques.append(self)
+
+    def inc(self, *etiquettes, montant=1):
+        with self._verrou:
+            self._valeurs[etiquettes] = self._valeurs.get(etiquettes, 0) + montant
+
+    def exposer(self):
+        with self._verrou:
+            valeurs = sorted(self._valeurs.items())
+        for etiquettes, valeur in valeurs:
+            suffixe = _etiquettes(self.etiquettes, etiquettes)
+            yield f"{self.nom}{suffixe} {_nombre(valeur)}"
+
+
+class Histogramme:
+    """Histogramme à seuils fixes, une série par combinaison d'étiquettes"""
+
+    type = "histogram"
+
+    def __init__(self, nom, aide, etiquettes=(), seuils=SEUILS_DEFAUT):
+        self.nom = nom
+        self.aide = aide
+        self.etiquettes = tuple(etiquettes)
+        self.seuils = tuple(seuils)
+        self._verrou = threading.Lock()
+        # étiquettes -> [effectifs par seuil (+Inf en dernier), somme]
+        self._series = {}
+        _metriques.append(self)
+
+    def observer(self, valeur, *etiquettes):
+        index = bisect.bisect_left(self.seuils, valeur)
+        with self._verrou:
+            serie = self._series.get(etiquettes)
+            if serie is None:
+                serie = self._series[etiquettes] = [[0] * (len(self.seuils) + 1), 0.0]
+            serie[0][index] += 1
+            serie[1] += valeur
+
+    def exposer(self):
+        with self._verrou:
+            series = sorted(
+                (etiquettes, list(effectifs), somme)
+                for etiquettes, (effectifs, somme) in self._series.items()
+            )
+        for etiquettes, effectifs, somme in series:
+            cumul = 0
+            for seuil, effectif in zip(self.seuils + (float("inf"),), effectifs):
+                cumul += effectif
+                le = _etiquettes(self.etiquettes, etiquettes, f'le="{_nombre(seuil)}"')
+                yield f"{self.nom}_bucket{le} {cumul}"
+            suffixe = _etiquettes(self.etiquettes, etiquettes)
+            yield f"{self.nom}_sum{suffixe} {_nombre(somme)}"
+            yield f"{self.nom}_count{suffixe} {cumul}"
+
+
+def ajouter_stats(prefixe, fonction_stats):
+    """Exposer en jauges les valeurs numériques d'un dictionnaire stats()
+
+    Les dictionnaires imbriqués sont aplatis : {"latency_ms": {"p95": 3}}
+    devient <prefixe>_latency_ms_p95.
+    """
+    _collecteurs.append((prefixe, fonction_stats))
+
+
+def _aplatir(prefixe, valeurs):
+    for cle, valeur in valeurs.items():
+        nom = f"{prefixe}_{cle}"
+        if isinstance(valeur, dict):
+            yield from _aplatir(nom, valeur)
+        elif isinstance(valeur, (int, float)) and not isinstance(valeur, bool):
+            yield nom, valeur
+
+
+def exposer():
+    """Toutes les métriques au format d'exposition texte"""
+    lignes = []
+    for metrique in _metriques:
+        lignes.append(f"# HELP {metrique.nom} {metrique.aide}")
+        lignes.append(f"# TYPE {metrique.nom} {metrique.type}")
+        lignes.extend(metrique.exposer())
+
+    for prefixe, fonction_stats in _collecteurs:
+        try:
+            valeurs = fonction_stats()
+        except Exception as e:
+            lignes.append(f"# {prefixe} indisponible: {_echapper(e)}")
+            continue
+        for nom, valeur in _aplatir(prefixe, valeurs):
+            lignes.append(f"# TYPE {nom} gauge")
+            lignes.append(f"{nom} {_nombre(valeur)}")
+    lignes.append("")
+    return "\n".join(lignes)
+
+
+DUREE_HTTP = Histogramme(
+    "http_request_duration_seconds",
+    "Durée des requêtes HTTP par endpoint",
+    ("endpoint", "method"),
+)
+REQUETES_HTTP = Compteur(
+    "http_requests_total",
+    "Requêtes HTTP par endpoint, méthode et statut",
+    ("endpoint", "method", "status"),
+)
+DUREE_SQL = Histogramme(
+    "db_query_duration_seconds",
+    "Durée des requêtes MariaDB par requête nommée",
+    ("query",),
+)
+ERREURS_SQL = Compteur(
+    "db_query_errors_total",
+    "Requêtes MariaDB en erreur par requête nommée",
+    ("query",),
+)
+LIGNES_INGEREES = Compteur(
+    "ingested_rows_total", "Lignes MyAsset insérées par type", ("type",)
+)
+DUREE_RASPBERRY = Histogramme(
+    "raspberry_forward_duration_seconds",
+    "Durée des envois HTTP au Raspberry Pi",
+    (),
+    seuils=(0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0),
+)
+ENVOIS_RASPBERRY = Compteur(
+    "raspberry_forward_total", "Envois au Raspberry Pi par résultat", ("result",)
+)
+
+
+def observer_requete_http(endpoint, methode, statut, duree):
+    DUREE_HTTP.observer(duree, endpoint, methode)
+    REQUETES_HTTP.inc(endpoint, methode, str(statut))
+
+
+@contextmanager
+def chronometrer(requete):
+    """Mesurer une requête SQL nommée (durée, erreurs)"""
+    debut = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        ERREURS_SQL.inc(requete)
+        raise
+    finally:
+        DUREE_SQL.observer(time.perf_counter() - debut, requete)
+
+
+def compter_lignes(lignes):
+    """Compter les lignes MyAsset insérées, par type"""
+    if len(lignes) == 1:
+        LIGNES_INGEREES.inc(lignes[0][0])
+        return
+    par_type = {}
+    for ligne in lignes:
+        par_type[ligne[0]] = par_type.get(ligne[0], 0) + 1
+    for type_capteur, nombre in par_type.items():
+        LIGNES_INGEREES.inc(type_capteur, montant=nombre)
@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Migrations versionnées du schéma MyAsset, appliquées sur place sans perte de données
+
+Usage:
+    python migrate_database.py              appliquer les migrations en attente
+    python migrate_database.py --status     afficher la version du schéma
+    python migrate_database.py --dry-run    afficher les migrations sans les appliquer
+    python migrate_database.py --no-explain ne pas afficher les plans EXPLAIN
+    python migrate_database.py --plans      afficher les plans EXPLAIN seulement
+
+En STORAGE_MODE=normalized, les plans affichés sont ceux des requêtes du
+stockage normalisé (lecture de MyAssetReading capteur par capteur).
+"""
+
+import re
+import sys
+
+import mysql.connector
+from dotenv import load_dotenv
+
+import dashboard
+import db_pool
+import ingestion
+import instructions
+import normalized_storage
+import rollups
+
+# Charger les variables d'environnement
+load_dotenv()
+
+# Table de suivi des versions appliquées
+SCHEMA_TABLE = "MyAssetSchema"
+
+# (version, description, étapes) : une étape est une requête SQL ou une
+# fonction recevant le curseur. Ne jamais modifier une migration publiée,
+# toujours en ajouter une nouvelle à la fin de la liste.
+MIGRATIONS = [
+    (
+        1,
+        "Index (MyAssetType, MyAssetTimeStamp) pour les requêtes par type",
+        [
+            "CREATE INDEX idx_myasset_type_ts ON MyAsset (MyAssetType, MyAssetTimeStamp)",
+        ],
+    ),
+    (
+        2,
+        "MyAssetTimeStamp sans ON UPDATE CURRENT_TIMESTAMP",
+        [
+            # Les horodatages historiques ne doivent plus être réécrits par un UPDATE
+            """ALTER TABLE MyAsset MODIFY MyAssetTimeStamp
+               TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP""",
+        ],
+    ),
+    (
+        3,
+        "Table MyAssetRollup (agrégats minute/heure/jour)",
+        [rollups.CREATE_TABLE_SQL],
+    ),
+    (
+        4,
+        "File d'instructions par dispositif (MyAssetDevice, index par numéro)",
+        [
+            "CREATE INDEX idx_myasset_type_number ON MyAsset (MyAssetType, MyAssetNumber)",
+            instructions.CREATE_DEVICE_TABLE_SQL,
+        ],
+    ),
+    (
+        5,
+        "Lignes bouton_poussoir tronquées en 'bouton_pouss' -> 'button'",
+        [
+            # Serveur non strict : MyAssetType CHAR(12) tronquait bouton_poussoir
+            lambda cursor: normalized_storage.renommer_type(
+                cursor, "bouton_pouss", ingestion.type_stocke("bouton_poussoir")
+            ),
+        ],
+    ),
+]
+
+# Requêtes critiques de app.py dont on compare le plan avant/après
+REQUETES_CRITIQUES = {
+    "dashboard": dashboard.DASHBOARD_SQL,
+    "derniere_couleur": """
+        SELECT MyAssetComment FROM MyAsset
+        WHERE MyAssetType = 'color'
+        ORDER BY MyAssetTimeStamp DESC LIMIT 1
+    """,
+    "debug_joystick": """
+        SELECT * FROM MyAsset
+        WHERE MyAssetType = 'joystick'
+        ORDER BY MyAssetTimeStamp DESC LIMIT 10
+    """,
+    "instructions_depuis": """
+        SELECT MyAssetNumber, MyAssetComment FROM MyAsset
+        WHERE MyAssetType IN ('instruction', 'color')
+        AND MyAssetNumber > 0
+        ORDER BY MyAssetNumber ASC LIMIT 100
+    """,
+    "instructions": """
+        SELECT MyAssetNumber, MyAssetComment FROM MyAsset
+        WHERE MyAssetType IN ('instruction', 'color')
+        AND MyAssetTimeStamp >= DATE_SUB(NOW(), INTERVAL 1 HOUR)
+        ORDER BY MyAssetTimeStamp ASC
+    """,
+    "historique": (
+        dashboard.HISTORIQUE_SQL,
+        ("temperature", dashboard.LIMITE_HISTORIQUE),
+    ),
+}
+
+# Erreurs MySQL signifiant que l'objet existe déjà (migration appliquée à la main)
+ERREURS_DEJA_FAIT = {
+    1050,  # ER_TABLE_EXISTS_ERROR
+    1060,  # ER_DUP_FIELDNAME
+    1061,  # ER_DUP_KEYNAME
+}
+
+# Table visée par une étape SQL, pour sauter celles qui portent sur une vue
+TABLE_CIBLE = re.compile(
+    r"^\s*(?:ALTER\s+TABLE|CREATE\s+(?:UNIQUE\s+)?INDEX\s+\w+\s+ON)\s+`?(\w+)`?",
+    re.IGNORECASE,
+)
+
+
+def get_db_connection():
+    """Emprunter une connexion au pool"""
+    try:
+        return db_pool.get_connection()
+    except mysql.connector.Error as e:
+        print(f"Erreur de connexion à la base de données: {e}")
+        return None
+
+
+def creer_table_schema(cursor):
+    cursor.execute(f"""
+        CREATE TABLE IF NOT EXISTS {SCHEMA_TABLE} (
+            Version INT PRIMARY KEY,
+            Description VARCHAR(255) NOT NULL,
+            AppliedAt TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+    """)
+
+
+def versions_appliquees(cursor):
+    creer_table_schema(cursor)
+    cursor.execute(f"SELECT Version FROM {SCHEMA_TABLE}")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def version_actuelle(conn):
+    """Dernière version de schéma appliquée (0 si aucune)"""
+    cursor = conn.cursor()
+    versions = versions_appliquees(cursor)
+    cursor.close()
+    return max(versions, default=0)
+
+
+def requetes_normalisees(conn):
+    """Requêtes critiques du stockage normalisé : {nom: (SQL, paramètres)}
+
+    Les SensorId sont résolus comme dans l'application : chaque sous-requête
+    doit lire un intervalle de idx_reading_sensor_ts ou de
+    idx_reading_sensor_number, sans tri de toutes les lectures du type.
+    """
+    par_type = {}
+    for id_capteur, type_capteur in normalized_storage.capteurs_des_types(
+        conn, ("color", "joystick", "temperature")
+    ):
+        par_type.setdefault(type_capteur, []).append(id_capteur)
+    lectures = normalized_storage.lectures_par_capteur
+    historique = par_type.get("temperature", [])
+    limite = dashboard.LIMITE_HISTORIQUE
+    capteurs_instructions = instructions.capteurs_instructions(conn)
+    return {
+        "dashboard": (dashboard.construire_requete_normalisee(conn), ()),
+        "derniere_couleur": (
+            f"SELECT MyAssetComment FROM {lectures(par_type.get('color', []), 1)} "
+            "AS c ORDER BY MyAssetTimeStamp DESC LIMIT 1",
+            (),
+        ),
+        "debug_joystick": (
+            f"SELECT * FROM {lectures(par_type.get('joystick', []), 10)} "
+            "AS j ORDER BY MyAssetTimeStamp DESC LIMIT 10",
+            (),
+        ),
+        "instructions_depuis": instructions.requete_depuis(capteurs_instructions, 0),
+        "instructions": instructions.requete_derniere_heure(capteurs_instructions),
+        "historique": (
+            dashboard.requete_historique_normalisee(historique),
+            normalized_storage.params_par_capteur(historique, (limite,)) + (limite,),
+        ),
+    }
+
+
+def requetes_critiques(conn):
+    """Requêtes critiques du mode de stockage actif"""
+    if not normalized_storage.actif:
+        return REQUETES_CRITIQUES
+    try:
+        return requetes_normalisees(conn)
+    except mysql.connector.Error as e:
+        print(f"⚠️  Stockage normalisé absent ({e.msg}) : plans de MyAsset")
+        return REQUETES_CRITIQUES
+
+
+def afficher_plans(conn, cursor, titre):
+    """Afficher le plan EXPLAIN de chaque requête critique"""
+    print(f"🔎 Plans d'exécution ({titre}):")
+    for nom, requete in requetes_critiques(conn).items():
+        requete, params = requete if isinstance(requete, tuple) else (requete, ())
+        try:
+            cursor.execute(f"EXPLAIN {requete}", params)
+            colonnes = [d[0] for d in cursor.description]
+            plans = [dict(zip(colonnes, row)) for row in cursor.fetchall()]
+        except mysql.connector.Error as e:
+            print(f"   - {nom}: EXPLAIN impossible ({e})")
+            continue
+        print(f"   - {nom}:")
+        for plan in plans:
+            print(
+                f"       table={plan.get('table')} type={plan.get('type')} "
+                f"key={plan.get('key')} rows={plan.get('rows')} "
+                f"extra={plan.get('Extra') or ''}"
+            )
+
+
+def table_cible(etape):
+    """Table modifiée par une étape SQL (ALTER TABLE / CREATE INDEX), sinon None"""
+    trouve = TABLE_CIBLE.search(etape)
+    return trouve.group(1) if trouve else None
+
+
+def sans_objet(cursor, etape):
+    """Étape SQL visant une vue : MyAsset remplacée par le stockage normalisé
+
+    MyAssetReading est créée avec les index et l'horodatage équivalents
+    (normalized_storage.CREATE_READING_TABLE_SQL).
+    """
+    table = table_cible(etape)
+    return table is not None and normalized_storage.est_une_vue(cursor, table)
+
+
+def appliquer_migrations(conn, dry_run=False, explain=False):
+    """Appliquer les migrations manquantes ; retourne la liste des versions appliquées"""
+    cursor = conn.cursor()
+    deja = versions_appliquees(cursor)
+    en_attente = [m for m in MIGRATIONS if m[0] not in deja]
+
+    if not en_attente:
+        print("✅ Schéma à jour")
+        cursor.close()
+        return []
+
+    if explain:
+        afficher_plans(conn, cursor, "avant")
+
+    appliquees = []
+    for version, description, etapes in en_attente:
+        print(f"🔄 Migration {version}: {description}")
+        if dry_run:
+            continue
+        for etape in etapes:
+            try:
+                if callable(etape):
+                    etape(cursor)
+                elif sans_objet(cursor, etape):
+                    print(f"   ({table_cible(etape)} est une vue : étape sans objet)")
+                else:
+                    cursor.execute(etape)
+            except mysql.connector.Error as e:
+                if e.errno not in ERREURS_DEJA_FAIT:
+                    raise
+                print(f"   (déjà présent: {e.msg})")
+        cursor.execute(
+            f"INSERT INTO {SCHEMA_TABLE} (Version, Description) VALUES (%s, %s)",
+            (version, description),
+        )
+        conn.commit()
+        appliquees.append(version)
+        print(f"✅ Migration {version} appliquée")
+
+    if explain and not dry_run:
+        afficher_plans(conn, cursor, "après")
+
+    cursor.close()
+    return appliquees
+
+
+def main():
+    """Fonction principale"""
+    conn = get_db_connection()
+    if not conn:
+        sys.exit(1)
+
+    try:
+        if "--status" in sys.argv:
+            version = version_actuelle(conn)
+            derniere = MIGRATIONS[-1][0]
+            print(f"📋 Version du schéma: {version} (dernière disponible: {derniere})")
+            return
+        if "--plans" in sys.argv:
+            cursor = conn.cursor()
+            afficher_plans(conn, cursor, "actuels")
+            cursor.close()
+            return
+
+        appliquer_migrations(
+            conn,
+            dry_run="--dry-run" in sys.argv,
+            explain="--no-explain" not in sys.argv,
+        )
+    except mysql.connector.Error as e:
+        print(f"❌ Erreur MySQL: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
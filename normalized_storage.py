@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+"""
+Stockage normalisé des lectures : dimension capteur + table de faits étroite
+
+En mode STORAGE_MODE=normalized, chaque lecture n'occupe plus que
+(numéro, id capteur, horodatage, valeur, texte facultatif), soit une
+vingtaine d'octets au lieu des CHAR(12)/CHAR(20)/CHAR(12) et du commentaire
+constant répétés à chaque ligne :
+
+    MyAssetSensor   SensorId, MyAssetType, MyAssetName, MyAssetUnit,
+                    MyAssetComment (commentaire constant : "Ajouté via API"...)
+    MyAssetReading  MyAssetNumber, SensorId, MyAssetTimeStamp, MyAssetValue,
+                    ReadingText (texte propre à la lecture : joystick,
+                    commandes, couleurs ; NULL sinon)
+
+La vue MyAsset reconstitue l'ancienne table pour les lectures. Filtrer la vue
+par type puis trier par horodatage ne peut pas s'arrêter tôt (le type est dans
+MyAssetSensor, l'horodatage dans MyAssetReading) : les requêtes chaudes
+(tableau de bord, historique, instructions) résolvent d'abord les SensorId
+du type (capteurs_des_types) puis lisent MyAssetReading capteur par capteur
+sur l'index (SensorId, MyAssetTimeStamp, MyAssetNumber), voir
+lectures_par_capteur(). Les écritures
+passent par ingestion.inserer_lignes(), qui insère dans MyAssetReading avec
+l'id du capteur, créé au premier usage dans la transaction des lectures (sur
+le même curseur : aucune seconde connexion du pool) et mis en cache par
+processus une fois qu'il est validé.
+
+Usage:
+    python normalized_storage.py convertir   copier MyAsset puis la remplacer
+                                              par la vue (application arrêtée)
+    python normalized_storage.py statut      mode et taille des tables
+    option --dry-run : afficher les opérations sans les exécuter
+
+Après la conversion, démarrer l'application avec STORAGE_MODE=normalized.
+L'ancienne table est conservée sous le nom MyAssetLegacy.
+"""
+
+import sys
+import os
+import threading
+
+import mysql.connector
+from dotenv import load_dotenv
+
+import db_pool
+
+# Charger les variables d'environnement
+load_dotenv()
+
+actif = os.getenv("STORAGE_MODE", "legacy").lower() == "normalized"
+
+TABLE_CAPTEURS = "MyAssetSensor"
+TABLE_LECTURES = "MyAssetReading"
+TABLE_ANCIENNE = "MyAssetLegacy"
+
+# Table où vivent réellement les lignes (écritures, rétention, partitionnement)
+TABLE_DONNEES = TABLE_LECTURES if actif else "MyAsset"
+
+# Le commentaire de ces unités est la valeur de la lecture : stocké par ligne
+UNITES_TEXTE = ("text", "cmd", "rgb")
+# Au-delà, un commentaire est propre à la lecture plutôt qu'au capteur
+COMMENTAIRE_CAPTEUR_MAX = 64
+
+LOT_CONVERSION = 50000
+
+# MyAsset compare sans casse (unicode_ci), les capteurs au caractère près
+BINAIRE = "COLLATE utf8mb4_bin"
+
+CREATE_SENSOR_TABLE_SQL = f"""
+    CREATE TABLE {TABLE_CAPTEURS} (
+        SensorId SMALLINT UNSIGNED AUTO_INCREMENT PRIMARY KEY,
+        MyAssetType CHAR(12) NOT NULL,
+        MyAssetName CHAR(20) NOT NULL,
+        MyAssetUnit CHAR(12) NOT NULL,
+        MyAssetComment VARCHAR({COMMENTAIRE_CAPTEUR_MAX}) NOT NULL DEFAULT '',
+        UNIQUE KEY uq_sensor (MyAssetType, MyAssetName, MyAssetUnit, MyAssetComment),
+        KEY idx_sensor_type (MyAssetType)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_bin
+"""
+
+CREATE_READING_TABLE_SQL = f"""
+    CREATE TABLE {TABLE_LECTURES} (
+        MyAssetNumber INT AUTO_INCREMENT PRIMARY KEY,
+        SensorId SMALLINT UNSIGNED NOT NULL,
+        MyAssetTimeStamp TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+        MyAssetValue FLOAT NOT NULL,
+        ReadingText TEXT NULL,
+        -- MyAssetNumber explicite : InnoDB l'ajoute de toute façon à un index
+        -- secondaire, les tables déjà converties ont donc le même ordre
+        KEY idx_reading_sensor_ts (SensorId, MyAssetTimeStamp, MyAssetNumber),
+        KEY idx_reading_sensor_number (SensorId, MyAssetNumber)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+# Colonnes de MyAsset à partir des lectures `r` et de leur capteur `s`
+COLONNES_VUE = """r.MyAssetNumber, s.MyAssetType, s.MyAssetName, r.MyAssetValue,
+           s.MyAssetUnit,
+           COALESCE(r.ReadingText, NULLIF(s.MyAssetComment, '')) AS MyAssetComment,
+           r.MyAssetTimeStamp"""
+
+# MERGE : les filtres sur la vue sont appliqués aux index des tables
+CREATE_VIEW_SQL = f"""
+    CREATE ALGORITHM=MERGE VIEW MyAsset AS
+    SELECT {COLONNES_VUE}
+    FROM {TABLE_LECTURES} r
+    JOIN {TABLE_CAPTEURS} s ON s.SensorId = r.SensorId
+"""
+
+# Ordre de l'index (SensorId, MyAssetTimeStamp, MyAssetNumber), à rebours
+PLUS_RECENTES = "MyAssetTimeStamp DESC, MyAssetNumber DESC"
+
+INSERT_CAPTEUR_SQL = f"""INSERT IGNORE INTO {TABLE_CAPTEURS}
+    (MyAssetType, MyAssetName, MyAssetUnit, MyAssetComment) VALUES (%s, %s, %s, %s)"""
+
+# Lecture verrouillante : voit un capteur validé après le début de la
+# transaction, que l'instantané REPEATABLE READ ne montrerait pas
+SELECT_CAPTEUR_SQL = f"""SELECT SensorId FROM {TABLE_CAPTEURS}
+    WHERE MyAssetType = %s AND MyAssetName = %s AND MyAssetUnit = %s
+    AND MyAssetComment = %s LOCK IN SHARE MODE"""
+
+INSERT_LECTURE_SQL = f"""INSERT INTO {TABLE_LECTURES}
+    (SensorId, MyAssetValue, ReadingText) VALUES (%s, %s, %s)"""
+
+INSERT_LECTURE_HORODATEE_SQL = f"""INSERT INTO {TABLE_LECTURES}
+    (SensorId, MyAssetValue, ReadingText, MyAssetTimeStamp) VALUES (%s, %s, %s, %s)"""
+
+
+# Id de chaque capteur déjà rencontré par ce processus
+_ids = {}
+_ids_lock = threading.Lock()
+
+
+def _texte_par_ligne(alias=""):
+    """Même répartition que cle_capteur(), en SQL (conversion)"""
+    unites = ", ".join(f"'{unite}'" for unite in UNITES_TEXTE)
+    return (
+        f"({alias}MyAssetUnit IN ({unites}) OR {alias}MyAssetComment IS NULL "
+        f"OR CHAR_LENGTH({alias}MyAssetComment) > {COMMENTAIRE_CAPTEUR_MAX})"
+    )
+
+
+def cle_capteur(ligne):
+    """(type, nom, unité, commentaire du capteur) d'une ligne MyAsset"""
+    commentaire = ligne[4]
+    if (
+        ligne[3] in UNITES_TEXTE
+        or commentaire is None
+        or len(commentaire) > COMMENTAIRE_CAPTEUR_MAX
+    ):
+        commentaire = ""
+    return (ligne[0], ligne[1], ligne[3], commentaire)
+
+
+def texte_lecture(ligne, cle):
+    """Commentaire propre à la lecture, ou None s'il est porté par le capteur"""
+    return ligne[4] if not cle[3] else None
+
+
+def id_connu(cle):
+    """SensorId validé et mis en cache de `cle`, ou None"""
+    return _ids.get(cle)
+
+
+def memoriser(cle, identifiant):
+    with _ids_lock:
+        _ids[cle] = identifiant
+
+
+def resoudre(cursor, lignes):
+    """Ids des capteurs des lignes, créés au besoin dans la transaction du curseur
+
+    Retourne {clé: SensorId} ; None hors stockage normalisé. Un capteur créé
+    par cette transaction n'est pas mis en cache (elle peut être annulée) :
+    le lot suivant le retrouve déjà validé (INSERT IGNORE sans effet) et le
+    mémorise. Les clés sont traitées dans l'ordre pour éviter les
+    interblocages entre deux lots qui créent les mêmes capteurs.
+    """
+    if not actif:
+        return None
+    ids = {}
+    for cle in sorted(set(map(cle_capteur, lignes))):
+        identifiant = id_connu(cle)
+        if identifiant is None:
+            cursor.execute(INSERT_CAPTEUR_SQL, cle)
+            cree = cursor.rowcount == 1
+            cursor.execute(SELECT_CAPTEUR_SQL, cle)
+            identifiant = cursor.fetchone()[0]
+            if not cree:
+                memoriser(cle, identifiant)
+        ids[cle] = identifiant
+    return ids
+
+
+def requetes_insertion(lignes, ids):
+    """Regrouper les lignes en INSERT MyAssetReading (`ids` : voir resoudre())"""
+    simples = []
+    horodatees = []
+    for ligne in lignes:
+        cle = cle_capteur(ligne)
+        valeurs = (ids[cle], ligne[2], texte_lecture(ligne, cle))
+        if len(ligne) > 5:
+            horodatees.append(valeurs + (ligne[5],))
+        else:
+            simples.append(valeurs)
+    groupes = []
+    if horodatees:
+        groupes.append((INSERT_LECTURE_HORODATEE_SQL, horodatees))
+    if simples:
+        groupes.append((INSERT_LECTURE_SQL, simples))
+    return groupes
+
+
+def condition_types(nombre, exclure=False):
+    """Filtre SQL `MyAssetType [NOT] IN (...)` sur la table TABLE_DONNEES"""
+    placeholders = ", ".join(["%s"] * nombre)
+    operateur = "NOT IN" if exclure else "IN"
+    if not actif:
+        return f"MyAssetType {operateur} ({placeholders})"
+    return (
+        f"SensorId {operateur} (SELECT SensorId FROM {TABLE_CAPTEURS} "
+        f"WHERE MyAssetType IN ({placeholders}))"
+    )
+
+
+def requete_capteurs(types):
+    """SQL des (SensorId, MyAssetType) des capteurs de `types`"""
+    placeholders = ", ".join(["%s"] * len(types))
+    return (
+        f"SELECT SensorId, MyAssetType FROM {TABLE_CAPTEURS} "
+        f"WHERE MyAssetType IN ({placeholders}) ORDER BY SensorId"
+    )
+
+
+def capteurs_des_types(conn, types):
+    """[(SensorId, MyAssetType)] des capteurs de `types` (index idx_sensor_type)"""
+    cursor = conn.cursor()
+    cursor.execute(requete_capteurs(types), tuple(types))
+    capteurs = cursor.fetchall()
+    cursor.close()
+    return capteurs
+
+
+def lectures_par_capteur(capteurs, limite=None, condition="", ordre=PLUS_RECENTES):
+    """Table dérivée aux colonnes de MyAsset, lue capteur par capteur
+
+    Une sous-requête `SensorId = <id>` par capteur, réunies par UNION ALL :
+    chacune parcourt son intervalle de l'index dans l'ordre `ordre` et
+    s'arrête après `limite` lignes. `condition` (commençant par AND) et
+    `limite` peuvent contenir des %s : leurs paramètres sont à répéter pour
+    chaque capteur (params_par_capteur). Sans capteur, la table est vide.
+    """
+    fin = f" ORDER BY {ordre} LIMIT {limite}" if limite is not None else ""
+    parties = [
+        f"SELECT * FROM (SELECT * FROM {TABLE_LECTURES} "
+        f"WHERE SensorId = {int(capteur)}{condition}{fin}) AS c{index}"
+        for index, capteur in enumerate(capteurs)
+    ] or [f"SELECT * FROM {TABLE_LECTURES} WHERE 1 = 0"]
+    union = "\n        UNION ALL ".join(parties)
+    return f"""(
+        SELECT {COLONNES_VUE}
+        FROM ({union}) AS r
+        JOIN {TABLE_CAPTEURS} s ON s.SensorId = r.SensorId
+    )"""
+
+
+def params_par_capteur(capteurs, params):
+    """Paramètres de lectures_par_capteur() : `params` répétés par capteur"""
+    return tuple(params) * len(capteurs)
+
+
+def executer(cursor, requete, params=None, dry_run=False):
+    if dry_run:
+        print(f"   [dry-run] {' '.join(requete.split())}")
+        return 0
+    cursor.execute(requete, params)
+    return cursor.rowcount
+
+
+def est_une_vue(cursor, table="MyAsset"):
+    cursor.execute(
+        """
+        SELECT TABLE_TYPE FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        """,
+        (table,),
+    )
+    ligne = cursor.fetchone()
+    return ligne is not None and ligne[0] == "VIEW"
+
+
+def renommer_type(cursor, ancien, nouveau):
+    """Remplacer le MyAssetType `ancien` par `nouveau`, table MyAsset ou vue
+
+    En stockage normalisé, les lectures d'un capteur `ancien` passent au
+    capteur `nouveau` de même nom, unité et commentaire (créé au besoin).
+    """
+    if not est_une_vue(cursor):
+        cursor.execute(
+            "UPDATE MyAsset SET MyAssetType = %s WHERE MyAssetType = %s",
+            (nouveau, ancien),
+        )
+        return
+    cursor.execute(
+        f"SELECT SensorId, MyAssetName, MyAssetUnit, MyAssetComment "
+        f"FROM {TABLE_CAPTEURS} WHERE MyAssetType = %s",
+        (ancien,),
+    )
+    for id_ancien, *reste in cursor.fetchall():
+        cle = (nouveau, *reste)
+        cursor.execute(INSERT_CAPTEUR_SQL, cle)
+        cursor.execute(SELECT_CAPTEUR_SQL, cle)
+        id_nouveau = cursor.fetchone()[0]
+        cursor.execute(
+            f"UPDATE {TABLE_LECTURES} SET SensorId = %s WHERE SensorId = %s",
+            (id_nouveau, id_ancien),
+        )
+        cursor.execute(
+            f"DELETE FROM {TABLE_CAPTEURS} WHERE SensorId = %s", (id_ancien,)
+        )
+
+
+def convertir(conn, lot=LOT_CONVERSION, dry_run=False):
+    """Copier MyAsset dans le stockage normalisé puis la remplacer par la vue
+
+    Les numéros MyAssetNumber sont conservés (curseurs des dispositifs,
+    identifiants SSE). À lancer application arrêtée : les lignes écrites
+    pendant la copie ne seraient pas reprises.
+    """
+    cursor = conn.cursor()
+    if est_une_vue(cursor):
+        print("✅ MyAsset est déjà une vue sur le stockage normalisé")
+        cursor.close()
+        return True
+
+    print("🏗️  Création des tables normalisées...")
+    executer(cursor, CREATE_SENSOR_TABLE_SQL, dry_run=dry_run)
+    executer(cursor, CREATE_READING_TABLE_SQL, dry_run=dry_run)
+
+    print("🔄 Capteurs distincts...")
+    capteurs = executer(
+        cursor,
+        f"""
+        INSERT IGNORE INTO {TABLE_CAPTEURS}
+            (MyAssetType, MyAssetName, MyAssetUnit, MyAssetComment)
+        SELECT DISTINCT MyAssetType {BINAIRE}, MyAssetName {BINAIRE},
+               MyAssetUnit {BINAIRE},
+               (CASE WHEN {_texte_par_ligne()} THEN '' ELSE MyAssetComment END)
+               {BINAIRE}
+        FROM MyAsset
+        """,
+        dry_run=dry_run,
+    )
+    conn.commit()
+    print(f"✅ {capteurs} capteurs")
+
+    cursor.execute("SELECT COALESCE(MAX(MyAssetNumber), 0) FROM MyAsset")
+    dernier = cursor.fetchone()[0]
+    texte = _texte_par_ligne("a.")
+    debut = 0
+    copiees = 0
+    # Par tranches de numéros : transactions courtes, progression visible
+    while debut < dernier:
+        fin = debut + lot
+        copiees += executer(
+            cursor,
+            f"""
+            INSERT INTO {TABLE_LECTURES}
+                (MyAssetNumber, SensorId, MyAssetTimeStamp, MyAssetValue, ReadingText)
+            SELECT a.MyAssetNumber, s.SensorId, a.MyAssetTimeStamp, a.MyAssetValue,
+                   CASE WHEN {texte} THEN a.MyAssetComment END
+            FROM MyAsset a
+            JOIN {TABLE_CAPTEURS} s
+              ON s.MyAssetType = a.MyAssetType {BINAIRE}
+             AND s.MyAssetName = a.MyAssetName {BINAIRE}
+             AND s.MyAssetUnit = a.MyAssetUnit {BINAIRE}
+             AND s.MyAssetComment =
+                 (CASE WHEN {texte} THEN '' ELSE a.MyAssetComment END) {BINAIRE}
+            WHERE a.MyAssetNumber > %s AND a.MyAssetNumber <= %s
+            """,
+            (debut, fin),
+            dry_run=dry_run,
+        )
+        conn.commit()
+        debut = fin
+        print(f"  - {min(debut, dernier)}/{dernier}", end="\r")
+        if dry_run:
+            break
+    print(f"✅ {copiees} lectures copiées")
+
+    cursor.execute("SELECT COUNT(*) FROM MyAsset")
+    attendues = cursor.fetchone()[0]
+    if not dry_run and copiees != attendues:
+        print(f"❌ {copiees} lectures copiées sur {attendues} : MyAsset conservée")
+        print(f"   Supprimer {TABLE_LECTURES} et {TABLE_CAPTEURS} avant de relancer")
+        cursor.close()
+        return False
+
+    print(f"🔄 Remplacement de MyAsset par la vue ({TABLE_ANCIENNE} conservée)...")
+    executer(cursor, f"RENAME TABLE MyAsset TO {TABLE_ANCIENNE}", dry_run=dry_run)
+    executer(cursor, CREATE_VIEW_SQL, dry_run=dry_run)
+    cursor.close()
+    print("✅ Conversion terminée : redémarrer avec STORAGE_MODE=normalized")
+    return True
+
+
+def statut(conn):
+    cursor = conn.cursor()
+    vue = est_une_vue(cursor)
+    print(f"📋 STORAGE_MODE: {'normalized' if actif else 'legacy'}")
+    print(f"📋 MyAsset: {'vue (stockage normalisé)' if vue else 'table'}")
+    if vue != actif:
+        print("⚠️  STORAGE_MODE ne correspond pas au schéma des tables")
+    cursor.execute(
+        """
+        SELECT TABLE_NAME, TABLE_ROWS, DATA_LENGTH, INDEX_LENGTH
+        FROM information_schema.TABLES
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_TYPE = 'BASE TABLE'
+        AND TABLE_NAME IN ('MyAsset', %s, %s, %s)
+        """,
+        (TABLE_CAPTEURS, TABLE_LECTURES, TABLE_ANCIENNE),
+    )
+    for nom, lignes, donnees, index in cursor.fetchall():
+        octets = donnees / lignes if lignes else 0
+        print(
+            f"   - {nom}: ~{lignes} lignes, {donnees / 1e6:.1f} Mo de données "
+            f"({octets:.0f} o/ligne), {index / 1e6:.1f} Mo d'index"
+        )
+    cursor.close()
+
+
+def main():
+    """Fonction principale"""
+    action = next((a for a in sys.argv[1:] if not a.startswith("--")), "statut")
+    dry_run = "--dry-run" in sys.argv
+
+    try:
+        conn = db_pool.get_connection()
+    except mysql.connector.Error as e:
+        print(f"Erreur de connexion à la base de données: {e}")
+        sys.exit(1)
+
+    try:
+        if action == "convertir":
+            if not convertir(conn, dry_run=dry_run):
+                sys.exit(1)
+        elif action == "statut":
+            statut(conn)
+        else:
+            print("Usage:")
+            print("  python normalized_storage.py convertir [--dry-run]")
+            print("  python normalized_storage.py statut")
+    except mysql.connector.Error as e:
+        print(f"❌ Erreur MySQL: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Notifications en mémoire entre les routes d'écriture et les lecteurs en attente
+
+Un Notificateur est un compteur de séquence protégé par une condition : les
+écritures appellent notifier() après leur commit, les lecteurs (flux SSE,
+long-poll) attendent un changement de séquence au lieu d'interroger la base.
+La notification est limitée au processus : les écritures externes
+(write_to_db.py, autres workers) sont rattrapées par le délai d'attente.
+"""
+
+import threading
+
+
+class Notificateur:
+    """Séquence croissante + attente du prochain changement"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._sequence = 0
+        self._rappels = []
+
+    @property
+    def sequence(self):
+        return self._sequence
+
+    def notifier(self):
+        with self._cond:
+            self._sequence += 1
+            self._cond.notify_all()
+        for rappel in list(self._rappels):
+            rappel()
+
+    def ajouter_rappel(self, rappel):
+        """Appeler `rappel()` après chaque notification (réveil d'une boucle asyncio)"""
+        self._rappels.append(rappel)
+
+    def retirer_rappel(self, rappel):
+        self._rappels.remove(rappel)
+
+    def attendre(self, sequence_vue, timeout):
+        """Attendre que la séquence dépasse `sequence_vue` ; retourne la séquence courante"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._sequence != sequence_vue, timeout)
+            return self._sequence
+
+
+# Nouvelles lignes MyAsset (lectures de capteurs, couleurs, instructions)
+lectures = Notificateur()
+
+# Nouvelles instructions pour les dispositifs (commande, couleur, api_led)
+instructions = Notificateur()
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Profilage à la demande des requêtes et journal des requêtes SQL lentes
+
+Profilage : une requête venant d'une adresse autorisée et portant l'en-tête
+`X-Profile: 1` (ou `?profile=1`) reçoit un en-tête Server-Timing avec la durée
+de chaque phase (sql, formatage, tri, rendu... et total), visible dans
+l'onglet Réseau du navigateur. Avec `X-Profile: cprofile` (ou
+`?profile=cprofile`) la réponse est remplacée par le rapport cProfile des
+fonctions les plus coûteuses. Sans drapeau, le coût est une lecture de
+ContextVar par phase.
+
+Requêtes lentes : toute requête sur MyAsset plus longue que SLOW_QUERY_MS est
+écrite (JSON, une ligne par requête) avec son texte, ses paramètres, sa durée
+et le résultat d'EXPLAIN, calculé en arrière-plan sur une autre connexion du
+pool pour ne pas rallonger la requête mesurée.
+
+Configuration par variables d'environnement :
+    PROFILING_ALLOW       adresses IP autorisées à profiler, séparées par des
+                          virgules (défaut 127.0.0.1,::1 ; vide = désactivé)
+    PROFILING_TOP         fonctions affichées dans le rapport cProfile (défaut 40)
+    SLOW_QUERY_MS         seuil du journal des requêtes lentes en ms
+                          (défaut 0 = désactivé)
+    SLOW_QUERY_LOG        fichier du journal (défaut : sortie standard)
+    SLOW_QUERY_EXPLAIN    exécuter EXPLAIN sur les requêtes lentes (défaut 1)
+"""
+
+import contextvars
+import cProfile
+import io
+import json
+import os
+import pstats
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+from dotenv import load_dotenv
+
+import metrics
+
+# Charger les variables d'environnement
+load_dotenv()
+
+ADRESSES_AUTORISEES = {
+    ip.strip()
+    for ip in os.getenv("PROFILING_ALLOW", "127.0.0.1,::1").split(",")
+    if ip.strip()
+}
+PROFILING_TOP = int(os.getenv("PROFILING_TOP", 40))
+
+SEUIL_LENT = float(os.getenv("SLOW_QUERY_MS", 0)) / 1000
+JOURNAL_LENT = os.getenv("SLOW_QUERY_LOG")
+EXPLAIN_LENT = os.getenv("SLOW_QUERY_EXPLAIN", "1").lower() in ("1", "true", "yes")
+
+REQUETES_LENTES = metrics.Compteur(
+    "db_slow_queries_total", "Requêtes MyAsset au-delà de SLOW_QUERY_MS"
+)
+
+# Profil de la requête en cours (None hors profilage)
+_profil = contextvars.ContextVar("profil", default=None)
+
+# cProfile ne supporte qu'un profileur actif à la fois par processus
+_verrou_cprofile = threading.Lock()
+
+
+class Profil:
+    """Durées cumulées par phase d'une requête profilée"""
+
+    def __init__(self, cprofile=False):
+        self.debut = time.perf_counter()
+        self.phases = {}
+        self.requetes_sql = 0
+        self.cprofile = None
+        if cprofile and _verrou_cprofile.acquire(blocking=False):
+            self.cprofile = cProfile.Profile()
+            self.cprofile.enable()
+
+    def ajouter(self, nom, duree):
+        self.phases[nom] = self.phases.get(nom, 0.0) + duree
+
+    def arreter(self):
+        """Retourne le rapport cProfile (ou None) et libère le profileur"""
+        if self.cprofile is None:
+            return None
+        self.cprofile.disable()
+        _verrou_cprofile.release()
+        sortie = io.StringIO()
+        stats = pstats.Stats(self.cprofile, stream=sortie)
+        stats.sort_stats("cumulative").print_stats(PROFILING_TOP)
+        return sortie.getvalue()
+
+    def server_timing(self):
+        """Valeur de l'en-tête Server-Timing (durées en ms)"""
+        total = time.perf_counter() - self.debut
+        parties = []
+        for nom, duree in self.phases.items():
+            partie = f"{nom};dur={duree * 1000:.2f}"
+            if nom == "sql":
+                partie += f';desc="{self.requetes_sql} requetes"'
+            parties.append(partie)
+        parties.append(f"total;dur={total * 1000:.2f}")
+        return ", ".join(parties)
+
+
+def demarrer(adresse, drapeau):
+    """Activer le profilage si `drapeau` est demandé depuis une adresse autorisée"""
+    if not drapeau or drapeau == "0" or adresse not in ADRESSES_AUTORISEES:
+        return None
+    profil = Profil(cprofile=drapeau == "cprofile")
+    _profil.set(profil)
+    return profil
+
+
+def terminer():
+    """Désactiver le profilage de la requête en cours ; retourne son Profil"""
+    profil = _profil.get()
+    if profil is not None:
+        _profil.set(None)
+    return profil
+
+
+@contextmanager
+def phase(nom):
+    """Chronométrer une phase de la requête en cours (sans effet hors profilage)"""
+    profil = _profil.get()
+    if profil is None:
+        yield
+        return
+    debut = time.perf_counter()
+    try:
+        yield
+    finally:
+        profil.ajouter(nom, time.perf_counter() - debut)
+
+
+class JournalLent:
+    """Écriture en arrière-plan des requêtes lentes, avec EXPLAIN"""
+
+    def __init__(self, connection_factory, chemin=None, explain=True, taille=1000):
+        self.connection_factory = connection_factory
+        self.chemin = chemin
+        self.explain = explain
+        self._file = queue.Queue(maxsize=taille)
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        # Démarrage paresseux : après un fork, le thread du parent n'existe plus
+        with self._lock:
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(
+                    target=self._run, name="slow-query-log", daemon=True
+                )
+                self._thread.start()
+
+    def enregistrer(self, requete, params, duree, plusieurs=False):
+        REQUETES_LENTES.inc()
+        self._ensure_started()
+        try:
+            self._file.put_nowait((requete, params, duree, plusieurs, time.time()))
+        except queue.Full:
+            pass  # Base saturée : ne pas bloquer les requêtes pour le journal
+
+    def _plan(self, requete, params):
+        conn = self.connection_factory()
+        try:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"EXPLAIN {requete}", params)
+            plan = cursor.fetchall()
+            cursor.close()
+            return plan
+        finally:
+            conn.close()
+
+    def _run(self):
+        while True:
+            requete, params, duree, plusieurs, instant = self._file.get()
+            entree = {
+                "time": datetime.fromtimestamp(instant).isoformat(
+                    timespec="milliseconds"
+                ),
+                "duration_ms": round(duree * 1000, 3),
+                "sql": " ".join(requete.split()),
+                # executemany : seulement la taille du lot et sa première ligne
+                "params": [len(params), params[0] if params else None]
+                if plusieurs
+                else params,
+            }
+            if self.explain and not plusieurs:
+                try:
+                    entree["explain"] = self._plan(requete, params)
+                except Exception as e:
+                    entree["explain_error"] = str(e)
+            ligne = json.dumps(entree, default=str, ensure_ascii=False)
+            if self.chemin:
+                with open(self.chemin, "a", encoding="utf-8") as fichier:
+                    fichier.write(ligne + "\n")
+            else:
+                print(f"🐢 Requête lente: {ligne}")
+
+
+class CurseurChronometre:
+    """Curseur qui mesure chaque requête (phase sql, journal des requêtes lentes)"""
+
+    def __init__(self, curseur, journal):
+        self._curseur = curseur
+        self._journal = journal
+
+    def _mesurer(self, methode, requete, params, plusieurs):
+        debut = time.perf_counter()
+        try:
+            return methode(requete, params)
+        finally:
+            duree = time.perf_counter() - debut
+            profil = _profil.get()
+            if profil is not None:
+                profil.ajouter("sql", duree)
+                profil.requetes_sql += 1
+            if (
+                self._journal is not None
+                and duree >= SEUIL_LENT
+                and "MyAsset" in requete
+                and not requete.startswith("EXPLAIN")
+            ):
+                self._journal.enregistrer(requete, params, duree, plusieurs)
+
+    def execute(self, requete, params=None, *args, **kwargs):
+        if args or kwargs:
+            return self._curseur.execute(requete, params, *args, **kwargs)
+        return self._mesurer(self._curseur.execute, requete, params, False)
+
+    def executemany(self, requete, params):
+        return self._mesurer(self._curseur.executemany, requete, params, True)
+
+    def fetchall(self):
+        # Lecture du résultat sur le réseau : comptée dans la phase sql
+        with phase("sql"):
+            return self._curseur.fetchall()
+
+    def __iter__(self):
+        return iter(self._curseur)
+
+    def __getattr__(self, nom):
+        return getattr(self._curseur, nom)
+
+
+def envelopper_curseur(curseur, journal):
+    """Curseur chronométré si un profil ou le journal est actif, sinon inchangé"""
+    if journal is None and _profil.get() is None:
+        return curseur
+    return CurseurChronometre(curseur, journal)
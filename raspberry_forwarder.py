@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+"""
+Transfert asynchrone des commandes vers le Raspberry Pi
+
+Les routes déposent la commande dans une boîte d'envoi persistante (fichier
+SQLite, conservée après un redémarrage) et répondent immédiatement. Un thread
+par processus l'envoie avec une session HTTP keep-alive, dans l'ordre
+d'arrivée, en réessayant avec un délai exponentiel si le Pi ne répond pas.
+Une nouvelle commande SET_COLOR remplace celles encore en attente.
+
+Configuration par variables d'environnement :
+    RASPBERRY_PI_URL          adresse du Raspberry Pi
+    RASPBERRY_OUTBOX_PATH     fichier de la boîte d'envoi
+                              (défaut instance/raspberry_outbox.sqlite3 à côté de ce
+                              module, indépendant du répertoire courant)
+    RASPBERRY_OUTBOX_MAX      commandes en attente maximum (défaut 1000)
+    RASPBERRY_TIMEOUT         délai d'une requête en s (défaut 5)
+    RASPBERRY_RETRY_MAX       délai maximum entre deux essais en s (défaut 60)
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import requests
+
+import metrics
+
+# Dossier d'instance Flask (données locales, hors du code)
+DOSSIER_INSTANCE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "instance")
+CHEMIN_DEFAUT = os.path.join(DOSSIER_INSTANCE, "raspberry_outbox.sqlite3")
+
+# Une commande réservée par un processus n'est pas reprise par un autre avant ce délai
+DUREE_RESERVATION = 30.0
+
+
+class RaspberryForwarder:
+    """Boîte d'envoi SQLite + thread d'envoi"""
+
+    def __init__(
+        self,
+        url,
+        chemin,
+        max_attente=1000,
+        timeout=5.0,
+        delai_initial=0.5,
+        delai_max=60.0,
+    ):
+        self.url = url
+        self.chemin = chemin
+        self.max_attente = max_attente
+        self.timeout = timeout
+        self.delai_initial = delai_initial
+        self.delai_max = delai_max
+
+        self._cond = threading.Condition()
+        self._thread = None
+        self._pid = None
+        self._pid_reprise = None
+        self._session = None
+        self._signal = False
+
+        # Compteurs
+        self._envoyees = 0
+        self._echecs = 0
+        self._abandonnees = 0
+        self._fusionnees = 0
+        self._latence_total = 0.0
+        self._latence_max = 0.0
+        self._latences = deque(maxlen=1000)
+
+        os.makedirs(os.path.dirname(os.path.abspath(chemin)), exist_ok=True)
+        with self._connexion() as db:
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("""
+                CREATE TABLE IF NOT EXISTS outbox (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    kind TEXT NOT NULL,
+                    payload TEXT NOT NULL,
+                    created REAL NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt REAL NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _connexion(self):
+        db = sqlite3.connect(self.chemin, timeout=5)
+        try:
+            with db:  # commit ou rollback
+                yield db
+        finally:
+            db.close()
+
+    def _ensure_started(self):
+        # Démarrage paresseux : après un fork, le thread du parent n'existe plus
+        if self._thread is None or self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._session = requests.Session()
+            self._thread = threading.Thread(
+                target=self._run, name="raspberry-forwarder", daemon=True
+            )
+            self._thread.start()
+
+    def reprendre(self):
+        """Relancer l'envoi des commandes restées en attente (une fois par processus)"""
+        if self._pid_reprise == os.getpid():
+            return
+        self._pid_reprise = os.getpid()
+        if self.backlog():
+            with self._cond:
+                self._ensure_started()
+
+    def envoyer(self, data):
+        """Déposer une commande dans la boîte d'envoi (retour immédiat)"""
+        commentaire = str(data.get("comment", ""))
+        kind = "SET_COLOR" if commentaire.startswith("SET_COLOR:") else "command"
+        maintenant = time.time()
+
+        with self._connexion() as db:
+            if kind == "SET_COLOR":
+                # Seule la dernière couleur compte : remplacer celles en attente
+                curseur = db.execute("DELETE FROM outbox WHERE kind = 'SET_COLOR'")
+                self._fusionnees += curseur.rowcount
+            db.execute(
+                "INSERT INTO outbox (kind, payload, created, next_attempt) "
+                "VALUES (?, ?, ?, ?)",
+                (kind, json.dumps(data), maintenant, maintenant),
+            )
+            # Boîte bornée : abandonner les plus anciennes commandes
+            curseur = db.execute(
+                "DELETE FROM outbox WHERE id NOT IN "
+                "(SELECT id FROM outbox ORDER BY id DESC LIMIT ?)",
+                (self.max_attente,),
+            )
+            self._abandonnees += curseur.rowcount
+
+        with self._cond:
+            self._ensure_started()
+            self._signal = True
+            self._cond.notify()
+        return True
+
+    def _reserver(self):
+        """Réserver la plus ancienne commande ; retourne (ligne, attente avant échéance)"""
+        maintenant = time.time()
+        with self._connexion() as db:
+            ligne = db.execute(
+                "SELECT id, payload, created, attempts, next_attempt "
+                "FROM outbox ORDER BY id LIMIT 1"
+            ).fetchone()
+            if ligne is None:
+                return None, None
+            if ligne[4] > maintenant:
+                # Ordre strict : on attend l'échéance de la plus ancienne
+                return None, ligne[4] - maintenant
+            curseur = db.execute(
+                "UPDATE outbox SET next_attempt = ? WHERE id = ? AND next_attempt = ?",
+                (maintenant + DUREE_RESERVATION, ligne[0], ligne[4]),
+            )
+            if curseur.rowcount != 1:
+                # Réservée entre-temps par un autre processus
+                return None, 0.05
+        return ligne, None
+
+    def _terminer(self, identifiant, created):
+        with self._connexion() as db:
+            db.execute("DELETE FROM outbox WHERE id = ?", (identifiant,))
+        latence = time.time() - created
+        with self._cond:
+            self._envoyees += 1
+            self._latence_total += latence
+            self._latence_max = max(self._latence_max, latence)
+            self._latences.append(latence)
+
+    def _replanifier(self, identifiant, tentatives):
+        delai = min(self.delai_initial * 2**tentatives, self.delai_max)
+        with self._connexion() as db:
+            db.execute(
+                "UPDATE outbox SET attempts = ?, next_attempt = ? WHERE id = ?",
+                (tentatives + 1, time.time() + delai, identifiant),
+            )
+        with self._cond:
+            self._echecs += 1
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._signal = False
+            try:
+                ligne, attente = self._reserver()
+            except sqlite3.Error as e:
+                print(f"❌ Boîte d'envoi Raspberry illisible: {e}")
+                ligne, attente = None, 5.0
+
+            if ligne is None:
+                with self._cond:
+                    # Une commande déposée pendant _reserver() ne doit pas être manquée
+                    if not self._signal:
+                        self._cond.wait(attente)
+                continue
+
+            identifiant, payload, created, tentatives, _ = ligne
+            debut = time.perf_counter()
+            try:
+                response = self._session.post(
+                    f"{self.url}/api/data",
+                    json=json.loads(payload),
+                    timeout=self.timeout,
+                )
+                succes = response.status_code == 200
+                resultat = "ok" if succes else "http_error"
+                if not succes:
+                    print(f"⚠️  Raspberry Pi: HTTP {response.status_code}")
+            except requests.RequestException as e:
+                succes = False
+                resultat = "timeout" if isinstance(e, requests.Timeout) else "error"
+                if tentatives == 0:
+                    print(f"⚠️  Raspberry Pi injoignable: {e}")
+            metrics.DUREE_RASPBERRY.observer(time.perf_counter() - debut)
+            metrics.ENVOIS_RASPBERRY.inc(resultat)
+
+            if succes:
+                self._terminer(identifiant, created)
+            else:
+                self._replanifier(identifiant, tentatives)
+
+    def backlog(self):
+        with self._connexion() as db:
+            return db.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def stats(self):
+        backlog = self.backlog()
+        with self._cond:
+            latences = sorted(self._latences)
+            return {
+                "backlog": backlog,
+                "sent": self._envoyees,
+                "failed_attempts": self._echecs,
+                "dropped": self._abandonnees,
+                "coalesced": self._fusionnees,
+                "delivery_latency_ms": {
+                    "avg": round(self._latence_total / self._envoyees * 1000, 3)
+                    if self._envoyees
+                    else 0.0,
+                    "p95": round(latences[int(len(latences) * 0.95)] * 1000, 3)
+                    if latences
+                    else 0.0,
+                    "max": round(self._latence_max * 1000, 3),
+                },
+            }
+
+
+def from_env(url):
+    """Créer le transfert depuis l'environnement"""
+    return RaspberryForwarder(
+        url,
+        os.getenv("RASPBERRY_OUTBOX_PATH", CHEMIN_DEFAUT),
+        max_attente=int(os.getenv("RASPBERRY_OUTBOX_MAX", 1000)),
+        timeout=float(os.getenv("RASPBERRY_TIMEOUT", 5)),
+        delai_max=float(os.getenv("RASPBERRY_RETRY_MAX", 60)),
+    )
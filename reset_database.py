@@ -1,13 +1,32 @@
 #!/usr/bin/env python3
 """
 Script pour nettoyer complètement la base de données et créer la nouvelle structure MyAsset
+
+Usage:
+    python reset_database.py [--confirm] [--seed N] [--jours J]
+
+--seed ajoute N lectures synthétiques réparties sur les J derniers jours
+(défaut 30), insérées par lots puis agrégées en une passe (rollups).
+Avec STORAGE_MODE=normalized, la table est aussitôt convertie au stockage
+normalisé (MyAssetSensor + MyAssetReading, vue MyAsset).
 """
 
+import argparse
+import itertools
+import random
+import time
+from datetime import datetime
+
 import mysql.connector
 from dotenv import load_dotenv
 import os
 import sys
 
+import ingestion
+import migrate_database
+import normalized_storage
+import rollups
+
 # Charger les variables d'environnement
 load_dotenv()
 
@@ -26,7 +45,101 @@ def get_db_connection():
         return None
 
 
-def reset_database():
+# Lectures synthétiques : (type, valeur moyenne, amplitude, part du total)
+PROFILS_SYNTHETIQUES = (
+    ("temperature", 21.0, 4.0, 0.25),
+    ("humidity", 55.0, 15.0, 0.2),
+    ("pressure", 1013.0, 8.0, 0.15),
+    ("light", 400.0, 350.0, 0.15),
+    ("button", None, None, 0.1),
+    ("joystick", None, None, 0.14),
+    ("instruction", None, None, 0.01),
+)
+DIRECTIONS_JOYSTICK = ("UP", "DOWN", "LEFT", "RIGHT", "CENTER")
+COMMENTAIRE_SYNTHETIQUE = "Donnée synthétique"
+LOT_SYNTHETIQUE = 10000
+
+
+def generer_lectures(nombre, jours=30, graine=None):
+    """Itère sur `nombre` lignes MyAsset horodatées, réparties sur `jours` jours
+
+    Les horodatages sont croissants (insertion dans l'ordre de la clé primaire),
+    comme pour des capteurs réels.
+    """
+    aleatoire = random.Random(graine)
+    types = [profil[0] for profil in PROFILS_SYNTHETIQUES]
+    poids = [profil[3] for profil in PROFILS_SYNTHETIQUES]
+    profils = {profil[0]: profil[1:3] for profil in PROFILS_SYNTHETIQUES}
+    noms = {t: f"Simu {t}"[: ingestion.NOM_MAX] for t in types}
+    unites = {t: ingestion.REGISTRE.get(t, ingestion.TYPE_INCONNU).unite for t in types}
+
+    debut = time.time() - jours * 86400
+    pas = jours * 86400 / max(nombre, 1)
+    # Tirage des types par blocs : random.choices est bien plus rapide en lot
+    for depart in range(0, nombre, LOT_SYNTHETIQUE):
+        taille = min(LOT_SYNTHETIQUE, nombre - depart)
+        for i, type_capteur in enumerate(aleatoire.choices(types, poids, k=taille)):
+            horodatage = datetime.fromtimestamp(debut + (depart + i) * pas)
+            moyenne, amplitude = profils[type_capteur]
+            if moyenne is not None:
+                valeur = round(moyenne + aleatoire.uniform(-amplitude, amplitude), 2)
+                yield (
+                    type_capteur,
+                    noms[type_capteur],
+                    valeur,
+                    unites[type_capteur],
+                    COMMENTAIRE_SYNTHETIQUE,
+                    horodatage,
+                )
+            elif type_capteur == "button":
+                yield (
+                    "button",
+                    noms["button"],
+                    aleatoire.randint(0, 1),
+                    "bool",
+                    COMMENTAIRE_SYNTHETIQUE,
+                    horodatage,
+                )
+            elif type_capteur == "joystick":
+                direction = aleatoire.choice(DIRECTIONS_JOYSTICK)
+                yield ("joystick", noms["joystick"], 0.0, "text", direction, horodatage)
+            else:
+                yield ("instruction", "Commande Simu", 1.0, "cmd", "LED_ON", horodatage)
+
+
+def peupler(conn, nombre, jours=30, graine=None, lot=LOT_SYNTHETIQUE):
+    """Insérer `nombre` lectures synthétiques par lots, puis recalculer les agrégats
+
+    Les agrégats sont reconstruits en une requête par résolution plutôt que
+    mis à jour lot par lot (rollups.enregistrer), bien plus lent en masse.
+    """
+    cursor = conn.cursor()
+    lignes = generer_lectures(nombre, jours, graine)
+    debut = time.perf_counter()
+    inserees = 0
+    while True:
+        paquet = list(itertools.islice(lignes, lot))
+        if not paquet:
+            break
+        capteurs = normalized_storage.resoudre(cursor, paquet)
+        for requete, groupe in ingestion.requetes_insertion(paquet, capteurs):
+            cursor.executemany(requete, groupe)
+        conn.commit()
+        inserees += len(paquet)
+        print(f"  - {inserees}/{nombre} lectures synthétiques insérées", end="\r")
+    cursor.close()
+    duree = time.perf_counter() - debut
+    print(
+        f"✅ {inserees} lectures synthétiques en {duree:.1f}s "
+        f"({inserees / max(duree, 1e-9):.0f}/s)"
+    )
+
+    if rollups.actif and inserees:
+        rollups.reconstruire(conn, jours)
+    return inserees
+
+
+def reset_database(lectures_synthetiques=0, jours=30):
     """Nettoyer complètement la base de données et créer la nouvelle structure"""
     conn = get_db_connection()
     if not conn:
@@ -42,12 +155,15 @@ def reset_database():
         cursor.execute("SET FOREIGN_KEY_CHECKS = 0;")
 
         # Récupérer toutes les tables existantes
-        cursor.execute("SHOW TABLES;")
+        cursor.execute("SHOW FULL TABLES;")
         tables = cursor.fetchall()
 
-        # Supprimer toutes les tables une par une
-        for table in tables:
-            table_name = table[0]
+        # Supprimer toutes les tables une par une (et la vue MyAsset en mode normalisé)
+        for table_name, table_type in tables:
+            if table_type == "VIEW":
+                print(f"  - Suppression de la vue: {table_name}")
+                cursor.execute(f"DROP VIEW IF EXISTS `{table_name}`;")
+                continue
             print(f"  - Suppression de la table: {table_name}")
             cursor.execute(f"DROP TABLE IF EXISTS `{table_name}`;")
 
@@ -73,6 +189,9 @@ def reset_database():
 
         cursor.execute(create_table_query)
         print("✅ Table MyAsset créée avec succès")
+
+        # Amener la table au dernier schéma (index, horodatage figé)
+        migrate_database.appliquer_migrations(conn)
         print("")
         print("📋 Structure de la nouvelle table:")
         print("   - MyAssetNumber: INT(11) AUTO_INCREMENT PRIMARY KEY")
@@ -81,7 +200,8 @@ def reset_database():
         print("   - MyAssetValue: FLOAT NOT NULL")
         print("   - MyAssetUnit: CHAR(12) NOT NULL")
         print("   - MyAssetComment: TEXT")
-        print("   - MyAssetTimeStamp: TIMESTAMP (auto-généré)")
+        print("   - MyAssetTimeStamp: TIMESTAMP (auto-généré à l'insertion)")
+        print("   - Index: (MyAssetType, MyAssetTimeStamp)")
         print("")
 
         # Ajouter quelques données d'exemple pour tester
@@ -116,6 +236,15 @@ def reset_database():
 
         # Valider les changements
         conn.commit()
+
+        if normalized_storage.actif:
+            print("")
+            normalized_storage.convertir(conn)
+
+        if lectures_synthetiques:
+            print("")
+            print(f"📝 Ajout de {lectures_synthetiques} lectures synthétiques...")
+            peupler(conn, lectures_synthetiques, jours)
         print("")
         print("🎉 Base de données réinitialisée avec succès!")
         print("📊 Vous pouvez maintenant utiliser la nouvelle structure MyAsset")
@@ -123,7 +252,7 @@ def reset_database():
         # Afficher le contenu de la table pour vérification
         print("")
         print("📋 Contenu actuel de la table MyAsset:")
-        cursor.execute("SELECT * FROM MyAsset ORDER BY MyAssetNumber;")
+        cursor.execute("SELECT * FROM MyAsset ORDER BY MyAssetNumber LIMIT 20;")
         rows = cursor.fetchall()
 
         print(
@@ -154,6 +283,14 @@ def reset_database():
 
 def main():
     """Fonction principale"""
+    parser = argparse.ArgumentParser(description="Réinitialiser la base MyAsset")
+    parser.add_argument("--confirm", action="store_true", help="sans confirmation")
+    parser.add_argument(
+        "--seed", type=int, default=0, help="nombre de lectures synthétiques"
+    )
+    parser.add_argument("--jours", type=int, default=30)
+    args = parser.parse_args()
+
     print("🚨 ATTENTION: Ce script va SUPPRIMER TOUTES les données de la base!")
     print("📋 Nouvelle structure qui sera créée:")
     print("   Table: MyAsset")
@@ -163,7 +300,7 @@ def main():
     print("")
 
     # Demander confirmation
-    if len(sys.argv) > 1 and sys.argv[1] == "--confirm":
+    if args.confirm:
         confirmation = "oui"
     else:
         confirmation = input(
@@ -174,7 +311,7 @@ def main():
         print("")
         print("🚀 Démarrage de la réinitialisation de la base de données...")
         print("")
-        if reset_database():
+        if reset_database(args.seed, args.jours):
             print("")
             print("✅ Réinitialisation terminée avec succès!")
             sys.exit(0)
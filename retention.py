@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+"""
+Rétention des données MyAsset : partitionnement journalier et purge
+
+La table est partitionnée par jour seulement (RANGE sur
+UNIX_TIMESTAMP(MyAssetTimeStamp)), pas par type : une partition contient tous
+les types. Seule une journée entièrement plus vieille que la plus longue
+rétention configurée est supprimée par DROP PARTITION. La rétention par type
+n'a donc pas de suppression en bloc : tout type (ou la rétention par défaut)
+plus court que ce maximum est purgé par petits DELETE servis par l'index
+(MyAssetType, MyAssetTimeStamp), d'un coût proportionnel aux lignes
+supprimées. Sans partitionnement, tout passe par ces DELETE bornés.
+En STORAGE_MODE=normalized, la table traitée est MyAssetReading (MyAsset
+n'est plus qu'une vue) et les types sont retrouvés via MyAssetSensor.
+Les agrégats MyAssetRollup sont purgés selon ROLLUPS_RETENTION_DAYS (voir
+rollups.py) : seules les résolutions fines expirent.
+
+Configuration par variables d'environnement :
+    RETENTION_DAYS            rétention par type, ex. "joystick=7,temperature=90"
+                              (bouton_poussoir désigne les lignes "button")
+    RETENTION_DEFAULT_DAYS    rétention des autres types en jours (défaut 365)
+    RETENTION_PARTITIONS_AHEAD  partitions futures à préparer (défaut 3)
+    RETENTION_INTERVAL_HOURS  période de la tâche de fond dans app.py (0 = désactivée)
+
+Usage:
+    python retention.py [purger]        maintenance complète (partitions + purge)
+    python retention.py partitionner    convertir MyAsset en table partitionnée
+    python retention.py statut          afficher partitions et rétentions
+    option --dry-run : afficher les opérations sans les exécuter
+"""
+
+import os
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+import mysql.connector
+from dotenv import load_dotenv
+
+import db_pool
+import ingestion
+import normalized_storage
+import rollups
+
+# Charger les variables d'environnement
+load_dotenv()
+
+TABLE = normalized_storage.TABLE_DONNEES
+LOCK_NAME = rollups.LOCK_NAME
+DELETE_CHUNK = 5000
+
+
+def lire_config():
+    """Retourne (rétention par type, rétention par défaut) en jours"""
+    par_type = {}
+    for element in os.getenv("RETENTION_DAYS", "").split(","):
+        if "=" in element:
+            type_capteur, jours = element.split("=", 1)
+            # Clé en type affiché (bouton_poussoir) ou stocké (button)
+            stocke = ingestion.type_stocke(type_capteur.strip())
+            par_type[stocke] = min(int(jours), par_type.get(stocke, int(jours)))
+    return par_type, int(os.getenv("RETENTION_DEFAULT_DAYS", 365))
+
+
+def nom_partition(jour):
+    return f"p{jour:%Y%m%d}"
+
+
+def definition_partition(jour):
+    lendemain = jour + timedelta(days=1)
+    return (
+        f"PARTITION {nom_partition(jour)} VALUES LESS THAN "
+        f"(UNIX_TIMESTAMP('{lendemain:%Y-%m-%d} 00:00:00'))"
+    )
+
+
+def lister_partitions(cursor):
+    """[(nom, borne supérieure epoch ou None pour MAXVALUE)] ; vide si non partitionnée"""
+    cursor.execute(
+        """
+        SELECT PARTITION_NAME, PARTITION_DESCRIPTION
+        FROM information_schema.PARTITIONS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        AND PARTITION_NAME IS NOT NULL
+        ORDER BY PARTITION_ORDINAL_POSITION
+        """,
+        (TABLE,),
+    )
+    return [
+        (nom, None if borne == "MAXVALUE" else int(borne))
+        for nom, borne in cursor.fetchall()
+    ]
+
+
+def executer(cursor, requete, params=None, dry_run=False):
+    if dry_run:
+        print(f"   [dry-run] {' '.join(requete.split())}")
+        return 0
+    cursor.execute(requete, params)
+    return cursor.rowcount
+
+
+def partitionner(conn, jours_avance=3, dry_run=False):
+    """Convertir MyAsset en table partitionnée par jour (opération lourde, une seule fois)"""
+    cursor = conn.cursor()
+    if TABLE == "MyAsset" and normalized_storage.est_une_vue(cursor):
+        print("❌ MyAsset est une vue : relancer avec STORAGE_MODE=normalized")
+        cursor.close()
+        return
+    if lister_partitions(cursor):
+        print(f"✅ {TABLE} est déjà partitionnée")
+        cursor.close()
+        return
+
+    par_type, defaut = lire_config()
+    retention_max = max([defaut, *par_type.values()])
+
+    cursor.execute(f"SELECT MIN(MyAssetTimeStamp) FROM {TABLE}")
+    plus_ancien = cursor.fetchone()[0]
+    aujourd_hui = date.today()
+    debut = max(
+        plus_ancien.date() if plus_ancien else aujourd_hui,
+        aujourd_hui - timedelta(days=retention_max),
+    )
+
+    # Les lignes antérieures à `debut` sont déjà expirées : une partition commune
+    partitions = [
+        f"PARTITION p_historique VALUES LESS THAN "
+        f"(UNIX_TIMESTAMP('{debut:%Y-%m-%d} 00:00:00'))"
+    ]
+    jour = debut
+    while jour <= aujourd_hui + timedelta(days=jours_avance):
+        partitions.append(definition_partition(jour))
+        jour += timedelta(days=1)
+    partitions.append("PARTITION pmax VALUES LESS THAN MAXVALUE")
+
+    print(f"🏗️  Partitionnement de {TABLE} ({len(partitions)} partitions)...")
+    # La colonne de partitionnement doit faire partie de la clé primaire
+    executer(
+        cursor,
+        f"ALTER TABLE {TABLE} DROP PRIMARY KEY, "
+        "ADD PRIMARY KEY (MyAssetNumber, MyAssetTimeStamp)",
+        dry_run=dry_run,
+    )
+    executer(
+        cursor,
+        f"ALTER TABLE {TABLE} PARTITION BY RANGE (UNIX_TIMESTAMP(MyAssetTimeStamp)) "
+        f"({', '.join(partitions)})",
+        dry_run=dry_run,
+    )
+    cursor.close()
+    print("✅ Partitionnement terminé")
+
+
+def preparer_partitions(cursor, partitions, jours_avance, dry_run=False):
+    """Créer les partitions des prochains jours en découpant pmax"""
+    existantes = {nom for nom, _ in partitions}
+    aujourd_hui = date.today()
+    nouvelles = [
+        definition_partition(aujourd_hui + timedelta(days=i))
+        for i in range(jours_avance + 1)
+        if nom_partition(aujourd_hui + timedelta(days=i)) not in existantes
+    ]
+    if not nouvelles:
+        return 0
+    executer(
+        cursor,
+        f"ALTER TABLE {TABLE} REORGANIZE PARTITION pmax INTO "
+        f"({', '.join(nouvelles)}, PARTITION pmax VALUES LESS THAN MAXVALUE)",
+        dry_run=dry_run,
+    )
+    print(f"✅ {len(nouvelles)} partition(s) future(s) créée(s)")
+    return len(nouvelles)
+
+
+def supprimer_partitions_expirees(cursor, partitions, retention_max, dry_run=False):
+    """DROP PARTITION de chaque jour entièrement hors de la plus longue rétention"""
+    limite = time.time() - retention_max * 86400
+    expirees = [
+        nom for nom, borne in partitions if borne is not None and borne <= limite
+    ]
+    for nom in expirees:
+        print(f"  - Suppression de la partition {nom}")
+        executer(cursor, f"ALTER TABLE {TABLE} DROP PARTITION {nom}", dry_run=dry_run)
+    return len(expirees)
+
+
+def purger_lignes(conn, cursor, condition, params, jours, dry_run=False):
+    """Supprimer par petits lots les lignes plus vieilles que `jours` (un commit par lot)"""
+    limite = datetime.now() - timedelta(days=jours)
+    total = 0
+    while True:
+        supprimees = executer(
+            cursor,
+            f"DELETE FROM {TABLE} WHERE {condition}MyAssetTimeStamp < %s "
+            f"LIMIT {DELETE_CHUNK}",
+            tuple(params) + (limite,),
+            dry_run=dry_run,
+        )
+        conn.commit()
+        total += supprimees
+        if dry_run or supprimees < DELETE_CHUNK:
+            return total
+
+
+def purger_agregats(conn, cursor, dry_run=False):
+    """Supprimer les agrégats des résolutions expirées (lignes supprimées)"""
+    total = 0
+    for resolution, jours in rollups.lire_retention().items():
+        if jours is None:
+            continue
+        limite = datetime.now() - timedelta(days=jours)
+        while True:
+            try:
+                supprimees = executer(
+                    cursor,
+                    f"DELETE FROM {rollups.TABLE} WHERE Resolution = %s "
+                    f"AND BucketStart < %s LIMIT {DELETE_CHUNK}",
+                    (resolution, limite),
+                    dry_run=dry_run,
+                )
+            except mysql.connector.Error as e:
+                if e.errno != 1146:  # ER_NO_SUCH_TABLE : agrégats non migrés
+                    raise
+                return total
+            conn.commit()
+            total += supprimees
+            if dry_run or supprimees < DELETE_CHUNK:
+                break
+    return total
+
+
+def planifier_purge(par_type, defaut, partitionnee):
+    """DELETE nécessaires : liste de (condition, paramètres, jours)
+
+    Les partitions ne sont supprimées qu'à la plus longue rétention : toute
+    rétention plus courte, par type ou par défaut, passe par un DELETE.
+    """
+    retention_max = max([defaut, *par_type.values()])
+    plan = []
+    for type_capteur, jours in par_type.items():
+        if not partitionnee or jours < retention_max:
+            plan.append(
+                (normalized_storage.condition_types(1) + " AND ", [type_capteur], jours)
+            )
+    if not partitionnee or defaut < retention_max:
+        # Types sans rétention propre
+        condition = ""
+        if par_type:
+            condition = (
+                normalized_storage.condition_types(len(par_type), exclure=True)
+                + " AND "
+            )
+        plan.append((condition, list(par_type), defaut))
+    return plan
+
+
+def purger(conn, jours_avance=None, dry_run=False):
+    """Maintenance complète ; retourne le nombre de lignes/partitions supprimées"""
+    par_type, defaut = lire_config()
+    retention_max = max([defaut, *par_type.values()])
+    if jours_avance is None:
+        jours_avance = int(os.getenv("RETENTION_PARTITIONS_AHEAD", 3))
+
+    cursor = conn.cursor()
+    # Un seul processus à la fois (plusieurs workers peuvent lancer la tâche)
+    cursor.execute("SELECT GET_LOCK(%s, 0)", (LOCK_NAME,))
+    if not cursor.fetchone()[0]:
+        print("⏭️  Purge déjà en cours dans un autre processus")
+        cursor.close()
+        return {}
+
+    try:
+        resultat = {
+            "partitions_supprimees": 0,
+            "lignes_supprimees": 0,
+            "agregats_supprimes": 0,
+        }
+        partitions = lister_partitions(cursor)
+        if partitions:
+            preparer_partitions(cursor, partitions, jours_avance, dry_run)
+            resultat["partitions_supprimees"] = supprimer_partitions_expirees(
+                cursor, partitions, retention_max, dry_run
+            )
+
+        for condition, params, jours in planifier_purge(
+            par_type, defaut, bool(partitions)
+        ):
+            resultat["lignes_supprimees"] += purger_lignes(
+                conn, cursor, condition, params, jours, dry_run
+            )
+        resultat["agregats_supprimes"] = purger_agregats(conn, cursor, dry_run)
+
+        print(
+            f"✅ Rétention: {resultat['partitions_supprimees']} partition(s), "
+            f"{resultat['lignes_supprimees']} ligne(s) et "
+            f"{resultat['agregats_supprimes']} agrégat(s) supprimé(s)"
+        )
+        return resultat
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+        cursor.fetchall()
+        cursor.close()
+
+
+def statut(conn):
+    par_type, defaut = lire_config()
+    cursor = conn.cursor()
+    partitions = lister_partitions(cursor)
+    cursor.close()
+    print(f"📋 Rétention par défaut: {defaut} jours")
+    for type_capteur, jours in sorted(par_type.items()):
+        print(f"   - {type_capteur}: {jours} jours")
+    for resolution, jours in rollups.lire_retention().items():
+        print(f"   - agrégats {resolution}: {jours or '∞'} jours")
+    if not partitions:
+        print(f"📋 {TABLE} n'est pas partitionnée (purge par DELETE)")
+        return
+    retention_max = max([defaut, *par_type.values()])
+    courts = sorted(t for t, jours in par_type.items() if jours < retention_max)
+    if defaut < retention_max:
+        courts.append("autres types")
+    if courts:
+        print(
+            f"⚠️  Purgés par DELETE (partitions à {retention_max} jours): "
+            + ", ".join(courts)
+        )
+    print(f"📋 {len(partitions)} partitions:")
+    for nom, borne in partitions:
+        fin = datetime.fromtimestamp(borne) if borne is not None else "MAXVALUE"
+        print(f"   - {nom} < {fin}")
+
+
+_tache = {"thread": None, "pid": None}
+
+
+def demarrer_tache_fond():
+    """Lancer la purge périodique dans un thread (une fois par processus)"""
+    intervalle = float(os.getenv("RETENTION_INTERVAL_HOURS", 0)) * 3600
+    if intervalle <= 0 or _tache["pid"] == os.getpid():
+        return
+
+    def boucle():
+        while True:
+            try:
+                conn = db_pool.get_connection()
+                try:
+                    purger(conn)
+                finally:
+                    conn.close()
+            except Exception as e:
+                print(f"❌ Erreur de rétention: {e}")
+            time.sleep(intervalle)
+
+    _tache["pid"] = os.getpid()
+    _tache["thread"] = threading.Thread(target=boucle, name="retention", daemon=True)
+    _tache["thread"].start()
+
+
+def main():
+    """Fonction principale"""
+    action = next((a for a in sys.argv[1:] if not a.startswith("--")), "purger")
+    dry_run = "--dry-run" in sys.argv
+
+    try:
+        conn = db_pool.get_connection()
+    except mysql.connector.Error as e:
+        print(f"Erreur de connexion à la base de données: {e}")
+        sys.exit(1)
+
+    try:
+        if action == "partitionner":
+            partitionner(
+                conn, int(os.getenv("RETENTION_PARTITIONS_AHEAD", 3)), dry_run
+            )
+        elif action == "statut":
+            statut(conn)
+        elif action == "purger":
+            purger(conn, dry_run=dry_run)
+        else:
+            print("❌ Action inconnue (purger, partitionner, statut)")
+            sys.exit(1)
+    except mysql.connector.Error as e:
+        print(f"❌ Erreur MySQL: {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+"""
+Agrégats continus (rollups) des lectures MyAsset par minute, heure et jour
+
+Chaque lot de lectures numériques est regroupé en Python par (résolution,
+type, nom, début d'intervalle) puis met à jour, dans la même transaction que
+son INSERT, une ligne min/max/somme/nombre par clé de la table MyAssetRollup
+(créée par la migration 3 de migrate_database.py). Les petits lots (une
+lecture /api/capteur en mode synchrone) ne font pas leurs propres upserts :
+après leur commit, ils sont cumulés en mémoire par AgregatsDifferes et écrits
+toutes les ROLLUPS_FLUSH_SECONDS, une ligne par clé quel que soit le nombre
+de lectures. Un arrêt brutal du processus perd au plus ce délai d'agrégats
+(`python rollups.py reconstruire` les recalcule).
+/api/series lit la résolution la plus fine qui tient dans le budget de points :
+un graphique sur 30 jours coûte quelques centaines de lignes.
+
+Les intervalles sont alignés sur l'epoch (minuit UTC pour les jours).
+
+Rétention : seules les résolutions fines expirent (purgées par retention.py),
+les plus grossières restent pour les graphiques sur longue période. Une
+résolution expirée n'est plus choisie pour un intervalle qui la dépasse.
+
+Configuration par variables d'environnement :
+    ROLLUPS_ENABLED           mise à jour des agrégats à l'insertion (défaut 1)
+    ROLLUPS_DEFER_BELOW       lots plus petits agrégés en différé (défaut 10)
+    ROLLUPS_FLUSH_SECONDS     période d'écriture des agrégats différés (défaut 1)
+    ROLLUPS_RETENTION_DAYS    rétention par résolution en jours, 0 = conservée
+                              (défaut "minute=30,hour=365,day=0") ; lue au
+                              démarrage, une entrée invalide est signalée et
+                              ignorée (valeur par défaut de la résolution)
+
+Usage:
+    python rollups.py reconstruire [--jours N]   recalculer depuis MyAsset (défaut 30)
+"""
+
+import atexit
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+import mysql.connector
+from dotenv import load_dotenv
+
+import db_pool
+import metrics
+
+# Charger les variables d'environnement
+load_dotenv()
+
+TABLE = "MyAssetRollup"
+
+# Résolution -> durée d'un intervalle en secondes (de la plus fine à la plus grossière)
+RESOLUTIONS = {"minute": 60, "hour": 3600, "day": 86400}
+
+# Unités non numériques exclues des agrégats
+UNITES_EXCLUES = {"text", "cmd", "rgb"}
+
+POINTS_DEFAUT = 500
+POINTS_MAX = 5000
+
+RETENTION_DEFAUT = "minute=30,hour=365,day=0"
+
+# Verrou MySQL partagé avec retention.py : purge et reconstruction exclusives
+LOCK_NAME = "myasset_retention"
+LOCK_TIMEOUT = 60
+
+CREATE_TABLE_SQL = f"""
+    CREATE TABLE {TABLE} (
+        Resolution CHAR(6) NOT NULL,
+        MyAssetType CHAR(12) NOT NULL,
+        MyAssetName CHAR(20) NOT NULL,
+        BucketStart DATETIME NOT NULL,
+        MinValue FLOAT NOT NULL,
+        MaxValue FLOAT NOT NULL,
+        SumValue DOUBLE NOT NULL,
+        CountValue INT NOT NULL,
+        PRIMARY KEY (Resolution, MyAssetType, MyAssetName, BucketStart)
+    ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
+"""
+
+UPSERT_SQL = f"""
+    INSERT INTO {TABLE}
+        (Resolution, MyAssetType, MyAssetName, BucketStart,
+         MinValue, MaxValue, SumValue, CountValue)
+    VALUES (%s, %s, %s,
+            FROM_UNIXTIME(UNIX_TIMESTAMP(COALESCE(%s, NOW())) DIV %s * %s),
+            %s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE
+        MinValue = LEAST(MinValue, VALUES(MinValue)),
+        MaxValue = GREATEST(MaxValue, VALUES(MaxValue)),
+        SumValue = SumValue + VALUES(SumValue),
+        CountValue = CountValue + VALUES(CountValue)
+"""
+
+# Lots plus petits : agrégats différés (AgregatsDifferes) plutôt qu'upsertés
+LOT_DIFFERE = int(os.getenv("ROLLUPS_DEFER_BELOW", 10))
+
+# Désactivé au premier échec "table inexistante" (migration non appliquée)
+actif = os.getenv("ROLLUPS_ENABLED", "1").lower() in ("1", "true", "yes")
+
+
+class RollupsIndisponibles(Exception):
+    """Agrégats désactivés ou table MyAssetRollup absente"""
+
+
+def analyser_retention(texte, defaut=None):
+    """"minute=30,hour=365,day=0" -> {résolution: jours ou None (conservée)}
+
+    Une entrée invalide est signalée puis ignorée : la résolution garde sa
+    valeur de `defaut` (None : conservée).
+    """
+    retention = dict(defaut) if defaut else dict.fromkeys(RESOLUTIONS)
+    for element in texte.split(","):
+        if not element.strip():
+            continue
+        resolution, _, jours = (partie.strip() for partie in element.partition("="))
+        if resolution not in RESOLUTIONS:
+            erreur = f"résolution inconnue, attendu {', '.join(RESOLUTIONS)}"
+        elif not jours.isdigit():
+            erreur = "nombre de jours entier positif attendu"
+        else:
+            retention[resolution] = int(jours) or None
+            continue
+        print(f"⚠️  ROLLUPS_RETENTION_DAYS: '{element.strip()}' ignorée ({erreur})")
+    return retention
+
+
+# Lue une fois au démarrage (par requête /api/series et par purge sinon)
+RETENTION = analyser_retention(
+    os.getenv("ROLLUPS_RETENTION_DAYS", RETENTION_DEFAUT),
+    analyser_retention(RETENTION_DEFAUT),
+)
+
+
+def lire_retention():
+    """Rétention par résolution en jours (None : conservée)"""
+    return dict(RETENTION)
+
+
+def debut_intervalle(horodatage, pas):
+    """Début de l'intervalle de `pas` secondes contenant `horodatage` (datetime)"""
+    return datetime.fromtimestamp(int(horodatage.timestamp()) // pas * pas)
+
+
+def grouper(lignes, maintenant=None):
+    """{(résolution, type, nom, début d'intervalle): [min, max, somme, nombre]}
+
+    Une ligne est (type, nom, valeur, unité, commentaire[, horodatage]). Sans
+    horodatage, l'intervalle est celui de `maintenant` ; si `maintenant` est
+    None, il est laissé à la base (NOW(), comme MyAssetTimeStamp).
+    """
+    groupes = {}
+    for ligne in lignes:
+        if ligne[3] in UNITES_EXCLUES:
+            continue
+        horodatage = ligne[5] if len(ligne) > 5 else maintenant
+        valeur = float(ligne[2])
+        for resolution, pas in RESOLUTIONS.items():
+            debut = None
+            if horodatage is not None:
+                debut = debut_intervalle(horodatage, pas)
+            cle = (resolution, ligne[0], ligne[1], debut)
+            groupe = groupes.get(cle)
+            if groupe is None:
+                groupes[cle] = [valeur, valeur, valeur, 1]
+            else:
+                groupe[0] = min(groupe[0], valeur)
+                groupe[1] = max(groupe[1], valeur)
+                groupe[2] += valeur
+                groupe[3] += 1
+    return groupes
+
+
+def fusionner(groupes, autres):
+    """Ajouter les agrégats `autres` à `groupes` (modifié en place)"""
+    for cle, (minimum, maximum, somme, nombre) in autres.items():
+        groupe = groupes.get(cle)
+        if groupe is None:
+            groupes[cle] = [minimum, maximum, somme, nombre]
+        else:
+            groupe[0] = min(groupe[0], minimum)
+            groupe[1] = max(groupe[1], maximum)
+            groupe[2] += somme
+            groupe[3] += nombre
+
+
+def parametres(groupes):
+    """Paramètres d'UPSERT_SQL, un par clé"""
+    # Ordre déterministe des clés pour éviter les interblocages entre transactions
+    params = []
+    for (resolution, type_capteur, nom, debut), g in sorted(
+        groupes.items(), key=lambda item: (*item[0][:3], str(item[0][3]))
+    ):
+        pas = RESOLUTIONS[resolution]
+        params.append((resolution, type_capteur, nom, debut, pas, pas, *g))
+    return params
+
+
+def agreger(lignes):
+    """Regrouper des lignes MyAsset en paramètres d'upsert (un par clé et résolution)"""
+    return parametres(grouper(lignes))
+
+
+def ecrire(cursor, params):
+    """Exécuter les upserts ; désactive les agrégats si la table est absente"""
+    try:
+        cursor.executemany(UPSERT_SQL, params)
+    except mysql.connector.Error as e:
+        if e.errno != 1146:  # ER_NO_SUCH_TABLE
+            raise
+        desactiver(e.msg)
+
+
+def enregistrer(cursor, lignes):
+    """Mettre à jour les agrégats dans la transaction courante du curseur"""
+    if not actif:
+        return
+    params = agreger(lignes)
+    if params:
+        ecrire(cursor, params)
+
+
+def a_differer(lignes):
+    """Lot trop petit pour ses propres upserts : agrégats à confier à differer()"""
+    return len(lignes) < LOT_DIFFERE
+
+
+class AgregatsDifferes:
+    """Agrégats des petits lots cumulés en mémoire, écrits par un thread"""
+
+    def __init__(self, connection_factory=db_pool.get_connection, intervalle=1.0):
+        self.connection_factory = connection_factory
+        self.intervalle = intervalle
+        self._lock = threading.Lock()
+        self._groupes = {}
+        self._thread = None
+        self._pid = None
+
+    def ajouter(self, lignes):
+        """Cumuler des lignes déjà validées en base"""
+        if not actif:
+            return
+        groupes = grouper(lignes, datetime.now())
+        if not groupes:
+            return
+        with self._lock:
+            fusionner(self._groupes, groupes)
+            # Démarrage paresseux : après un fork, le thread du parent n'existe plus
+            if self._thread is None or self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._thread = threading.Thread(
+                    target=self._run, name="rollups-differes", daemon=True
+                )
+                self._thread.start()
+
+    @property
+    def en_attente(self):
+        with self._lock:
+            return len(self._groupes)
+
+    def vider(self):
+        """Écrire les agrégats cumulés ; retourne le nombre de clés écrites"""
+        with self._lock:
+            groupes, self._groupes = self._groupes, {}
+        if not groupes or not actif:
+            return 0
+        try:
+            conn = self.connection_factory()
+            try:
+                cursor = conn.cursor()
+                ecrire(cursor, parametres(groupes))
+                conn.commit()
+                cursor.close()
+            finally:
+                conn.close()
+        except Exception:
+            # Rien n'est perdu : réessayé à la prochaine écriture
+            with self._lock:
+                fusionner(self._groupes, groupes)
+            raise
+        return len(groupes)
+
+    def _run(self):
+        while True:
+            time.sleep(self.intervalle)
+            try:
+                self.vider()
+            except Exception as e:
+                print(f"❌ Erreur d'écriture des agrégats différés: {e}")
+
+
+differes = AgregatsDifferes(intervalle=float(os.getenv("ROLLUPS_FLUSH_SECONDS", 1)))
+# Écrire les agrégats en attente à l'arrêt du processus
+atexit.register(lambda: differes.vider() if differes.en_attente else None)
+
+
+def differer(lignes):
+    """Après le commit d'un petit lot : agrégats cumulés puis écrits en différé"""
+    differes.ajouter(lignes)
+
+
+def desactiver(raison):
+    """Arrêter la mise à jour des agrégats (table absente)"""
+    global actif
+    actif = False
+    print(f"⚠️  Agrégats désactivés: {raison} (lancer migrate_database.py)")
+
+
+def choisir_resolution(debut, fin, points, maintenant=None):
+    """Résolution la plus fine dont le nombre d'intervalles tient dans `points`
+
+    Une résolution dont la rétention ne couvre plus `debut` est écartée.
+    """
+    if maintenant is None:
+        maintenant = time.time()
+    duree = max(fin - debut, 1)
+    retention = lire_retention()
+    for resolution, pas in RESOLUTIONS.items():
+        jours = retention[resolution]
+        if jours is not None and debut < maintenant - jours * 86400:
+            continue
+        if duree / pas <= points:
+            return resolution
+    return "day"
+
+
+def charger_serie(conn, type_capteur, debut, fin, nom=None, points=POINTS_DEFAUT):
+    """Série agrégée entre deux epochs ; retourne (résolution, points)
+
+    Lève RollupsIndisponibles si les agrégats sont désactivés ou absents.
+    """
+    if not actif:
+        raise RollupsIndisponibles("agrégats désactivés (ROLLUPS_ENABLED)")
+    resolution = choisir_resolution(debut, fin, points)
+    condition_nom = "AND MyAssetName = %s" if nom else ""
+    params = [resolution, type_capteur]
+    if nom:
+        params.append(nom)
+    params += [debut, fin]
+
+    cursor = conn.cursor()
+    with metrics.chronometrer("series"):
+        try:
+            cursor.execute(
+                f"""
+                SELECT UNIX_TIMESTAMP(BucketStart), MIN(MinValue), MAX(MaxValue),
+                       SUM(SumValue), SUM(CountValue)
+                FROM {TABLE}
+                WHERE Resolution = %s AND MyAssetType = %s {condition_nom}
+                AND BucketStart >= FROM_UNIXTIME(%s)
+                AND BucketStart < FROM_UNIXTIME(%s)
+                GROUP BY BucketStart
+                ORDER BY BucketStart
+                """,
+                params,
+            )
+        except mysql.connector.Error as e:
+            cursor.close()
+            if e.errno != 1146:  # ER_NO_SUCH_TABLE
+                raise
+            raise RollupsIndisponibles(
+                f"table {TABLE} absente (lancer migrate_database.py)"
+            ) from e
+        lignes = cursor.fetchall()
+    serie = [
+        {
+            "t": int(t),
+            "min": minimum,
+            "max": maximum,
+            "avg": round(somme / nombre, 4) if nombre else None,
+            "count": int(nombre),
+        }
+        for t, minimum, maximum, somme, nombre in lignes
+    ]
+    cursor.close()
+    return resolution, serie
+
+
+def reconstruire(conn, jours=30):
+    """Recalculer les agrégats des `jours` derniers jours à partir de MyAsset
+
+    Prend le verrou de retention.py : une purge ne supprime pas de lignes
+    pendant le recalcul. Les lectures insérées pendant la reconstruction
+    peuvent en revanche être comptées deux fois ou perdues : arrêter
+    l'ingestion (app.py, write_to_db.py) avant de la lancer.
+    """
+    depuis = int(time.time()) - jours * 86400
+    exclues = ", ".join(["%s"] * len(UNITES_EXCLUES))
+    cursor = conn.cursor()
+    cursor.execute("SELECT GET_LOCK(%s, %s)", (LOCK_NAME, LOCK_TIMEOUT))
+    if not cursor.fetchone()[0]:
+        cursor.close()
+        raise RuntimeError("purge de rétention en cours, réessayer plus tard")
+    try:
+        for resolution, pas in RESOLUTIONS.items():
+            debut = depuis // pas * pas
+            cursor.execute(
+                f"DELETE FROM {TABLE} WHERE Resolution = %s "
+                "AND BucketStart >= FROM_UNIXTIME(%s)",
+                (resolution, debut),
+            )
+            cursor.execute(
+                f"""
+                INSERT INTO {TABLE}
+                    (Resolution, MyAssetType, MyAssetName, BucketStart,
+                     MinValue, MaxValue, SumValue, CountValue)
+                SELECT %s, MyAssetType, MyAssetName,
+                       FROM_UNIXTIME(UNIX_TIMESTAMP(MyAssetTimeStamp) DIV %s * %s) AS b,
+                       MIN(MyAssetValue), MAX(MyAssetValue),
+                       SUM(MyAssetValue), COUNT(*)
+                FROM MyAsset
+                WHERE MyAssetTimeStamp >= FROM_UNIXTIME(%s)
+                AND MyAssetUnit NOT IN ({exclues})
+                GROUP BY MyAssetType, MyAssetName, b
+                """,
+                (resolution, pas, pas, debut, *sorted(UNITES_EXCLUES)),
+            )
+            conn.commit()
+            print(f"✅ {resolution}: {cursor.rowcount} intervalles recalculés")
+    finally:
+        cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+        cursor.fetchall()
+        cursor.close()
+
+
+def main():
+    """Fonction principale"""
+    if len(sys.argv) < 2 or sys.argv[1] != "reconstruire":
+        print("Usage:")
+        print("  python rollups.py reconstruire [--jours N]")
+        return
+
+    jours = 30
+    if "--jours" in sys.argv:
+        jours = int(sys.argv[sys.argv.index("--jours") + 1])
+
+    try:
+        conn = db_pool.get_connection()
+    except mysql.connector.Error as e:
+        print(f"Erreur de connexion à la base de données: {e}")
+        sys.exit(1)
+
+    try:
+        depuis = datetime.fromtimestamp(time.time() - jours * 86400)
+        print(f"🔄 Reconstruction des agrégats depuis le {depuis:%Y-%m-%d}...")
+        reconstruire(conn, jours)
+    except mysql.connector.Error as e:
+        print(f"❌ Erreur MySQL: {e}")
+        sys.exit(1)
+    except RuntimeError as e:
+        print(f"❌ {e}")
+        sys.exit(1)
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
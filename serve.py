@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+Serveur de production multi-processus (gunicorn)
+
+L'application est importée une seule fois par le processus maître (preload),
+puis chaque worker est créé par fork. Le maître ferme ses connexions MariaDB
+avant chaque fork et chaque worker repart d'un pool vide : aucune connexion
+n'est partagée entre processus. Les tâches de fond (rétention, envoi
+Raspberry, flux SSE, tampon d'ingestion) démarrent d'elles-mêmes dans
+chaque worker.
+
+Usage :
+    python serve.py            # app.py (workers gthread)
+    python serve.py --asgi     # asgi_app.py (workers uvicorn)
+
+Rechargement sans coupure :
+    kill -HUP <pid maître>     # nouveaux workers, anciens terminés après leurs requêtes
+    kill -USR2 <pid maître>    # nouveau code : nouveau maître, puis kill -QUIT sur l'ancien
+Avec le preload, HUP ne recharge pas le code : utiliser USR2 après un déploiement.
+
+Flux SSE (/api/stream) : servi par app.py uniquement. En gthread, chaque
+client connecté immobilise un des WEB_THREADS threads du worker tant que
+son flux reste ouvert ; SSE_MAX_CLIENTS borne ces clients par worker
+(503 au-delà) pour que les autres requêtes gardent des threads. Prévoir
+WEB_THREADS nettement supérieur à SSE_MAX_CLIENTS.
+
+Disponibilité : GET /ready (200 si la base répond, 503 sinon).
+
+Configuration par variables d'environnement :
+    PORT                   port d'écoute (défaut 5000)
+    WEB_WORKERS            nombre de processus (défaut : nombre de cœurs)
+    WEB_THREADS            threads par processus gthread (défaut 8)
+    WEB_TIMEOUT            délai avant de tuer un worker bloqué en s (défaut 120)
+    WEB_GRACEFUL_TIMEOUT   délai d'arrêt propre en s (défaut 30)
+    WEB_MAX_REQUESTS       redémarrer un worker après N requêtes (défaut 0 = jamais)
+    SSE_MAX_CLIENTS        clients /api/stream par worker (défaut 4, 503 au-delà)
+"""
+
+import argparse
+import importlib
+import multiprocessing
+import os
+
+from dotenv import load_dotenv
+from gunicorn.app.base import BaseApplication
+
+import db_pool
+import live_stream
+
+# Charger les variables d'environnement
+load_dotenv()
+
+
+def pre_fork(server, worker):
+    # Ne laisser aucune connexion ouverte dont le worker hériterait
+    db_pool.get_pool().close_all()
+
+
+def post_fork(server, worker):
+    db_pool.reset_after_fork()
+    server.log.info(f"Worker {worker.pid} : pool MariaDB initialisé")
+
+
+class Serveur(BaseApplication):
+    """Application gunicorn configurée depuis ce fichier (sans gunicorn.conf.py)"""
+
+    def __init__(self, chemin_app, options):
+        self.chemin_app = chemin_app
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for cle, valeur in self.options.items():
+            self.cfg.set(cle, valeur)
+
+    def load(self):
+        module, nom = self.chemin_app.split(":")
+        return getattr(importlib.import_module(module), nom)
+
+
+def options_depuis_env(asgi=False):
+    threads = int(os.getenv("WEB_THREADS", 8))
+    options = {
+        "bind": f"0.0.0.0:{int(os.getenv('PORT', 5000))}",
+        "workers": int(os.getenv("WEB_WORKERS", multiprocessing.cpu_count())),
+        "preload_app": True,
+        # Long-poll /api/instructions et flux SSE : requêtes longues légitimes
+        "timeout": int(os.getenv("WEB_TIMEOUT", 120)),
+        "graceful_timeout": int(os.getenv("WEB_GRACEFUL_TIMEOUT", 30)),
+        "keepalive": 5,
+        "max_requests": int(os.getenv("WEB_MAX_REQUESTS", 0)),
+        "max_requests_jitter": int(os.getenv("WEB_MAX_REQUESTS", 0)) // 10,
+        "pre_fork": pre_fork,
+        "post_fork": post_fork,
+        "accesslog": "-",
+    }
+    if asgi:
+        options["worker_class"] = "uvicorn.workers.UvicornWorker"
+    else:
+        options["worker_class"] = "gthread"
+        options["threads"] = threads
+
+        pool = db_pool.get_pool()
+        if pool.size + pool.max_overflow < threads:
+            print(
+                f"⚠️  WEB_THREADS={threads} dépasse DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW "
+                f"({pool.size + pool.max_overflow}) : des requêtes attendront une connexion"
+            )
+        sse = live_stream.diffuseur.max_abonnes
+        if sse >= threads:
+            print(
+                f"⚠️  SSE_MAX_CLIENTS={sse} >= WEB_THREADS={threads} : "
+                "les flux SSE peuvent occuper tous les threads"
+            )
+    return options
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serveur de production")
+    parser.add_argument(
+        "--asgi",
+        action="store_true",
+        help="servir asgi_app.py (handlers asynchrones) au lieu de app.py",
+    )
+    args = parser.parse_args()
+
+    chemin_app = "asgi_app:application" if args.asgi else "app:app"
+    options = options_depuis_env(asgi=args.asgi)
+    print(
+        f"🔄 Démarrage de {chemin_app} : {options['workers']} workers "
+        f"{options['worker_class']} sur {options['bind']}"
+    )
+    Serveur(chemin_app, options).run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+
+import pytest
+
+# Modules à la racine du dépôt (pas de paquet)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def pytest_configure(config):
+    # Boîte d'envoi créée à l'import de app.py : jamais dans le dépôt
+    config.dossier_outbox = tempfile.mkdtemp(prefix="pytest-outbox-")
+    os.environ["RASPBERRY_OUTBOX_PATH"] = os.path.join(
+        config.dossier_outbox, "outbox.sqlite3"
+    )
+
+
+def pytest_unconfigure(config):
+    shutil.rmtree(config.dossier_outbox, ignore_errors=True)
+
+SCHEMA_MYASSET = """
+    CREATE TABLE MyAsset (
+        MyAssetNumber INTEGER PRIMARY KEY AUTOINCREMENT,
+        MyAssetType CHAR(12) NOT NULL,
+        MyAssetName CHAR(20) NOT NULL,
+        MyAssetValue FLOAT NOT NULL,
+        MyAssetUnit CHAR(12) NOT NULL,
+        MyAssetComment TEXT,
+        MyAssetTimeStamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+"""
+
+
+@pytest.fixture
+def base_sqlite():
+    """Base MyAsset en mémoire, substitut de MariaDB pour les requêtes portables"""
+    conn = sqlite3.connect(":memory:")
+    conn.execute(SCHEMA_MYASSET)
+    yield conn
+    conn.close()
+
+
+class CurseurSQLite:
+    """Curseur sqlite3 qui accepte les paramètres %s de mysql.connector"""
+
+    def __init__(self, curseur):
+        self._curseur = curseur
+
+    def execute(self, requete, params=()):
+        return self._curseur.execute(requete.replace("%s", "?"), tuple(params))
+
+    def __getattr__(self, nom):
+        return getattr(self._curseur, nom)
+
+
+class ConnexionSQLite:
+    def __init__(self, conn):
+        self._conn = conn
+
+    def cursor(self):
+        return CurseurSQLite(self._conn.cursor())
+
+    def __getattr__(self, nom):
+        return getattr(self._conn, nom)
+
+
+def inserer(conn, lignes):
+    """Insérer des (type, nom, valeur, unité, commentaire, horodatage)"""
+    conn.executemany(
+        "INSERT INTO MyAsset (MyAssetType, MyAssetName, MyAssetValue, MyAssetUnit, "
+        "MyAssetComment, MyAssetTimeStamp) VALUES (?, ?, ?, ?, ?, ?)",
+        lignes,
+    )
+    conn.commit()
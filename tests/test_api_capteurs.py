@@ -0,0 +1,92 @@
+import json
+
+import pytest
+
+import app as flask_app
+import ingestion_buffer
+
+
+@pytest.fixture
+def enregistrees(monkeypatch):
+    lots = []
+
+    def enregistrer(lignes):
+        lots.append(list(lignes))
+        return True
+
+    monkeypatch.setattr(flask_app, "enregistrer_lectures", enregistrer)
+    return lots
+
+
+@pytest.fixture
+def client():
+    return flask_app.app.test_client()
+
+
+def test_tableau_json_lecture_invalide_sans_rejeter_le_lot(client, enregistrees):
+    reponse = client.post(
+        "/api/capteurs",
+        json=[
+            {"type": "temperature", "valeur": 21.5},
+            {"type": "temperature"},
+            {"type": "humidity", "valeur": float("inf")},
+            {"type": "light", "valeur": "700"},
+        ],
+    )
+
+    assert reponse.status_code == 201
+    donnees = reponse.get_json()
+    assert (donnees["accepted"], donnees["rejected"]) == (2, 2)
+    assert [r.get("status", "rejected") for r in donnees["results"]] == [
+        "accepted",
+        "rejected",
+        "rejected",
+        "accepted",
+    ]
+    # Un seul enregistrement pour tout le lot
+    assert [[ligne[0] for ligne in lot] for lot in enregistrees] == [
+        ["temperature", "light"]
+    ]
+
+
+def test_ndjson_ligne_illisible(client, enregistrees):
+    corps = "\n".join(
+        [json.dumps({"type": "temperature", "valeur": 20}), "{pas du json", ""]
+    )
+    reponse = client.post(
+        "/api/capteurs", data=corps, content_type="application/x-ndjson"
+    )
+
+    assert reponse.status_code == 201
+    assert reponse.get_json()["results"] == [
+        {"index": 0, "status": "accepted"},
+        {"index": 1, "error": "JSON invalide"},
+    ]
+    assert len(enregistrees) == 1
+
+
+def test_lot_trop_grand_413(client, enregistrees, monkeypatch):
+    monkeypatch.setattr(flask_app, "BATCH_MAX_READINGS", 2)
+    lot = [{"type": "temperature", "valeur": i} for i in range(3)]
+
+    reponse = client.post("/api/capteurs", json=lot)
+
+    assert reponse.status_code == 413
+    assert enregistrees == []
+
+
+@pytest.mark.parametrize("corps", [{"type": "temperature", "valeur": 1}, []])
+def test_corps_invalide_ou_vide_400(client, enregistrees, corps):
+    assert client.post("/api/capteurs", json=corps).status_code == 400
+    assert enregistrees == []
+
+
+def test_file_pleine_503(client, monkeypatch):
+    def enregistrer(lignes):
+        raise ingestion_buffer.IngestionQueueFull("File d'ingestion pleine")
+
+    monkeypatch.setattr(flask_app, "enregistrer_lectures", enregistrer)
+    reponse = client.post("/api/capteurs", json=[{"type": "light", "valeur": 1}])
+
+    assert reponse.status_code == 503
+    assert reponse.headers["Retry-After"] == "1"
@@ -0,0 +1,150 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import app as flask_app
+import benchmark
+import db_pool
+import instructions
+import normalized_storage
+
+
+@pytest.fixture
+def client():
+    return flask_app.app.test_client()
+
+
+@pytest.mark.parametrize(
+    "requete",
+    [
+        "since=abc",
+        "since=1.5",
+        "since=-1",
+        "wait=bientot",
+        "wait=-2",
+        "wait=nan",
+        "since=10&wait=inf",
+        "device=arduino-1&since=x",
+    ],
+)
+def test_parametres_invalides_400(client, requete):
+    reponse = client.get(f"/api/instructions?{requete}")
+    assert reponse.status_code == 400
+    assert "error" in reponse.get_json()
+
+
+def test_parametres_valides():
+    since, attente = flask_app.parametres_instructions({"since": "42", "wait": "1e6"})
+    assert since == 42
+    assert attente == flask_app.INSTRUCTIONS_MAX_WAIT
+    assert flask_app.parametres_instructions({}) == (None, 0.0)
+
+
+@pytest.fixture
+def base(tmp_path, monkeypatch):
+    monkeypatch.setattr(normalized_storage, "actif", False)
+    chemin = str(tmp_path / "instructions.sqlite3")
+    benchmark.creer_base_sqlite(chemin)
+    monkeypatch.setattr(
+        db_pool, "get_connection", lambda: benchmark.ConnexionSQLite(chemin)
+    )
+    return chemin
+
+
+def inserer_instruction(numero, commande, age):
+    conn = db_pool.get_connection()
+    conn.cursor().execute(
+        "INSERT INTO MyAsset (MyAssetNumber, MyAssetType, MyAssetName, MyAssetValue, "
+        "MyAssetUnit, MyAssetComment, MyAssetTimeStamp) "
+        "VALUES (%s, 'instruction', 'API', 1.0, 'cmd', %s, %s)",
+        (numero, commande, datetime.now() - age),
+    )
+    conn.commit()
+    conn.close()
+
+
+def commandes(since):
+    conn = db_pool.get_connection()
+    lignes = instructions.charger_depuis(conn, since)
+    conn.close()
+    return [ligne["commande"] for ligne in lignes]
+
+
+def test_instruction_validee_hors_ordre_retenue(base):
+    inserer_instruction(10, "A", timedelta(minutes=1))
+    # 12 vient d'être validée, 11 (numéro attribué avant) pas encore
+    inserer_instruction(12, "C", timedelta(0))
+    assert commandes(0) == ["A"]
+
+    inserer_instruction(11, "B", timedelta(0))
+    conn = db_pool.get_connection()
+    # Fin de la retenue
+    conn.cursor().execute(
+        "UPDATE MyAsset SET MyAssetTimeStamp = %s WHERE MyAssetNumber > 10",
+        (datetime.now() - timedelta(seconds=instructions.RETENUE_SECONDES + 2),),
+    )
+    conn.commit()
+    conn.close()
+    assert commandes(10) == ["B", "C"]
+
+
+def test_delai_apres_reveil():
+    attente = instructions.delai_apres_reveil(True, 10.0)
+    assert attente == instructions.RETENUE_SECONDES + 1
+    assert instructions.delai_apres_reveil(False, 10.0) == 10.0
+
+
+def test_curseur_dispositif_enregistre_au_premier_appel(base):
+    inserer_instruction(5, "ANCIENNE", timedelta(hours=2))
+    inserer_instruction(6, "RECENTE", timedelta(minutes=5))
+
+    conn = db_pool.get_connection()
+    # Nouveau dispositif : instructions de la dernière heure non acquittées
+    assert instructions.curseur_dispositif(conn, "arduino-1") == 5
+    inserer_instruction(7, "SUIVANTE", timedelta(minutes=1))
+    assert instructions.curseur_dispositif(conn, "arduino-1") == 5
+    conn.close()
+
+    client = flask_app.app.test_client()
+    reponse = client.get("/api/instructions?device=arduino-1")
+    assert [i["commande"] for i in reponse.get_json()["instructions"]] == [
+        "RECENTE",
+        "SUIVANTE",
+    ]
+    assert reponse.get_json()["cursor"] == 7
+
+
+@pytest.mark.parametrize(
+    "corps",
+    [
+        None,
+        {"device": "arduino-1"},
+        {"id": 3},
+        {"device": "", "id": 3},
+        {"device": "x" * 65, "id": 3},
+        {"device": "arduino-1", "id": -1},
+        {"device": "arduino-1", "id": "3"},
+        {"device": "arduino-1", "id": True},
+    ],
+)
+def test_ack_invalide_400(client, corps):
+    reponse = client.post("/api/instructions/ack", json=corps)
+    assert reponse.status_code == 400
+    assert "error" in reponse.get_json()
+
+
+def test_ack_ne_recule_jamais(base, client):
+    inserer_instruction(8, "A", timedelta(minutes=5))
+    inserer_instruction(9, "B", timedelta(minutes=5))
+
+    reponse = client.post("/api/instructions/ack", json={"device": "d1", "id": 9})
+    assert reponse.status_code == 200
+    assert reponse.get_json() == {"success": True, "device": "d1", "cursor": 9}
+    # Acquittement en retard (requête rejouée) : le curseur reste à 9
+    reponse = client.post("/api/instructions/ack", json={"device": "d1", "id": 8})
+    assert reponse.get_json()["cursor"] == 9
+
+    conn = db_pool.get_connection()
+    assert instructions.curseur_dispositif(conn, "d1") == 9
+    conn.close()
+    assert client.get("/api/instructions?device=d1").get_json()["instructions"] == []
@@ -0,0 +1,117 @@
+import asyncio
+import json
+import threading
+
+import asgi_app
+import notifications
+
+
+def appeler(methode, chemin, corps=b"", headers=()):
+    """Requête HTTP adressée directement à l'application ASGI (sans lifespan)"""
+    scope = {
+        "type": "http",
+        "http_version": "1.1",
+        "method": methode,
+        "path": chemin,
+        "root_path": "",
+        "scheme": "http",
+        "query_string": b"",
+        "headers": [(n.encode(), v.encode()) for n, v in headers],
+        "client": ("127.0.0.1", 1234),
+        "server": ("test", 80),
+    }
+    messages = [{"type": "http.request", "body": corps, "more_body": False}]
+    envoyes = []
+
+    async def receive():
+        if messages:
+            return messages.pop(0)
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        envoyes.append(message)
+
+    asyncio.run(asgi_app.application(scope, receive, send))
+    debut = envoyes[0]
+    entetes = {n.decode(): v.decode() for n, v in debut["headers"]}
+    corps = b"".join(m.get("body", b"") for m in envoyes[1:])
+    return debut["status"], entetes, corps
+
+
+def test_environ_fusionne_les_entetes_repetes():
+    scope = {
+        "method": "POST",
+        "path": "/api/capteur",
+        "query_string": b"a=1",
+        "http_version": "1.1",
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", b"999"),
+            (b"accept-encoding", b"gzip"),
+            (b"accept-encoding", b"br"),
+        ],
+    }
+    environ = asgi_app.environ_depuis_scope(scope, b"{}")
+    assert environ["CONTENT_TYPE"] == "application/json"
+    # Longueur du corps réellement lu, pas celle annoncée
+    assert environ["CONTENT_LENGTH"] == "2"
+    assert environ["HTTP_ACCEPT_ENCODING"] == "gzip,br"
+    assert environ["QUERY_STRING"] == "a=1"
+
+
+def test_api_capteur_asynchrone(monkeypatch):
+    recues = []
+
+    async def enregistrer(lignes):
+        recues.extend(lignes)
+        return True
+
+    monkeypatch.setattr(asgi_app, "enregistrer_lectures", enregistrer)
+    entetes = [("Content-Type", "application/json")]
+
+    statut, _, corps = appeler(
+        "POST", "/api/capteur", json.dumps({"type": "temperature"}).encode(), entetes
+    )
+    assert statut == 400
+    assert json.loads(corps) == {"error": "type et valeur requis"}
+    assert recues == []
+
+    donnees = {"type": "temperature", "valeur": 21.5}
+    statut, _, corps = appeler(
+        "POST", "/api/capteur", json.dumps(donnees).encode(), entetes
+    )
+    assert statut == 201
+    assert json.loads(corps)["database_saved"] is True
+    assert [ligne[0] for ligne in recues] == ["temperature"]
+
+
+def test_json_invalide_meme_reponse_que_flask():
+    statut, _, _ = appeler(
+        "POST", "/api/capteur", b"{", [("Content-Type", "application/json")]
+    )
+    assert statut == 400
+
+
+def test_autres_routes_deleguees_a_flask():
+    statut, entetes, corps = appeler("GET", "/metrics")
+    assert statut == 200
+    assert entetes["content-type"].startswith("text/plain")
+    assert corps
+
+
+def test_reveil_async_depuis_un_thread():
+    notificateur = notifications.Notificateur()
+
+    async def scenario():
+        reveil = asgi_app.ReveilAsync(notificateur, asyncio.get_running_loop())
+        try:
+            vue = reveil.sequence
+            # Pas de notification : délai écoulé, même séquence
+            assert await reveil.attendre(vue, 0.01) == vue
+            threading.Timer(0.05, notificateur.notifier).start()
+            return vue, await reveil.attendre(vue, 5.0)
+        finally:
+            reveil.fermer()
+
+    vue, nouvelle = asyncio.run(scenario())
+    assert nouvelle != vue
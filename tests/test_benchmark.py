@@ -0,0 +1,94 @@
+import argparse
+from types import SimpleNamespace
+
+import benchmark
+import db_pool
+import rollups
+
+
+def test_traductions_sqlite():
+    assert benchmark.traduire(
+        "INSERT IGNORE INTO t (a) VALUES (%s) ON DUPLICATE KEY UPDATE a = VALUES(a)"
+    ) == (
+        "INSERT OR IGNORE INTO t (a) VALUES (?) "
+        "ON CONFLICT DO UPDATE SET a = excluded.a"
+    )
+    assert benchmark.traduire(
+        "SELECT 1 WHERE d > DATE_SUB(NOW(), INTERVAL 1 HOUR) LOCK IN SHARE MODE"
+    ) == "SELECT 1 WHERE d > datetime('now', 'localtime', '-1 HOURS')"
+
+
+def test_percentile():
+    latences = [i / 100 for i in range(100)]
+    assert benchmark.percentile([], 0.5) == 0.0
+    assert benchmark.percentile(latences, 0.5) == 0.5
+    assert benchmark.percentile(latences, 0.99) == 0.99
+    assert benchmark.percentile(latences, 1.0) == 0.99
+
+
+def test_requetes_sql_comptees(tmp_path):
+    chemin = str(tmp_path / "bench.sqlite3")
+    benchmark.creer_base_sqlite(chemin)
+    compteur = benchmark.CompteurRequetes()
+    conn = benchmark.ConnexionComptee(benchmark.ConnexionSQLite(chemin), compteur)
+    cursor = conn.cursor()
+    cursor.execute("SELECT COUNT(*) FROM MyAsset")
+    cursor.executemany(
+        "INSERT INTO MyAsset (MyAssetType, MyAssetName, MyAssetValue, MyAssetUnit) "
+        "VALUES (%s, %s, %s, %s)",
+        [("light", "API light", 700.0, "lux")] * 3,
+    )
+    # Un executemany compte pour un seul aller-retour
+    assert compteur.valeur == 2
+
+
+def test_scenario_erreurs_et_latences(monkeypatch):
+    appels = []
+
+    def requete(client, i):
+        appels.append(i)
+        return SimpleNamespace(status_code=500 if i % 4 == 0 else 200)
+
+    monkeypatch.setitem(benchmark.SCENARIOS, "test", requete)
+    resultat = benchmark.executer_scenario(
+        "test", object, requetes=40, concurrence=4, echauffement=3
+    )
+
+    # Échauffement hors mesure, puis chaque indice envoyé une seule fois
+    assert sorted(appels[3:]) == list(range(40))
+    assert resultat["requests"] == 40
+    assert resultat["errors"] == 10
+    assert resultat["db_queries_per_request"] is None
+    latences = resultat["latency_ms"]
+    assert latences["p50"] <= latences["p95"] <= latences["p99"] <= latences["max"]
+
+
+def test_execution_sqlite_en_processus(monkeypatch, tmp_path):
+    monkeypatch.setattr(db_pool, "_pool", db_pool._pool)
+    monkeypatch.setattr(rollups, "actif", rollups.actif)
+    args = argparse.Namespace(
+        url=None,
+        sqlite=True,
+        sqlite_path=str(tmp_path / "bench.sqlite3"),
+        sans_cache=False,
+        lignes="200",
+        jours=1,
+        graine=1,
+        scenarios="ingestion,dashboard",
+        requetes=20,
+        concurrence=2,
+        echauffement=2,
+    )
+
+    resultat = benchmark.executer(args)
+
+    assert resultat["backend"] == "sqlite"
+    (execution,) = resultat["runs"]
+    assert execution["rows"] >= 200
+    scenarios = execution["scenarios"]
+    for scenario in scenarios.values():
+        assert scenario["requests"] == 20
+        assert scenario["errors"] == 0
+    assert scenarios["ingestion"]["db_queries_per_request"] > 0
+    # Tableau de bord servi depuis le cache après l'échauffement
+    assert scenarios["dashboard"]["db_queries_per_request"] < 1
@@ -0,0 +1,69 @@
+import math
+import time
+
+import pytest
+
+import binary_ingest
+
+
+@pytest.fixture
+def decodeur():
+    return binary_ingest.Decodeur()
+
+
+def test_trame_valide(decodeur):
+    trame = binary_ingest.encoder([("temperature", 23.5), ("bouton_poussoir", 1.0)])
+
+    lignes, erreurs = decodeur.decoder(trame, nombre_max=10)
+
+    assert erreurs == []
+    assert lignes == [
+        ("temperature", "API temperature", 23.5, "°C", binary_ingest.COMMENTAIRE),
+        ("button", "API bouton_poussoir", 1.0, "bool", binary_ingest.COMMENTAIRE),
+    ]
+
+
+def test_trame_horodatee(decodeur):
+    epoch = int(time.time()) - 60
+    trame = binary_ingest.encoder([("humidity", 40.0, epoch)], horodatage=True)
+
+    lignes, erreurs = decodeur.decoder(trame, nombre_max=10)
+
+    assert erreurs == []
+    assert lignes[0][5].timestamp() == epoch
+
+
+@pytest.mark.parametrize("coupure", [2, 6, -1])
+def test_trame_tronquee(decodeur, coupure):
+    trame = binary_ingest.encoder([("temperature", 23.5), ("light", 700.0)])
+
+    with pytest.raises(binary_ingest.TrameInvalide):
+        decodeur.decoder(trame[:coupure], nombre_max=10)
+
+
+def test_trame_trop_grande(decodeur):
+    trame = binary_ingest.encoder([("temperature", 1.0)] * 3)
+
+    with pytest.raises(binary_ingest.TrameTropGrande):
+        decodeur.decoder(trame, nombre_max=2)
+
+
+def test_valeur_nan_rejetee_sans_rejeter_la_trame(decodeur):
+    trame = binary_ingest.encoder(
+        [("temperature", 20.0), ("temperature", math.nan), ("light", math.inf)]
+    )
+
+    lignes, erreurs = decodeur.decoder(trame, nombre_max=10)
+
+    assert [ligne[2] for ligne in lignes] == [20.0]
+    assert [erreur["index"] for erreur in erreurs] == [1, 2]
+
+
+def test_horodatage_futur_rejete(decodeur):
+    futur = int(time.time()) + binary_ingest.AVANCE_MAX + 3600
+    trame = binary_ingest.encoder([("light", 1.0, futur)], horodatage=True)
+
+    lignes, erreurs = decodeur.decoder(trame, nombre_max=10)
+
+    assert lignes == []
+    assert erreurs[0]["index"] == 0
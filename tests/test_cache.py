@@ -0,0 +1,79 @@
+import time
+
+import pytest
+
+import cache
+
+
+def nouveau_cache(ttl=None, max_entries=256):
+    return cache.Cache(cache.MemoryLRUCache(max_entries), ttl=ttl)
+
+
+def test_get_or_load_puis_invalidation():
+    c = nouveau_cache()
+    chargements = []
+
+    def charger():
+        chargements.append(1)
+        return len(chargements)
+
+    assert c.get_or_load("k", charger) == 1
+    assert c.get_or_load("k", charger) == 1
+    c.invalider("k")
+    assert c.get_or_load("k", charger) == 2
+    assert c.stats()["hits"] == 1
+
+
+def test_expiration_ttl():
+    c = nouveau_cache(ttl=0.05)
+    c.set("k", "v")
+    assert c.get("k") == "v"
+    time.sleep(0.06)
+    assert c.get("k") is None
+
+
+def test_chargement_concurrent_a_une_ecriture_non_mis_en_cache():
+    c = nouveau_cache()
+
+    def charger():
+        # Écriture pendant le chargement : la valeur lue est déjà périmée
+        c.invalider("k")
+        return "perimee"
+
+    assert c.get_or_load("k", charger) == "perimee"
+    assert c.get("k") is None
+
+
+def test_mettre_a_jour_seulement_si_present():
+    c = nouveau_cache()
+    c.mettre_a_jour("k", lambda v: v + 1)
+    assert c.get("k") is None
+    c.set("k", 1)
+    c.mettre_a_jour("k", lambda v: v + 1)
+    assert c.get("k") == 2
+
+
+def test_lru_borne():
+    backend = cache.MemoryLRUCache(max_entries=2)
+    backend.set("a", 1)
+    backend.set("b", 2)
+    backend.get("a")
+    backend.set("c", 3)
+    assert backend.get("b") is None
+    assert backend.get("a") == 1
+    assert backend.evictions == 1
+
+
+def test_backend_incomplet_refuse():
+    class SansClear(cache.CacheBackend):
+        def get(self, key):
+            return None
+
+        def set(self, key, value, ttl=None):
+            pass
+
+        def delete(self, key):
+            pass
+
+    with pytest.raises(TypeError):
+        SansClear()
@@ -0,0 +1,65 @@
+import gzip
+import json
+
+from flask import Response
+
+import compression
+from app import app, reponse_instructions
+
+INSTRUCTIONS = [{"id": 7, "type": "color", "valeur": "SET_COLOR:255,0,0"}]
+
+
+def reponse_json(taille):
+    return Response(json.dumps({"x": "a" * taille}), mimetype="application/json")
+
+
+def test_gzip_si_accepte_et_assez_gros(monkeypatch):
+    monkeypatch.setattr(compression, "brotli", None)
+    with app.test_request_context(headers={"Accept-Encoding": "gzip"}) as ctx:
+        response = compression.compresser_reponse(
+            ctx.request, reponse_json(compression.TAILLE_MIN)
+        )
+    assert response.headers["Content-Encoding"] == "gzip"
+    assert "Accept-Encoding" in response.vary
+    corps = json.loads(gzip.decompress(response.get_data()))
+    assert corps["x"] == "a" * compression.TAILLE_MIN
+
+
+def test_pas_de_compression_petit_corps_ou_non_accepte():
+    with app.test_request_context(headers={"Accept-Encoding": "gzip"}) as ctx:
+        petite = compression.compresser_reponse(ctx.request, reponse_json(10))
+    with app.test_request_context() as ctx:
+        refusee = compression.compresser_reponse(ctx.request, reponse_json(2000))
+    assert "Content-Encoding" not in petite.headers
+    assert "Content-Encoding" not in refusee.headers
+    # Le cache intermédiaire doit tout de même distinguer les encodages
+    assert "Accept-Encoding" in refusee.vary
+
+
+def test_flux_jamais_compresse():
+    with app.test_request_context(headers={"Accept-Encoding": "gzip"}) as ctx:
+        flux = Response(iter(["data: x\n\n"] * 1000), mimetype="text/plain")
+        response = compression.compresser_reponse(ctx.request, flux)
+    assert "Content-Encoding" not in response.headers
+
+
+def test_instructions_304_si_etag_identique():
+    with app.test_request_context("/api/instructions?since=3") as ctx:
+        premiere = reponse_instructions(INSTRUCTIONS, 3, ctx.request)
+    assert premiere.status_code == 200
+    assert premiere.get_json()["cursor"] == 7
+    etag, faible = premiere.get_etag()
+    assert faible
+
+    entetes = {"If-None-Match": premiere.headers["ETag"]}
+    with app.test_request_context("/api/instructions?since=3", headers=entetes) as ctx:
+        seconde = reponse_instructions(INSTRUCTIONS, 3, ctx.request)
+        nouvelle = reponse_instructions(
+            INSTRUCTIONS + [dict(INSTRUCTIONS[0], id=8)], 3, ctx.request
+        )
+    assert seconde.status_code == 304
+    assert seconde.get_data() == b""
+    assert seconde.get_etag() == (etag, True)
+    # Une nouvelle instruction change l'ETag : réponse complète
+    assert nouvelle.status_code == 200
+    assert nouvelle.get_etag()[0] != etag
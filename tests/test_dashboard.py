@@ -0,0 +1,73 @@
+from datetime import datetime, timedelta
+
+import dashboard
+from conftest import inserer
+
+DEBUT = datetime(2026, 1, 1, 12, 0, 0)
+
+
+def horodatage(minutes):
+    return (DEBUT + timedelta(minutes=minutes)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+def test_un_type_bavard_n_affame_pas_les_autres(base_sqlite):
+    inserer(
+        base_sqlite,
+        [
+            ("humidity", "API humidity", 40.0 + i, "%", None, horodatage(i))
+            for i in range(2)
+        ],
+    )
+    inserer(
+        base_sqlite,
+        [
+            ("temperature", "API temperature", 20.0, "°C", None, horodatage(10 + i))
+            for i in range(100)
+        ],
+    )
+
+    capteurs, _ = dashboard.charger_dashboard(base_sqlite)
+
+    par_type = {}
+    for capteur in capteurs:
+        par_type[capteur["type"]] = par_type.get(capteur["type"], 0) + 1
+    assert par_type == {"temperature": dashboard.LIMITE_PAR_TYPE, "humidity": 2}
+
+
+def test_alias_bouton_limite_apres_fusion(base_sqlite):
+    inserer(
+        base_sqlite,
+        [("button", "API button", 1.0, "bool", None, horodatage(i)) for i in range(4)]
+        + [
+            ("bouton_poussoir", "Bouton", 0.0, "bool", None, horodatage(10 + i))
+            for i in range(4)
+        ],
+    )
+
+    capteurs, _ = dashboard.charger_dashboard(base_sqlite)
+
+    assert [c["type"] for c in capteurs] == ["bouton_poussoir"] * 5
+    # Les plus récents d'abord, tous types stockés confondus
+    assert [c["valeur_affichee"] for c in capteurs] == ["Relâché"] * 4 + ["Appuyé"]
+    dates = [c["date"] for c in capteurs]
+    assert dates == sorted(dates, reverse=True)
+
+
+def test_derniere_couleur(base_sqlite):
+    inserer(
+        base_sqlite,
+        [
+            ("color", "LED Color", 1.0, "rgb", "SET_COLOR:255,0,0", horodatage(0)),
+            ("color", "LED Color", 1.0, "rgb", "SET_COLOR:0,255,16", horodatage(1)),
+        ],
+    )
+
+    capteurs, couleur = dashboard.charger_dashboard(base_sqlite)
+
+    assert capteurs == []
+    assert couleur == "#00ff10"
+
+
+def test_couleur_par_defaut_sans_commande(base_sqlite):
+    _, couleur = dashboard.charger_dashboard(base_sqlite)
+    assert couleur == dashboard.COULEUR_DEFAUT
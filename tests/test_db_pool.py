@@ -0,0 +1,78 @@
+import pytest
+
+import db_pool
+
+
+class ConnexionFactice:
+    in_transaction = False
+
+    def __init__(self):
+        self.fermee = False
+
+    def is_connected(self):
+        return not self.fermee
+
+    def close(self):
+        self.fermee = True
+
+
+def nouveau_pool(**options):
+    ouvertes = []
+
+    def factory():
+        ouvertes.append(ConnexionFactice())
+        return ouvertes[-1]
+
+    return db_pool.ConnectionPool(factory=factory, **options), ouvertes
+
+
+def test_debordement_ferme_au_retour():
+    pool, ouvertes = nouveau_pool(size=1, max_overflow=1, timeout=0.05)
+
+    premiere = pool.get_connection()
+    seconde = pool.get_connection()
+    assert pool.stats()["in_use"] == 2
+
+    premiere.close()
+    seconde.close()
+
+    # Une seule connexion gardée (size=1), celle de débordement est fermée
+    assert pool.stats()["idle"] == 1
+    assert [c.fermee for c in ouvertes] == [False, True]
+
+
+def test_delai_depasse_quand_le_pool_est_epuise():
+    pool, _ = nouveau_pool(size=1, max_overflow=1, timeout=0.05)
+    pool.get_connection()
+    pool.get_connection()
+
+    with pytest.raises(db_pool.PoolTimeout):
+        pool.get_connection()
+    assert pool.stats()["timeouts"] == 1
+
+
+def test_connexion_reutilisee():
+    pool, ouvertes = nouveau_pool(size=2, max_overflow=0)
+
+    pool.get_connection().close()
+    pool.get_connection().close()
+
+    assert len(ouvertes) == 1
+
+
+def test_connexion_rendue_inutilisable():
+    pool, _ = nouveau_pool(size=1, max_overflow=0)
+    conn = pool.get_connection()
+    conn.close()
+
+    with pytest.raises(db_pool.mysql.connector.InterfaceError):
+        conn.cursor()
+
+
+def test_discard_libere_la_place():
+    pool, ouvertes = nouveau_pool(size=1, max_overflow=0, timeout=0.05)
+    pool.get_connection().discard()
+
+    pool.get_connection()
+    assert ouvertes[0].fermee
+    assert len(ouvertes) == 2
@@ -0,0 +1,137 @@
+import gzip
+import json
+from datetime import datetime
+
+import pytest
+
+import app as flask_app
+import db_pool
+import export
+
+LIGNES = [
+    (i, "temperature", "API temperature", 20.0 + i, "°C", None, datetime(2026, 1, 1))
+    for i in range(1, 6)
+]
+
+
+class Curseur:
+    def __init__(self, conn):
+        self.conn = conn
+        self._restantes = list(LIGNES)
+
+    def execute(self, requete, params=None):
+        if self.conn.erreur and "SELECT" in requete:
+            raise RuntimeError("table absente")
+        self.conn.requetes.append((" ".join(requete.split()), params))
+
+    def fetchmany(self, taille):
+        paquet, self._restantes = self._restantes[:taille], self._restantes[taille:]
+        return paquet
+
+    def close(self):
+        pass
+
+
+class Connexion:
+    """Connexion du pool : close() la rend, discard() la ferme"""
+
+    def __init__(self, erreur=False):
+        self.erreur = erreur
+        self.requetes = []
+        self.etat = "empruntée"
+
+    def cursor(self, buffered=True):
+        assert not buffered
+        return Curseur(self)
+
+    def close(self):
+        self.etat = "rendue"
+
+    def discard(self):
+        self.etat = "fermée"
+
+
+def test_csv_par_paquets_et_connexion_rendue():
+    conn = Connexion()
+    flux = export.Export(conn, 0, 100, type_capteur="temperature", taille=2)
+
+    morceaux = list(flux)
+    flux.close()
+
+    # En-tête avec le premier paquet, puis un morceau par paquet
+    assert len(morceaux) == 3
+    lignes = b"".join(morceaux).decode("utf-8").splitlines()
+    assert lignes[0] == ",".join(export.COLONNES)
+    assert lignes[1].startswith("1,temperature,API temperature,21.0,°C,,2026-01-01")
+    assert flux.lignes == 5
+    assert conn.etat == "rendue"
+    requete, params = conn.requetes[1]
+    assert params == [0, 100, "temperature"]
+    assert "ORDER BY MyAssetTimeStamp, MyAssetNumber" in requete
+    assert conn.requetes[-1][0] == "SET SESSION net_write_timeout = DEFAULT"
+
+
+def test_ndjson_gzip():
+    flux = export.Export(Connexion(), 0, 100, format_export="ndjson", compresse=True)
+
+    donnees = b"".join(flux)
+    flux.close()
+
+    lignes = gzip.decompress(donnees).decode("utf-8").splitlines()
+    assert [json.loads(ligne)["id"] for ligne in lignes] == [1, 2, 3, 4, 5]
+    assert flux.nom_fichier.endswith(".ndjson.gz")
+
+
+def test_client_deconnecte_connexion_fermee():
+    conn = Connexion()
+    flux = export.Export(conn, 0, 100, taille=2)
+
+    next(iter(flux))
+    flux.close()
+    flux.close()
+
+    # Résultat non lu en entier : la connexion ne retourne pas au pool
+    assert conn.etat == "fermée"
+
+
+def test_erreur_sql_avant_le_flux():
+    conn = Connexion(erreur=True)
+    with pytest.raises(RuntimeError):
+        export.Export(conn, 0, 100)
+    assert conn.etat == "fermée"
+
+
+def test_lire_epoch():
+    assert export.lire_epoch(None, 7) == 7
+    assert export.lire_epoch("", 7) == 7
+    assert export.lire_epoch("1700000000", 0) == 1700000000.0
+    debut_annee = datetime(2026, 1, 1).timestamp()
+    assert export.lire_epoch("2026-01-01T00:00:00", 0) == debut_annee
+    with pytest.raises(ValueError):
+        export.lire_epoch("hier", 0)
+
+
+@pytest.mark.parametrize(
+    "parametres", ["format=xml", "start=hier", "start=200&end=100"]
+)
+def test_route_parametres_invalides(parametres):
+    response = flask_app.app.test_client().get(f"/api/export?{parametres}")
+    assert response.status_code == 400
+
+
+def test_route_en_flux(monkeypatch):
+    conn = Connexion()
+    monkeypatch.setattr(db_pool, "get_connection", lambda: conn)
+
+    response = flask_app.app.test_client().get(
+        "/api/export?format=csv&start=0&end=100", headers={"Accept-Encoding": "gzip"}
+    )
+
+    assert response.is_streamed
+    assert response.mimetype == "text/csv"
+    # Jamais recompressé par le hook after_request
+    assert "Content-Encoding" not in response.headers
+    assert response.headers["Content-Disposition"].endswith('.csv"')
+    assert len(response.get_data(as_text=True).splitlines()) == 6
+    response.close()
+    assert conn.etat == "rendue"
@@ -0,0 +1,51 @@
+import pytest
+
+import dashboard
+from conftest import ConnexionSQLite, inserer
+
+
+@pytest.fixture
+def conn(base_sqlite):
+    # Beaucoup d'horodatages identiques : le numéro départage
+    inserer(
+        base_sqlite,
+        [
+            ("temperature", "T", float(i), "°C", None, f"2026-01-01 12:00:0{i % 3}")
+            for i in range(23)
+        ]
+        + [("button", "API button", 1.0, "bool", None, "2026-01-01 12:00:00")],
+    )
+    return ConnexionSQLite(base_sqlite)
+
+
+def test_pages_successives_sans_trou_ni_doublon(conn, base_sqlite):
+    attendu = [
+        ligne[0]
+        for ligne in base_sqlite.execute(
+            "SELECT MyAssetNumber FROM MyAsset WHERE MyAssetType = 'temperature' "
+            "ORDER BY MyAssetTimeStamp DESC, MyAssetNumber DESC"
+        )
+    ]
+    vus = []
+    avant = None
+    while True:
+        capteurs, avant = dashboard.charger_historique(
+            conn, "temperature", avant=avant, limite=5
+        )
+        vus += [c["id"] for c in capteurs]
+        if avant is None:
+            break
+    assert vus == attendu
+
+
+def test_type_affiche_bouton_poussoir(conn):
+    capteurs, suivante = dashboard.charger_historique(conn, "bouton_poussoir")
+
+    assert [c["type"] for c in capteurs] == ["bouton_poussoir"]
+    assert capteurs[0]["valeur_affichee"] == "Appuyé"
+    assert suivante is None
+
+
+def test_curseur_introuvable(conn):
+    with pytest.raises(LookupError):
+        dashboard.charger_historique(conn, "temperature", avant=9999)
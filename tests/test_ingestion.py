@@ -0,0 +1,44 @@
+import ingestion
+
+
+def test_coerce_many_conversions():
+    lignes, erreurs = ingestion.coerce_many(
+        [
+            ("temperature", 21.5),
+            ("humidity", " 40 "),
+            ("bouton_poussoir", "true"),
+            ("joystick", "UP"),
+        ]
+    )
+
+    assert erreurs == []
+    assert lignes == [
+        ("temperature", "API temperature", 21.5, "°C", "Ajouté via API"),
+        ("humidity", "API humidity", 40.0, "%", "Ajouté via API"),
+        ("button", "API bouton_poussoir", 1, "bool", "Ajouté via API"),
+        ("joystick", "API joystick", 0.0, "text", "UP"),
+    ]
+
+
+def test_coerce_many_erreurs_par_index():
+    lignes, erreurs = ingestion.coerce_many(
+        [
+            ("temperature", 20),
+            (None, 1),
+            ("un_type_bien_trop_long", 1),
+            ("temperature", float("nan")),
+            ("bouton_poussoir", "peut-etre"),
+            ("light", "700"),
+        ]
+    )
+
+    assert [index for index, _ in erreurs] == [1, 2, 3, 4]
+    assert [ligne[0] for ligne in lignes] == ["temperature", "light"]
+
+
+def test_coerce_many_nom_tronque_et_source():
+    lignes, _ = ingestion.coerce_many([("pressure", 1013)], source="formulaire")
+    nom = lignes[0][1]
+    assert nom == "Capteur pressure"
+    assert len(nom) <= ingestion.NOM_MAX
+    assert lignes[0][4] == "Ajouté via formulaire"
@@ -0,0 +1,59 @@
+import logging
+
+import ingestion_buffer
+
+
+class Connexion:
+    def cursor(self):
+        return self
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def tampon_en_echec(echecs, **options):
+    """Tampon dont les `echecs` premières écritures lèvent une erreur"""
+    lots = []
+    essais = []
+
+    def ecrire_lot(cursor, lignes):
+        essais.append(len(lignes))
+        if len(essais) <= echecs:
+            raise RuntimeError("base indisponible")
+        lots.append(list(lignes))
+
+    tampon = ingestion_buffer.IngestionBuffer(
+        ecrire_lot,
+        connection_factory=Connexion,
+        flush_interval=0.01,
+        retry_max_delay=0.01,
+        **options,
+    )
+    return tampon, lots, essais
+
+
+def test_lot_abandonne_journalise_en_erreur(caplog):
+    tampon, lots, essais = tampon_en_echec(10, max_retries=3)
+    tampon.submit([(1,), (2,)])
+    with caplog.at_level(logging.WARNING, logger="ingestion_buffer"):
+        tampon.flush(timeout=2.0)
+        tampon.stop()
+    assert lots == []
+    assert len(essais) == 3
+    assert tampon.stats()["dropped"] == 2
+    erreurs = [r for r in caplog.records if r.levelno == logging.ERROR]
+    assert len(erreurs) == 1
+    assert "2 lignes" in erreurs[0].getMessage()
+
+
+def test_sans_limite_d_essais_rien_n_est_perdu():
+    tampon, lots, essais = tampon_en_echec(15, max_retries=None)
+    tampon.submit([(1,), (2,)])
+    assert tampon.flush(timeout=5.0)
+    tampon.stop()
+    assert lots == [[(1,), (2,)]]
+    assert len(essais) == 16
+    assert tampon.stats()["dropped"] == 0
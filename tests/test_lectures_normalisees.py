@@ -0,0 +1,151 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+import benchmark
+import dashboard
+import instructions
+import migrate_database
+import normalized_storage
+
+MAINTENANT = datetime.now().replace(microsecond=0)
+
+# (type, nom, valeur, unité, commentaire, minutes avant maintenant)
+LECTURES = (
+    [("temperature", "API temp", 20.0 + i, "°C", None, 200 - i) for i in range(8)]
+    + [("temperature", "Capteur temp", 30.0, "°C", None, 150 - i) for i in range(3)]
+    + [("humidity", "API humidity", 40.0, "%", None, 100)]
+    + [("joystick", "API joystick", 0.0, "text", "up", 95)]
+    + [("button", "API button", 1.0, "bool", None, 90 - i) for i in range(3)]
+    + [("bouton_poussoir", "Bouton", 0.0, "bool", None, 80 - i) for i in range(3)]
+    + [("color", "LED Color", 1.0, "rgb", "SET_COLOR:255,0,0", 70)]
+    + [("color", "LED API", 1.0, "rgb", "SET_COLOR:0,255,16", 30)]
+    + [("instruction", "Commande", 1.0, "cmd", "LED_ON", 120)]
+    + [("instruction", "Commande", 1.0, "cmd", f"CMD_{i}", 20 - i) for i in range(4)]
+    # Insérée après coup avec un horodatage plus ancien
+    + [("temperature", "API temp", 99.0, "°C", None, 500)]
+)
+
+
+def peupler(conn):
+    cursor = conn.cursor()
+    for type_capteur, nom, valeur, unite, commentaire, minutes in LECTURES:
+        ligne = (type_capteur, nom, valeur, unite, commentaire)
+        horodatage = MAINTENANT - timedelta(minutes=minutes)
+        if not normalized_storage.actif:
+            cursor.execute(
+                "INSERT INTO MyAsset (MyAssetType, MyAssetName, MyAssetValue, "
+                "MyAssetUnit, MyAssetComment, MyAssetTimeStamp) "
+                "VALUES (%s, %s, %s, %s, %s, %s)",
+                ligne + (horodatage,),
+            )
+            continue
+        cle = normalized_storage.cle_capteur(ligne)
+        cursor.execute(normalized_storage.INSERT_CAPTEUR_SQL, cle)
+        cursor.execute(normalized_storage.SELECT_CAPTEUR_SQL, cle)
+        id_capteur = cursor.fetchone()[0]
+        texte = normalized_storage.texte_lecture(ligne, cle)
+        cursor.execute(
+            normalized_storage.INSERT_LECTURE_HORODATEE_SQL,
+            (id_capteur, valeur, texte, horodatage),
+        )
+    conn.commit()
+    cursor.close()
+
+
+@pytest.fixture
+def bases(tmp_path, monkeypatch):
+    """Même jeu de lectures en stockage MyAsset et en stockage normalisé"""
+    connexions = {}
+    for mode in (False, True):
+        monkeypatch.setattr(normalized_storage, "actif", mode)
+        chemin = str(tmp_path / f"normalise-{mode}.sqlite3")
+        benchmark.creer_base_sqlite(chemin)
+        connexions[mode] = benchmark.ConnexionSQLite(chemin)
+        peupler(connexions[mode])
+    yield connexions
+    for conn in connexions.values():
+        conn.close()
+
+
+def comparer(bases, monkeypatch, lire):
+    resultats = {}
+    for mode, conn in bases.items():
+        monkeypatch.setattr(normalized_storage, "actif", mode)
+        resultats[mode] = lire(conn)
+    assert resultats[True] == resultats[False]
+    return resultats[True]
+
+
+def test_dashboard_identique(bases, monkeypatch):
+    capteurs, couleur = comparer(bases, monkeypatch, dashboard.charger_dashboard)
+    assert couleur == "#00ff10"
+    assert [c["valeur"] for c in capteurs if c["type"] == "temperature"] == [
+        30.0,
+        30.0,
+        30.0,
+        27.0,
+        26.0,
+    ]
+
+
+def test_historique_pagine_identique(bases, monkeypatch):
+    def toutes_les_pages(conn):
+        pages = []
+        avant = None
+        while True:
+            capteurs, avant = dashboard.charger_historique(
+                conn, "temperature", avant=avant, limite=4
+            )
+            pages.append([c["id"] for c in capteurs])
+            if avant is None:
+                return pages
+
+    pages = comparer(bases, monkeypatch, toutes_les_pages)
+    assert [len(page) for page in pages] == [4, 4, 4]
+
+
+def test_instructions_identiques(bases, monkeypatch):
+    heure = comparer(bases, monkeypatch, instructions.charger_derniere_heure)
+    assert [i["commande"] for i in heure] == ["SET_COLOR:0,255,16"] + [
+        f"CMD_{i}" for i in range(4)
+    ]
+
+    depuis = comparer(
+        bases, monkeypatch, lambda conn: instructions.charger_depuis(conn, 0, 3)
+    )
+    assert [i["commande"] for i in depuis] == [
+        "SET_COLOR:255,0,0",
+        "SET_COLOR:0,255,16",
+        "LED_ON",
+    ]
+
+    curseur = comparer(
+        bases,
+        monkeypatch,
+        lambda conn: instructions.curseur_dispositif(conn, "arduino-1"),
+    )
+    # Un nouveau dispositif reçoit la dernière heure : couleur de -70 min exclue
+    assert curseur == depuis[2]["id"]
+
+
+def test_sans_capteur_du_type(bases, monkeypatch):
+    assert comparer(
+        bases,
+        monkeypatch,
+        lambda conn: dashboard.charger_historique(conn, "pressure"),
+    ) == ([], None)
+
+
+def test_requetes_critiques_normalisees_executables(bases, monkeypatch):
+    monkeypatch.setattr(normalized_storage, "actif", True)
+    conn = bases[True]
+    requetes = migrate_database.requetes_critiques(conn)
+
+    assert set(requetes) == set(migrate_database.REQUETES_CRITIQUES)
+    cursor = conn.cursor()
+    for requete, params in requetes.values():
+        assert "MyAssetReading WHERE SensorId = " in requete
+        cursor.execute(requete, params)
+        assert cursor.fetchall()
+    cursor.close()
@@ -0,0 +1,73 @@
+import time
+
+import pytest
+
+import app as flask_app
+import benchmark
+import live_stream
+
+
+class Notificateur:
+    sequence = 0
+
+    def attendre(self, sequence, delai):
+        time.sleep(0.01)
+        return sequence
+
+
+@pytest.fixture
+def base(tmp_path):
+    chemin = str(tmp_path / "flux.sqlite3")
+    benchmark.creer_base_sqlite(chemin)
+    return chemin
+
+
+def diffuseur(base, **options):
+    return live_stream.Diffuseur(
+        connection_factory=lambda: benchmark.ConnexionSQLite(base),
+        notificateur=Notificateur(),
+        **options,
+    )
+
+
+def test_clients_sse_bornes_par_processus(base, monkeypatch):
+    monkeypatch.setattr(live_stream, "diffuseur", diffuseur(base, max_abonnes=1))
+    client = flask_app.app.test_client()
+
+    premier = client.get("/api/stream", buffered=False)
+    assert premier.status_code == 200
+    refuse = client.get("/api/stream", buffered=False)
+    assert refuse.status_code == 503
+    assert refuse.headers["Retry-After"] == "5"
+
+    # Flux fermé sans avoir été lu : la place est libérée
+    premier.close()
+    assert live_stream.diffuseur.nombre_abonnes == 0
+    second = client.get("/api/stream", buffered=False)
+    assert second.status_code == 200
+    second.close()
+
+
+def inserer(base, numero, nom):
+    conn = benchmark.ConnexionSQLite(base)
+    cursor = conn.cursor()
+    cursor.execute(
+        "INSERT INTO MyAsset (MyAssetNumber, MyAssetType, MyAssetName, MyAssetValue, "
+        "MyAssetUnit) VALUES (%s, 'temperature', %s, 21.0, '°C')",
+        (numero, nom),
+    )
+    conn.commit()
+    conn.close()
+
+
+def test_ligne_validee_hors_ordre_diffusee_une_fois(base):
+    inserer(base, 10, "avant")
+    flux = diffuseur(base)
+    assert flux._lire_nouvelles_lignes() == []
+
+    inserer(base, 12, "rapide")
+    assert [ligne["id"] for ligne in flux._lire_nouvelles_lignes()] == [12]
+    # Numéro 11 attribué avant 12 mais validé après
+    inserer(base, 11, "lente")
+    assert [ligne["id"] for ligne in flux._lire_nouvelles_lignes()] == [11]
+    assert flux._lire_nouvelles_lignes() == []
@@ -0,0 +1,88 @@
+import pytest
+
+import app as flask_app
+import metrics
+
+
+@pytest.fixture
+def registre(monkeypatch):
+    """Registre vide : les métriques de l'application ne sont pas exposées"""
+    monkeypatch.setattr(metrics, "_metriques", [])
+    monkeypatch.setattr(metrics, "_collecteurs", [])
+
+
+def test_compteur_etiquettes_echappees(registre):
+    compteur = metrics.Compteur("essais_total", "Essais", ("nom",))
+    compteur.inc('a"b')
+    compteur.inc('a"b', montant=2)
+    compteur.inc("c\nd")
+
+    lignes = metrics.exposer().splitlines()
+
+    assert lignes[:2] == ["# HELP essais_total Essais", "# TYPE essais_total counter"]
+    assert 'essais_total{nom="a\\"b"} 3' in lignes
+    assert 'essais_total{nom="c\\nd"} 1' in lignes
+
+
+def test_histogramme_cumulatif(registre):
+    histogramme = metrics.Histogramme("duree_seconds", "Durée", (), seuils=(0.1, 1.0))
+    for valeur in (0.05, 0.1, 0.5, 3.0):
+        histogramme.observer(valeur)
+
+    lignes = metrics.exposer().splitlines()
+
+    assert 'duree_seconds_bucket{le="0.1"} 2' in lignes
+    assert 'duree_seconds_bucket{le="1.0"} 3' in lignes
+    assert 'duree_seconds_bucket{le="+Inf"} 4' in lignes
+    assert "duree_seconds_sum 3.65" in lignes
+    assert "duree_seconds_count 4" in lignes
+
+
+def test_collecteurs_aplatis_et_en_erreur(registre):
+    def indisponible():
+        raise RuntimeError("pool fermé")
+
+    metrics.ajouter_stats(
+        "pool", lambda: {"size": 5, "ok": True, "latency_ms": {"p95": 2.5}}
+    )
+    metrics.ajouter_stats("cache", indisponible)
+
+    lignes = metrics.exposer().splitlines()
+
+    assert "pool_size 5" in lignes
+    assert "pool_latency_ms_p95 2.5" in lignes
+    # Les booléens ne sont pas des jauges
+    assert not any(ligne.startswith("pool_ok") for ligne in lignes)
+    assert "# cache indisponible: pool fermé" in lignes
+
+
+def test_chronometrer_compte_les_erreurs():
+    avant = metrics.ERREURS_SQL._valeurs.get(("test_erreur",), 0)
+    with pytest.raises(ValueError):
+        with metrics.chronometrer("test_erreur"):
+            raise ValueError("requête invalide")
+    assert metrics.ERREURS_SQL._valeurs[("test_erreur",)] == avant + 1
+    assert ("test_erreur",) in metrics.DUREE_SQL._series
+
+
+def test_compter_lignes_par_type():
+    avant = dict(metrics.LIGNES_INGEREES._valeurs)
+    metrics.compter_lignes([("test_a", "A"), ("test_b", "B"), ("test_a", "A")])
+    metrics.compter_lignes([("test_b", "B")])
+    valeurs = metrics.LIGNES_INGEREES._valeurs
+    assert valeurs[("test_a",)] == avant.get(("test_a",), 0) + 2
+    assert valeurs[("test_b",)] == avant.get(("test_b",), 0) + 2
+
+
+def test_route_metrics_mesure_les_requetes():
+    client = flask_app.app.test_client()
+    client.get("/metrics")
+
+    response = client.get("/metrics")
+
+    assert response.status_code == 200
+    assert response.content_type == metrics.CONTENT_TYPE
+    texte = response.get_data(as_text=True)
+    assert "# TYPE http_request_duration_seconds histogram" in texte
+    serie = 'http_requests_total{endpoint="api_metrics",method="GET",status="200"}'
+    assert serie in texte
@@ -0,0 +1,86 @@
+import mysql.connector
+import pytest
+
+import migrate_database
+
+
+class Base:
+    """Connexion simulée : versions appliquées et index déjà créés à la main"""
+
+    def __init__(self, versions=(), index_existants=()):
+        self.versions = set(versions)
+        self.index_existants = set(index_existants)
+        self.executees = []
+        self.commits = 0
+        self._resultat = []
+
+    def cursor(self):
+        return self
+
+    def execute(self, requete, params=None):
+        requete = " ".join(requete.split())
+        self.executees.append(requete)
+        if requete.startswith("SELECT Version"):
+            self._resultat = [(v,) for v in self.versions]
+        elif "information_schema.TABLES" in requete:
+            self._resultat = [("BASE TABLE",)]
+        elif requete.startswith("INSERT INTO MyAssetSchema"):
+            self.versions.add(params[0])
+        elif any(f"INDEX {nom} " in requete for nom in self.index_existants):
+            raise mysql.connector.Error(msg="Duplicate key name", errno=1061)
+
+    def fetchall(self):
+        return self._resultat
+
+    def fetchone(self):
+        return self._resultat[0]
+
+    def commit(self):
+        self.commits += 1
+
+    def close(self):
+        pass
+
+
+def test_migrations_appliquees_une_fois_dans_l_ordre():
+    base = Base()
+    derniere = migrate_database.MIGRATIONS[-1][0]
+
+    appliquees = migrate_database.appliquer_migrations(base)
+
+    assert appliquees == list(range(1, derniere + 1))
+    assert base.commits == derniere
+    assert migrate_database.version_actuelle(base) == derniere
+    assert migrate_database.appliquer_migrations(base) == []
+
+
+def test_index_deja_cree_a_la_main_tolere():
+    base = Base(versions={2, 3}, index_existants={"idx_myasset_type_ts"})
+
+    appliquees = migrate_database.appliquer_migrations(base)
+
+    assert appliquees[0] == 1
+    assert 2 not in appliquees and 3 not in appliquees
+    assert any("CREATE TABLE MyAssetDevice" in r for r in base.executees)
+
+
+def test_autre_erreur_interrompt_la_migration():
+    class BaseEnPanne(Base):
+        def execute(self, requete, params=None):
+            if "ALTER TABLE" in requete:
+                raise mysql.connector.Error(msg="Lock wait timeout", errno=1205)
+            super().execute(requete, params)
+
+    base = BaseEnPanne()
+    with pytest.raises(mysql.connector.Error):
+        migrate_database.appliquer_migrations(base)
+    # La migration 1 reste enregistrée, pas la 2
+    assert base.versions == {1}
+
+
+def test_dry_run_n_applique_rien():
+    base = Base()
+
+    assert migrate_database.appliquer_migrations(base, dry_run=True) == []
+    assert base.versions == set()
+    assert not any(r.startswith("CREATE INDEX") for r in base.executees)
@@ -0,0 +1,108 @@
+import pytest
+
+import benchmark
+import db_pool
+import ingestion
+import migrate_database
+import normalized_storage
+import rollups
+
+
+def test_texte_par_ligne_sql_valide(base_sqlite):
+    base_sqlite.create_function("CHAR_LENGTH", 1, len)
+    base_sqlite.executemany(
+        "INSERT INTO MyAsset (MyAssetType, MyAssetName, MyAssetValue, MyAssetUnit, "
+        "MyAssetComment) VALUES (?, ?, ?, ?, ?)",
+        [
+            ("color", "LED", 1.0, "rgb", "255,0,0"),
+            ("temperature", "T", 21.0, "°C", "Ajouté via API"),
+            ("temperature", "T", 21.0, "°C", None),
+        ],
+    )
+    condition = normalized_storage._texte_par_ligne()
+
+    assert "('text', 'cmd', 'rgb')" in condition
+    lignes = base_sqlite.execute(
+        f"SELECT MyAssetUnit, MyAssetComment FROM MyAsset WHERE {condition}"
+    ).fetchall()
+    assert lignes == [("rgb", "255,0,0"), ("°C", None)]
+
+
+class Curseur:
+    def __init__(self, type_table):
+        self.type_table = type_table
+        self.executees = []
+
+    def execute(self, requete, params=None):
+        self.executees.append((requete, params))
+
+    def fetchone(self):
+        return (self.type_table,)
+
+
+def test_migrations_publiees_inchangees_et_sans_objet_sur_la_vue():
+    etapes = [e for _, _, liste in migrate_database.MIGRATIONS for e in liste]
+    cibles = [migrate_database.table_cible(e) for e in etapes if isinstance(e, str)]
+    assert cibles == ["MyAsset", "MyAsset", None, "MyAsset", None]
+
+    vue = Curseur("VIEW")
+    assert migrate_database.sans_objet(vue, etapes[0])
+    assert vue.executees[-1][1] == ("MyAsset",)
+    assert not migrate_database.sans_objet(Curseur("BASE TABLE"), etapes[1])
+    assert not migrate_database.sans_objet(vue, etapes[2])
+
+
+@pytest.fixture
+def base_normalisee(tmp_path, monkeypatch):
+    monkeypatch.setattr(normalized_storage, "actif", True)
+    monkeypatch.setattr(normalized_storage, "_ids", {})
+    monkeypatch.setattr(rollups, "actif", False)
+    chemin = str(tmp_path / "normalise.sqlite3")
+    benchmark.creer_base_sqlite(chemin)
+    conn = benchmark.ConnexionSQLite(chemin)
+    yield conn
+    conn.close()
+
+
+def test_capteur_resolu_dans_la_transaction_des_lectures(base_normalisee, monkeypatch):
+    # Aucune seconde connexion : le pool ne doit pas être sollicité
+    monkeypatch.setattr(db_pool, "get_connection", None)
+    ligne = ("temperature", "API temperature", 21.0, "°C", "Ajouté via API")
+    cle = normalized_storage.cle_capteur(ligne)
+
+    cursor = base_normalisee.cursor()
+    ingestion.inserer_lignes(cursor, [ligne])
+    base_normalisee.rollback()
+    # Capteur annulé avec les lectures : rien en cache
+    assert normalized_storage.id_connu(cle) is None
+
+    ingestion.inserer_lignes(cursor, [ligne])
+    base_normalisee.commit()
+    # Créé par ce lot : pas encore en cache, retrouvé validé au lot suivant
+    assert normalized_storage.id_connu(cle) is None
+    ingestion.inserer_lignes(cursor, [ligne, ligne])
+    base_normalisee.commit()
+    assert normalized_storage.id_connu(cle) is not None
+
+    cursor.execute("SELECT COUNT(*) FROM MyAssetSensor")
+    assert cursor.fetchone()[0] == 1
+    cursor.execute("SELECT COUNT(*) FROM MyAsset WHERE MyAssetType = 'temperature'")
+    assert cursor.fetchone()[0] == 3
+    cursor.close()
+
+
+def test_type_tronque_fusionne_avec_le_capteur_existant(base_normalisee, monkeypatch):
+    monkeypatch.setattr(normalized_storage, "est_une_vue", lambda cursor: True)
+    ancienne = ("bouton_pouss", "API bouton_poussoir", 1.0, "bool", "Ajouté via API")
+    nouvelle = ("button",) + ancienne[1:]
+    cursor = base_normalisee.cursor()
+    ingestion.inserer_lignes(cursor, [ancienne, ancienne, nouvelle])
+
+    normalized_storage.renommer_type(cursor, "bouton_pouss", "button")
+    base_normalisee.commit()
+
+    cursor.execute("SELECT MyAssetType FROM MyAssetSensor")
+    assert cursor.fetchall() == [("button",)]
+    cursor.execute("SELECT MyAssetType, COUNT(*) FROM MyAsset GROUP BY MyAssetType")
+    assert cursor.fetchall() == [("button", 3)]
+    cursor.close()
@@ -0,0 +1,85 @@
+import json
+import time
+
+import pytest
+
+import app as flask_app
+import benchmark
+import profiling
+
+
+@pytest.fixture
+def base(tmp_path):
+    chemin = str(tmp_path / "profil.sqlite3")
+    benchmark.creer_base_sqlite(chemin)
+    return chemin
+
+
+@pytest.fixture
+def profil():
+    profil = profiling.demarrer("127.0.0.1", "1")
+    yield profil
+    profiling.terminer()
+
+
+def test_demarrage_reserve_aux_adresses_autorisees():
+    assert profiling.demarrer("10.0.0.1", "1") is None
+    assert profiling.demarrer("127.0.0.1", "0") is None
+    assert profiling.terminer() is None
+
+
+def test_phases_et_requetes_sql(base, profil):
+    cursor = profiling.envelopper_curseur(
+        benchmark.ConnexionSQLite(base).cursor(), None
+    )
+    with profiling.phase("tri"):
+        cursor.execute("SELECT COUNT(*) FROM MyAsset WHERE MyAssetType = %s", ("a",))
+        cursor.fetchall()
+
+    assert profil.requetes_sql == 1
+    assert set(profil.phases) == {"tri", "sql"}
+    entete = profil.server_timing()
+    assert "sql;dur=" in entete and 'desc="1 requetes"' in entete
+    assert entete.split(", ")[-1].startswith("total;dur=")
+
+
+def test_curseur_inchange_hors_profilage(base):
+    cursor = benchmark.ConnexionSQLite(base).cursor()
+    assert profiling.envelopper_curseur(cursor, None) is cursor
+
+
+def test_journal_des_requetes_lentes(base, tmp_path, monkeypatch):
+    monkeypatch.setattr(profiling, "SEUIL_LENT", 0.0)
+    chemin = tmp_path / "lentes.jsonl"
+    journal = profiling.JournalLent(
+        lambda: benchmark.ConnexionSQLite(base), chemin=str(chemin)
+    )
+    cursor = profiling.envelopper_curseur(
+        benchmark.ConnexionSQLite(base).cursor(), journal
+    )
+    cursor.execute("SELECT 1")
+    cursor.execute("SELECT *\n  FROM MyAsset WHERE MyAssetType = %s", ("temperature",))
+
+    fin = time.monotonic() + 5
+    while not (chemin.exists() and chemin.read_text()) and time.monotonic() < fin:
+        time.sleep(0.01)
+    (entree,) = [json.loads(ligne) for ligne in chemin.read_text().splitlines()]
+    # Seules les requêtes sur MyAsset sont journalisées, avec leur plan
+    assert entree["sql"] == "SELECT * FROM MyAsset WHERE MyAssetType = %s"
+    assert entree["params"] == ["temperature"]
+    assert entree["explain"]
+
+
+def test_rapport_cprofile_par_en_tete():
+    client = flask_app.app.test_client()
+
+    response = client.get("/metrics", headers={"X-Profile": "cprofile"})
+    assert response.mimetype == "text/plain"
+    assert "function calls" in response.get_data(as_text=True)
+    assert "total;dur=" in response.headers["Server-Timing"]
+
+    refusee = client.get(
+        "/metrics?profile=cprofile", environ_base={"REMOTE_ADDR": "10.0.0.1"}
+    )
+    assert "Server-Timing" not in refusee.headers
+    assert "function calls" not in refusee.get_data(as_text=True)
@@ -0,0 +1,103 @@
+import time
+
+import pytest
+import requests
+
+import raspberry_forwarder
+
+
+class Reponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+class Session:
+    """Raspberry simulé : renvoie les statuts de `statuts` puis 200"""
+
+    statuts = []
+    recues = []
+
+    def post(self, url, json, timeout):
+        Session.recues.append(json)
+        statut = Session.statuts.pop(0) if Session.statuts else 200
+        if statut is None:
+            raise requests.ConnectionError("Pi injoignable")
+        return Reponse(statut)
+
+
+@pytest.fixture
+def session(monkeypatch):
+    monkeypatch.setattr(raspberry_forwarder.requests, "Session", Session)
+    Session.statuts = []
+    Session.recues = []
+    return Session
+
+
+def boite(tmp_path, **options):
+    return raspberry_forwarder.RaspberryForwarder(
+        "http://pi.local", str(tmp_path / "outbox.sqlite3"), **options
+    )
+
+
+def attendre_vide(forwarder, delai=5.0):
+    fin = time.monotonic() + delai
+    while forwarder.backlog() and time.monotonic() < fin:
+        time.sleep(0.01)
+    return forwarder.backlog() == 0
+
+
+@pytest.fixture
+def sans_envoi(monkeypatch):
+    # Pas de thread d'envoi : la boîte d'envoi seule est testée
+    monkeypatch.setattr(
+        raspberry_forwarder.RaspberryForwarder, "_ensure_started", lambda self: None
+    )
+
+
+def test_dossier_cree_et_boite_conservee(tmp_path, sans_envoi):
+    chemin = tmp_path / "instance" / "outbox.sqlite3"
+    forwarder = raspberry_forwarder.RaspberryForwarder("http://pi.local", str(chemin))
+    forwarder.envoyer({"comment": "LED_ON"})
+
+    # Redémarrage : la commande est toujours en attente
+    relance = raspberry_forwarder.RaspberryForwarder("http://pi.local", str(chemin))
+    assert relance.backlog() == 1
+
+
+def test_couleurs_fusionnees_et_boite_bornee(tmp_path, sans_envoi):
+    forwarder = boite(tmp_path, max_attente=2)
+    forwarder.envoyer({"comment": "SET_COLOR:255,0,0"})
+    forwarder.envoyer({"comment": "SET_COLOR:0,0,255"})
+    assert forwarder.stats()["coalesced"] == 1
+    forwarder.envoyer({"comment": "LED_ON"})
+    forwarder.envoyer({"comment": "LED_OFF"})
+
+    stats = forwarder.stats()
+    assert (stats["backlog"], stats["dropped"]) == (2, 1)
+
+
+def test_nouvel_essai_avec_delai_exponentiel(tmp_path, sans_envoi):
+    forwarder = boite(tmp_path, delai_initial=10.0, delai_max=15.0)
+    forwarder.envoyer({"comment": "LED_ON"})
+    forwarder.envoyer({"comment": "LED_OFF"})
+
+    ligne, _ = forwarder._reserver()
+    # Réservée : ni reprise par un autre processus ni dépassée par la suivante
+    assert forwarder._reserver()[0] is None
+    for tentatives, delai in ((0, 10.0), (1, 15.0)):
+        forwarder._replanifier(ligne[0], tentatives)
+        prochaine, attente = forwarder._reserver()
+        assert prochaine is None
+        assert delai - 1 < attente <= delai
+
+
+def test_envoi_reessaye_jusqu_au_succes(tmp_path, session):
+    session.statuts = [None, 503]
+    forwarder = boite(tmp_path, delai_initial=0.01)
+
+    forwarder.envoyer({"comment": "LED_ON"})
+
+    assert attendre_vide(forwarder)
+    assert session.recues == [{"comment": "LED_ON"}] * 3
+    stats = forwarder.stats()
+    assert (stats["sent"], stats["failed_attempts"]) == (1, 2)
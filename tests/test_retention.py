@@ -0,0 +1,41 @@
+import retention
+
+
+def plan(par_type, defaut, partitionnee):
+    etapes = retention.planifier_purge(par_type, defaut, partitionnee)
+    return [(params, jours) for _, params, jours in etapes]
+
+
+def test_defaut_plus_court_que_un_type_sur_table_partitionnee():
+    # Partitions supprimées à 90 jours : les autres types doivent être purgés à 30
+    etapes = retention.planifier_purge({"temperature": 90}, 30, partitionnee=True)
+
+    assert len(etapes) == 1
+    condition, params, jours = etapes[0]
+    assert "NOT IN" in condition
+    assert (params, jours) == (["temperature"], 30)
+
+
+def test_table_partitionnee_types_plus_courts_seulement():
+    assert plan({"joystick": 7, "temperature": 365}, 365, partitionnee=True) == [
+        (["joystick"], 7)
+    ]
+
+
+def test_table_non_partitionnee_tout_par_delete():
+    assert plan({"joystick": 7}, 365, partitionnee=False) == [
+        (["joystick"], 7),
+        (["joystick"], 365),
+    ]
+
+
+def test_sans_configuration_par_type():
+    assert plan({}, 365, partitionnee=True) == []
+    assert retention.planifier_purge({}, 365, partitionnee=False) == [("", [], 365)]
+
+
+def test_cles_en_type_affiche(monkeypatch):
+    monkeypatch.setenv("RETENTION_DAYS", "bouton_poussoir=10, joystick=7")
+    monkeypatch.setenv("RETENTION_DEFAULT_DAYS", "30")
+
+    assert retention.lire_config() == ({"button": 10, "joystick": 7}, 30)
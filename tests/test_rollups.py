@@ -0,0 +1,147 @@
+from datetime import datetime, timedelta
+
+import mysql.connector
+import pytest
+
+import app as flask_app
+import rollups
+
+JOUR = 86400
+MAINTENANT = 1_800_000_000
+
+
+def test_retention_par_defaut():
+    retention = rollups.analyser_retention(rollups.RETENTION_DEFAUT)
+    assert retention == {"minute": 30, "hour": 365, "day": None}
+
+
+def test_retention_entrees_invalides_ignorees(capsys):
+    defaut = rollups.analyser_retention(rollups.RETENTION_DEFAUT)
+    retention = rollups.analyser_retention(
+        "minute=7, hour=beaucoup,semaine=3,day=-1,day,", defaut
+    )
+    assert retention == {"minute": 7, "hour": 365, "day": None}
+    sortie = capsys.readouterr().out
+    for entree in ("hour=beaucoup", "semaine=3", "day=-1", "'day'"):
+        assert entree in sortie
+
+
+def test_resolution_expiree_ecartee(monkeypatch):
+    monkeypatch.setattr(
+        rollups, "RETENTION", {"minute": 30, "hour": 365, "day": None}
+    )
+    # Une heure il y a 10 jours : les minutes existent encore
+    debut = MAINTENANT - 10 * JOUR
+    assert rollups.choisir_resolution(debut, debut + 3600, 500, MAINTENANT) == "minute"
+    # Une heure il y a 60 jours : minutes purgées, on passe aux heures
+    debut = MAINTENANT - 60 * JOUR
+    assert rollups.choisir_resolution(debut, debut + 3600, 500, MAINTENANT) == "hour"
+    # Il y a deux ans : seuls les jours sont conservés
+    debut = MAINTENANT - 800 * JOUR
+    assert rollups.choisir_resolution(debut, debut + 3600, 500, MAINTENANT) == "day"
+
+
+class Connexion:
+    def close(self):
+        pass
+
+
+def test_series_indisponibles_503(monkeypatch):
+    monkeypatch.setattr(rollups, "actif", False)
+    monkeypatch.setattr(flask_app, "get_db_connection", Connexion)
+
+    reponse = flask_app.app.test_client().get("/api/series?type=temperature")
+
+    assert reponse.status_code == 503
+    assert "indisponibles" in reponse.get_json()["error"]
+
+
+def test_charger_serie_table_absente():
+    class Curseur:
+        fermee = False
+
+        def execute(self, requete, params=None):
+            raise mysql.connector.Error(msg="Table absente", errno=1146)
+
+        def close(self):
+            Curseur.fermee = True
+
+    class ConnexionSansTable:
+        def cursor(self):
+            return Curseur()
+
+    with pytest.raises(rollups.RollupsIndisponibles):
+        rollups.charger_serie(ConnexionSansTable(), "temperature", 0, 3600)
+    assert Curseur.fermee
+
+
+def test_lot_regroupe_par_intervalle():
+    minute = datetime(2027, 1, 15, 10, 30)
+    lignes = [
+        ("temperature", "T", 20.0, "°C", None, minute + timedelta(seconds=5)),
+        ("temperature", "T", 24.0, "°C", None, minute + timedelta(seconds=50)),
+        ("temperature", "T", 22.0, "°C", None, minute + timedelta(minutes=1)),
+        ("joystick", "J", 1.0, "text", "up", minute),
+    ]
+    groupes = rollups.grouper(lignes)
+
+    assert groupes[("minute", "temperature", "T", minute)] == [20.0, 24.0, 44.0, 2]
+    assert groupes[("hour", "temperature", "T", minute.replace(minute=0))] == [
+        20.0,
+        24.0,
+        66.0,
+        3,
+    ]
+    # 2 minutes + 1 heure + 1 jour, les unités texte sont exclues
+    assert len(rollups.agreger(lignes)) == 4
+
+
+class Curseur:
+    def __init__(self, executees, echec=False):
+        self.executees = executees
+        self.echec = echec
+
+    def executemany(self, requete, params):
+        if self.echec:
+            raise mysql.connector.Error(msg="Base indisponible", errno=2013)
+        self.executees.append(list(params))
+
+    def close(self):
+        pass
+
+
+class ConnexionEnregistree(Connexion):
+    def __init__(self, executees, echec=False):
+        self.curseur = Curseur(executees, echec)
+
+    def cursor(self):
+        return self.curseur
+
+    def commit(self):
+        pass
+
+
+def test_petits_lots_agreges_en_differe(monkeypatch):
+    monkeypatch.setattr(rollups, "actif", True)
+    executees = []
+    echecs = [False, True]
+    differes = rollups.AgregatsDifferes(
+        connection_factory=lambda: ConnexionEnregistree(executees, echecs.pop()),
+        intervalle=3600,
+    )
+    ligne = ("temperature", "T", 21.0, "°C", None)
+    assert rollups.a_differer([ligne])
+    for _ in range(5):
+        differes.ajouter([ligne])
+    assert differes.en_attente == 3
+
+    # Échec d'écriture : les agrégats restent en attente
+    with pytest.raises(mysql.connector.Error):
+        differes.vider()
+    assert differes.en_attente == 3
+
+    assert differes.vider() == 3
+    # Une ligne par résolution pour cinq lectures
+    assert [p[0] for p in executees[0]] == ["day", "hour", "minute"]
+    assert all(p[-1] == 5 for p in executees[0])
+    assert differes.en_attente == 0
@@ -0,0 +1,53 @@
+from types import SimpleNamespace
+
+import pytest
+
+import db_pool
+import live_stream
+import serve
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = SimpleNamespace(size=5, max_overflow=10)
+    monkeypatch.setattr(db_pool, "get_pool", lambda: pool)
+    monkeypatch.setattr(live_stream.diffuseur, "max_abonnes", 4)
+    for nom in ("WEB_THREADS", "WEB_WORKERS", "WEB_MAX_REQUESTS", "PORT"):
+        monkeypatch.delenv(nom, raising=False)
+    return pool
+
+
+def test_gthread_par_defaut(pool, capsys):
+    options = serve.options_depuis_env()
+    assert options["worker_class"] == "gthread"
+    assert options["threads"] == 8
+    assert options["bind"] == "0.0.0.0:5000"
+    assert options["preload_app"]
+    assert options["pre_fork"] is serve.pre_fork
+    assert options["post_fork"] is serve.post_fork
+    assert capsys.readouterr().out == ""
+
+
+def test_asgi_sans_threads(pool, monkeypatch, capsys):
+    monkeypatch.setenv("WEB_THREADS", "64")
+    options = serve.options_depuis_env(asgi=True)
+    assert options["worker_class"] == "uvicorn.workers.UvicornWorker"
+    assert "threads" not in options
+    # Pas de thread par requête : aucun avertissement sur le pool ou le SSE
+    assert capsys.readouterr().out == ""
+
+
+def test_max_requests_avec_gigue(pool, monkeypatch):
+    monkeypatch.setenv("WEB_MAX_REQUESTS", "1000")
+    options = serve.options_depuis_env()
+    assert options["max_requests"] == 1000
+    assert options["max_requests_jitter"] == 100
+
+
+def test_avertissements_threads(pool, monkeypatch, capsys):
+    monkeypatch.setenv("WEB_THREADS", "20")
+    monkeypatch.setattr(live_stream.diffuseur, "max_abonnes", 20)
+    serve.options_depuis_env()
+    sortie = capsys.readouterr().out
+    assert "WEB_THREADS=20 dépasse DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW (15)" in sortie
+    assert "SSE_MAX_CLIENTS=20 >= WEB_THREADS=20" in sortie
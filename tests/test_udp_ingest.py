@@ -0,0 +1,88 @@
+import socket
+import threading
+import time
+
+import pytest
+
+import binary_ingest
+import ingestion_buffer
+import udp_ingest
+
+
+class Tampon:
+    def __init__(self, plein=False):
+        self.lignes = []
+        self.plein = plein
+
+    def submit(self, lignes):
+        if self.plein:
+            raise ingestion_buffer.IngestionQueueFull("file pleine")
+        self.lignes.extend(lignes)
+
+    def stats(self):
+        return {"written": len(self.lignes), "queue_depth": 0}
+
+
+@pytest.fixture
+def recepteur():
+    def creer(tampon, autorisees=None):
+        recepteur = udp_ingest.Recepteur("127.0.0.1", 0, tampon, autorisees)
+        recepteurs.append(recepteur)
+        return recepteur
+
+    recepteurs = []
+    yield creer
+    for recepteur in recepteurs:
+        recepteur.socket.close()
+
+
+def test_texte_csv_et_json():
+    texte = 'temperature,23.5\n\n{"type": "joystick", "valeur": "UP"}\nbruit\n{"type"'
+    lignes, rejetees = udp_ingest.decoder_texte(texte)
+    assert [ligne[0] for ligne in lignes] == ["temperature", "joystick"]
+    assert lignes[0][2] == 23.5
+    assert rejetees == 2
+
+
+def test_datagramme_binaire():
+    trame = binary_ingest.encoder([("temperature", 23.5), ("light", 700.0)])
+    lignes, rejetees = udp_ingest.decoder_datagramme(trame)
+    assert rejetees == 0
+    assert [ligne[1] for ligne in lignes] == ["UDP temperature", "UDP light"]
+
+
+def test_filtrage_et_rejets(recepteur):
+    tampon = Tampon()
+    udp = recepteur(tampon, autorisees={"10.0.0.1"})
+
+    udp.traiter(b"temperature,20", ("10.0.0.2", 1))
+    udp.traiter(b"\xff\xfe", ("10.0.0.1", 1))
+    udp.traiter(bytes([binary_ingest.VERSION, 0, 5, 0]), ("10.0.0.1", 1))
+    udp.traiter(b"temperature,20", ("10.0.0.1", 1))
+
+    assert (udp.datagrammes, udp.ignores, udp.rejetees, udp.acceptees) == (4, 1, 2, 1)
+    assert len(tampon.lignes) == 1
+
+
+def test_file_pleine_rafale_perdue(recepteur):
+    udp = recepteur(Tampon(plein=True))
+    udp.traiter(b"temperature,20\nhumidity,40", ("127.0.0.1", 1))
+    assert udp.perdues == 2
+    assert udp.acceptees == 0
+
+
+def test_reception_sur_socket(recepteur):
+    tampon = Tampon()
+    udp = recepteur(tampon)
+    fil = threading.Thread(target=udp.servir)
+    fil.start()
+    try:
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as client:
+            client.sendto(b"temperature,21\nhumidity,40", udp.socket.getsockname())
+        fin = time.monotonic() + 5
+        while len(tampon.lignes) < 2 and time.monotonic() < fin:
+            time.sleep(0.01)
+    finally:
+        udp.arreter()
+        fil.join()
+    assert [ligne[0] for ligne in tampon.lignes] == ["temperature", "humidity"]
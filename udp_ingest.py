@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Récepteur UDP léger pour les capteurs à haute fréquence (joystick, boutons)
+
+Processus indépendant de l'application web : chaque datagramme contient une
+ou plusieurs lectures, converties comme /api/capteur puis insérées dans
+MyAsset par lots (même tampon d'écriture que INGESTION_ASYNC). Pas de
+connexion, pas d'en-têtes HTTP : un datagramme par rafale de lectures.
+Le tableau de bord voit ces lectures au prochain relevé du flux SSE
+(STREAM_POLL_SECONDS) et à l'expiration de son cache (DASHBOARD_CACHE_TTL).
+
+Formats acceptés dans un datagramme :
+    trame binaire de /api/capteurs/bin (voir binary_ingest.py)
+    texte, une lecture par ligne :  temperature,23.5
+                                    {"type": "joystick", "valeur": "UP"}
+
+Envoi de test :
+    echo "temperature,23.5" | nc -u -w0 127.0.0.1 5005
+
+Configuration par variables d'environnement :
+    UDP_INGEST_HOST       adresse d'écoute (défaut 0.0.0.0)
+    UDP_INGEST_PORT       port d'écoute (défaut 5005)
+    UDP_INGEST_ALLOW      adresses IP autorisées, séparées par des virgules
+                          (défaut : toutes)
+    UDP_BATCH_SIZE        lignes par commit (défaut 500)
+    UDP_FLUSH_MS          délai maximum avant écriture en ms (défaut 200)
+    UDP_QUEUE_SIZE        lignes maximum en attente (défaut 50000)
+"""
+
+import json
+import os
+import signal
+import socket
+import time
+
+from dotenv import load_dotenv
+
+import binary_ingest
+import ingestion
+import ingestion_buffer
+
+# Charger les variables d'environnement
+load_dotenv()
+
+TAILLE_DATAGRAMME = 65535
+INTERVALLE_STATS = 60
+MAX_LECTURES = TAILLE_DATAGRAMME // binary_ingest.LECTURE.size
+
+decodeur_binaire = binary_ingest.Decodeur(prefixe="UDP", commentaire="Ajouté via UDP")
+
+
+def decoder_texte(texte):
+    """Lignes "type,valeur" ou JSON -> (lignes MyAsset, nombre de lectures rejetées)"""
+    lectures = []
+    illisibles = 0
+    for ligne in texte.splitlines():
+        ligne = ligne.strip()
+        if not ligne:
+            continue
+        if ligne.startswith("{"):
+            try:
+                lecture = json.loads(ligne)
+                lectures.append((lecture["type"], lecture["valeur"]))
+            except (ValueError, KeyError, TypeError):
+                illisibles += 1
+        elif "," in ligne:
+            type_capteur, valeur = ligne.split(",", 1)
+            lectures.append((type_capteur.strip(), valeur.strip()))
+        else:
+            illisibles += 1
+
+    lignes, erreurs = ingestion.coerce_many(lectures, source="udp")
+    return lignes, illisibles + len(erreurs)
+
+
+def decoder_datagramme(donnees):
+    """Datagramme binaire ou texte -> (lignes MyAsset, nombre de lectures rejetées)"""
+    if donnees[:1] == bytes([binary_ingest.VERSION]):
+        lignes, erreurs = decodeur_binaire.decoder(donnees, MAX_LECTURES)
+        return lignes, len(erreurs)
+    return decoder_texte(donnees.decode("utf-8"))
+
+
+class Recepteur:
+    """Boucle de réception UDP alimentant un tampon d'écriture par lots"""
+
+    def __init__(self, hote, port, tampon, autorisees=None):
+        self.tampon = tampon
+        self.autorisees = autorisees
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        # Tampon noyau large : absorber les rafales pendant un commit
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 << 20)
+        self.socket.bind((hote, port))
+        self.socket.settimeout(1.0)
+        self.actif = True
+
+        self.datagrammes = 0
+        self.acceptees = 0
+        self.rejetees = 0
+        self.ignores = 0
+        self.perdues = 0
+
+    def traiter(self, donnees, adresse):
+        self.datagrammes += 1
+        if self.autorisees is not None and adresse[0] not in self.autorisees:
+            self.ignores += 1
+            return
+        try:
+            lignes, rejetees = decoder_datagramme(donnees)
+        except (binary_ingest.TrameInvalide, UnicodeDecodeError):
+            self.rejetees += 1
+            return
+        self.rejetees += rejetees
+        if not lignes:
+            return
+        try:
+            self.tampon.submit(lignes)
+            self.acceptees += len(lignes)
+        except ingestion_buffer.IngestionQueueFull:
+            # Base trop lente : UDP n'a pas de contre-pression, on perd la rafale
+            self.perdues += len(lignes)
+
+    def afficher_stats(self):
+        stats = self.tampon.stats()
+        print(
+            f"📊 UDP: {self.datagrammes} datagrammes, "
+            f"{self.acceptees} lectures acceptées, {self.rejetees} rejetées, "
+            f"{self.perdues} perdues, {self.ignores} ignorés | "
+            f"écrites: {stats['written']}, en file: {stats['queue_depth']}"
+        )
+
+    def servir(self):
+        prochaines_stats = time.monotonic() + INTERVALLE_STATS
+        while self.actif:
+            try:
+                donnees, adresse = self.socket.recvfrom(TAILLE_DATAGRAMME)
+                self.traiter(donnees, adresse)
+            except socket.timeout:
+                pass
+            if time.monotonic() >= prochaines_stats:
+                self.afficher_stats()
+                prochaines_stats = time.monotonic() + INTERVALLE_STATS
+
+    def arreter(self, *args):
+        self.actif = False
+
+
+def main():
+    hote = os.getenv("UDP_INGEST_HOST", "0.0.0.0")
+    port = int(os.getenv("UDP_INGEST_PORT", 5005))
+    autorisees = os.getenv("UDP_INGEST_ALLOW")
+    if autorisees:
+        autorisees = {ip.strip() for ip in autorisees.split(",") if ip.strip()}
+    else:
+        autorisees = None
+
+    tampon = ingestion_buffer.IngestionBuffer(
+        ingestion.inserer_lignes,
+        max_queue=int(os.getenv("UDP_QUEUE_SIZE", 50000)),
+        batch_size=int(os.getenv("UDP_BATCH_SIZE", 500)),
+        flush_interval=float(os.getenv("UDP_FLUSH_MS", 200)) / 1000,
+    )
+    recepteur = Recepteur(hote, port, tampon, autorisees)
+    signal.signal(signal.SIGTERM, recepteur.arreter)
+    signal.signal(signal.SIGINT, recepteur.arreter)
+
+    print(f"✅ Réception UDP sur {hote}:{port}")
+    try:
+        recepteur.servir()
+    finally:
+        print("🔄 Arrêt : écriture des lectures en attente...")
+        tampon.stop()
+        recepteur.afficher_stats()
+
+
+if __name__ == "__main__":
+    main()
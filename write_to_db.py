@@ -2,28 +2,32 @@
 """
 Script pour écrire directement dans la base de données MariaDB
 Utilisable depuis Raspberry Pi ou tout autre dispositif
+
+Le mode `stream` remplace une invocation par lecture : un seul processus lit
+un flux (fichier, stdin ou port série) et insère par lots.
 """
 
-import mysql.connector
-from dotenv import load_dotenv
-import os
-from datetime import datetime
+import argparse
+import json
 import sys
 import time
 
+import mysql.connector
+from dotenv import load_dotenv
+
+import dashboard
+import db_pool
+import ingestion
+import ingestion_buffer
+
 # Charger les variables d'environnement
 load_dotenv()
 
 
 def get_db_connection():
-    """Créer une connexion à la base de données"""
+    """Emprunter une connexion au pool (réutilisée si le processus reste actif)"""
     try:
-        return mysql.connector.connect(
-            host=os.getenv("DB_HOST"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASSWORD"),
-            database=os.getenv("DB_NAME"),
-        )
+        return db_pool.get_connection()
     except mysql.connector.Error as e:
         print(f"Erreur de connexion à la base de données: {e}")
         return None
@@ -31,28 +35,21 @@ def get_db_connection():
 
 def ajouter_donnee_capteur(type_capteur, valeur):
     """Ajouter une donnée de capteur dans la base"""
+    try:
+        ligne = ingestion.convertir_lecture(type_capteur, valeur, source="script")
+    except ValueError as e:
+        print(f"❌ Valeur invalide: {e}")
+        return False
+
     conn = get_db_connection()
     if not conn:
         return False
 
     try:
         cursor = conn.cursor()
-        current_timestamp = int(time.time())
-
-        # Essayer de convertir en nombre, sinon traiter comme texte
-        try:
-            valeur_num = float(valeur)
-            query = "INSERT INTO capteurs (type, valeur, timestamp_unix) VALUES (%s, %s, %s)"
-            cursor.execute(query, (type_capteur, valeur_num, current_timestamp))
-        except ValueError:
-            # Si la conversion échoue, c'est du texte
-            query = "INSERT INTO capteurs (type, valeur, valeur_texte, timestamp_unix) VALUES (%s, %s, %s, %s)"
-            cursor.execute(query, (type_capteur, 0, str(valeur), current_timestamp))
-
+        ingestion.inserer_lignes(cursor, [ligne])
         conn.commit()
-        print(
-            f"✅ Données ajoutées: {type_capteur} = {valeur} (timestamp: {current_timestamp})"
-        )
+        print(f"✅ Données ajoutées: {type_capteur} = {valeur}")
         return True
     except Exception as e:
         print(f"❌ Erreur lors de l'insertion: {e}")
@@ -63,18 +60,18 @@ def ajouter_donnee_capteur(type_capteur, valeur):
 
 
 def ajouter_commande(commande):
-    """Ajouter une commande dans la base"""
+    """Ajouter une commande (instruction pour les dispositifs) dans MyAsset"""
     conn = get_db_connection()
     if not conn:
         return False
 
     try:
         cursor = conn.cursor()
-        current_timestamp = int(time.time())
-        query = "INSERT INTO instructions (commande, timestamp_unix) VALUES (%s, %s)"
-        cursor.execute(query, (commande, current_timestamp))
+        ingestion.inserer_ligne(
+            cursor, ("instruction", "Commande Script", 1.0, "cmd", commande)
+        )
         conn.commit()
-        print(f"✅ Commande ajoutée: {commande} (timestamp: {current_timestamp})")
+        print(f"✅ Commande ajoutée: {commande}")
         return True
     except Exception as e:
         print(f"❌ Erreur lors de l'insertion: {e}")
@@ -92,23 +89,16 @@ def lire_dernieres_donnees(limite=10):
 
     try:
         cursor = conn.cursor(dictionary=True)
-        query = """
-            SELECT *, FROM_UNIXTIME(timestamp_unix) as date_formatted 
-            FROM capteurs 
-            ORDER BY timestamp_unix DESC 
+        query = f"""
+            SELECT {dashboard.COLONNES}
+            FROM MyAsset
+            WHERE MyAssetType NOT IN ('instruction', 'color')
+            ORDER BY MyAssetNumber DESC
             LIMIT %s
         """
         cursor.execute(query, (limite,))
-        donnees = cursor.fetchall()
-
-        # Ajouter la valeur affichable
-        for donnee in donnees:
-            if donnee["valeur_texte"]:
-                donnee["valeur_affichee"] = donnee["valeur_texte"]
-            else:
-                donnee["valeur_affichee"] = donnee["valeur"]
-
-        return donnees
+        # Valeur affichable et date comme sur le tableau de bord
+        return [dashboard.formater_capteur(donnee) for donnee in cursor.fetchall()]
     except Exception as e:
         print(f"❌ Erreur lors de la lecture: {e}")
         return []
@@ -117,45 +107,165 @@ def lire_dernieres_donnees(limite=10):
         conn.close()
 
 
+def lire_lectures(lignes):
+    """Lignes CSV (type,valeur) ou NDJSON -> (type, valeur), None si illisible"""
+    for ligne in lignes:
+        if isinstance(ligne, bytes):
+            ligne = ligne.decode("utf-8", errors="replace")
+        ligne = ligne.strip()
+        if not ligne or ligne.startswith("#") or ligne == "type,valeur":
+            continue
+        if ligne.startswith("{"):
+            try:
+                lecture = json.loads(ligne)
+                yield lecture["type"], lecture["valeur"]
+            except (ValueError, KeyError, TypeError):
+                yield None
+        elif "," in ligne:
+            type_capteur, valeur = ligne.split(",", 1)
+            yield type_capteur.strip(), valeur.strip()
+        else:
+            yield None
+
+
+def ecrire_flux(lignes, batch_size=500, flush_interval=1.0):
+    """Insérer en continu les lectures d'un flux, par lots (une transaction par lot)
+
+    Le tampon d'écriture réutilise la même connexion du pool pour chaque lot et
+    écrit au plus tard `flush_interval` secondes après la première lecture en
+    attente, même si la source reste silencieuse. La source ne peut pas
+    renvoyer ses lectures : un lot en échec est réessayé sans fin, et la
+    lecture de la source est suspendue tant que la file est pleine.
+    Retourne (acceptées, rejetées).
+    """
+    tampon = ingestion_buffer.IngestionBuffer(
+        ingestion.inserer_lignes,
+        max_queue=batch_size * 20,
+        batch_size=batch_size,
+        flush_interval=flush_interval,
+        full_policy="block",
+        block_timeout=5.0,
+        max_retries=None,
+        retry_max_delay=30.0,
+    )
+    acceptees = 0
+    rejetees = 0
+    try:
+        for lecture in lire_lectures(lignes):
+            if lecture is None:
+                rejetees += 1
+                continue
+            converties, erreurs = ingestion.coerce_many((lecture,), source="script")
+            if erreurs:
+                rejetees += 1
+                continue
+            attente = 1.0
+            while True:
+                try:
+                    tampon.submit(converties)
+                    break
+                except ingestion_buffer.IngestionQueueFull:
+                    # Base indisponible : la source attend (contre-pression)
+                    print(
+                        f"⚠️  Base indisponible ou trop lente, "
+                        f"nouvel essai dans {attente:.0f}s..."
+                    )
+                    time.sleep(attente)
+                    attente = min(attente * 2, 60.0)
+            acceptees += 1
+    except KeyboardInterrupt:
+        print("🔄 Interruption : écriture des lectures en attente...")
+    finally:
+        tampon.stop(timeout=60.0)
+        stats = tampon.stats()
+        print(
+            f"✅ Flux terminé: {acceptees} lectures acceptées, "
+            f"{rejetees} rejetées | {stats['written']} écrites en "
+            f"{stats['flushes']} transactions"
+        )
+        non_ecrites = stats["queue_depth"] + stats["in_flight"]
+        if non_ecrites:
+            print(f"❌ {non_ecrites} lectures non écrites (base toujours indisponible)")
+    return acceptees, rejetees
+
+
+def ouvrir_source(args):
+    """Fichier, entrée standard ou port série selon les arguments de `stream`"""
+    if args.serial:
+        import serial  # pyserial, seulement pour le mode série
+
+        print(f"🔄 Lecture du port série {args.serial} ({args.baud} bauds)")
+        return serial.Serial(args.serial, args.baud)
+    if args.fichier in (None, "-"):
+        return sys.stdin
+    return open(args.fichier, encoding="utf-8")
+
+
 def main():
-    """Fonction principale pour tester le script"""
-    if len(sys.argv) < 3:
-        print("Usage:")
-        print("  python write_to_db.py capteur <type> <valeur>")
-        print("  python write_to_db.py commande <instruction>")
-        print("  python write_to_db.py lire")
-        print("\nExemples:")
-        print("  python write_to_db.py capteur temperature 23.5")
-        print("  python write_to_db.py capteur humidite 65")
-        print("  python write_to_db.py commande LED_ON")
-        print("  python write_to_db.py lire")
-        return
-
-    action = sys.argv[1].lower()
-
-    if action == "capteur" and len(sys.argv) >= 4:
-        type_capteur = sys.argv[2]
-        valeur = sys.argv[3]
-        ajouter_donnee_capteur(type_capteur, valeur)
-
-    elif action == "commande" and len(sys.argv) >= 3:
-        commande = sys.argv[2]
-        ajouter_commande(commande)
-
-    elif action == "lire":
-        donnees = lire_dernieres_donnees()
+    """Point d'entrée en ligne de commande"""
+    parser = argparse.ArgumentParser(
+        description="Écrire directement dans MyAsset (Raspberry Pi, scripts)",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""Exemples:
+  python write_to_db.py capteur temperature 23.5
+  python write_to_db.py commande LED_ON
+  python write_to_db.py lire
+  python write_to_db.py stream mesures.csv
+  capteurs.py | python write_to_db.py stream
+  python write_to_db.py stream --serial /dev/ttyACM0 --baud 115200
+
+Format du flux : une lecture par ligne, "type,valeur" ou
+{"type": "temperature", "valeur": 23.5}""",
+    )
+    actions = parser.add_subparsers(dest="action", required=True)
+
+    capteur = actions.add_parser("capteur", help="ajouter une lecture")
+    capteur.add_argument("type")
+    capteur.add_argument("valeur")
+
+    commande = actions.add_parser("commande", help="ajouter une instruction")
+    commande.add_argument("instruction")
+
+    lire = actions.add_parser("lire", help="afficher les dernières lectures")
+    lire.add_argument("--limite", type=int, default=10)
+
+    stream = actions.add_parser(
+        "stream", help="insérer en continu un flux CSV/NDJSON (fichier, stdin, série)"
+    )
+    stream.add_argument("fichier", nargs="?", help="fichier à lire (défaut : stdin)")
+    stream.add_argument("--serial", help="port série à suivre (ex. /dev/ttyACM0)")
+    stream.add_argument("--baud", type=int, default=9600)
+    stream.add_argument("--batch-size", type=int, default=500)
+    stream.add_argument(
+        "--flush-ms", type=int, default=1000, help="délai maximum avant écriture"
+    )
+
+    args = parser.parse_args()
+
+    if args.action == "capteur":
+        sys.exit(0 if ajouter_donnee_capteur(args.type, args.valeur) else 1)
+
+    elif args.action == "commande":
+        sys.exit(0 if ajouter_commande(args.instruction) else 1)
+
+    elif args.action == "lire":
+        donnees = lire_dernieres_donnees(args.limite)
         print("\n📊 Dernières données des capteurs:")
         for donnee in donnees:
-            timestamp_str = (
-                f" (Unix: {donnee.get('timestamp_unix', 'N/A')})"
-                if donnee.get("timestamp_unix")
-                else ""
+            date = donnee["date"]
+            date_str = date.strftime("%H:%M:%S - %d/%m/%Y") if date else "N/A"
+            print(
+                f"  {donnee['type']}: {donnee['valeur_affichee']} - {date_str}"
+                f" (Unix: {donnee['timestamp_unix']})"
             )
-            valeur_affichee = donnee.get("valeur_affichee", donnee.get("valeur", "N/A"))
-            date_str = donnee.get("date_formatted", donnee.get("date", "N/A"))
-            print(f"  {donnee['type']}: {valeur_affichee} - {date_str}{timestamp_str}")
-    else:
-        print("❌ Arguments invalides")
+
+    elif args.action == "stream":
+        source = ouvrir_source(args)
+        try:
+            ecrire_flux(source, args.batch_size, args.flush_ms / 1000)
+        finally:
+            if source is not sys.stdin:
+                source.close()
 
 
 if __name__ == "__main__":